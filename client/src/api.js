@@ -1,15 +1,63 @@
 const API_BASE = 'http://localhost:5555';
 
+const COURSE_LIST_FIELDS = 'id,title,difficulty,duration_hours';
+
+const COURSE_CACHE_KEY = 'coursify.courses';
+
+// The cache is only reused if it was synced with the same fields.
+const readCourseCache = () => {
+  try {
+    const cache = JSON.parse(localStorage.getItem(COURSE_CACHE_KEY));
+    return cache && cache.fields === COURSE_LIST_FIELDS ? cache : null;
+  } catch (e) {
+    return null;
+  }
+};
+
+const writeCourseCache = (cache) => {
+  try {
+    localStorage.setItem(COURSE_CACHE_KEY, JSON.stringify(cache));
+  } catch (e) {
+    // Storage full or disabled; the next load syncs from scratch.
+  }
+};
+
+// Keeps the catalog in localStorage and asks GET /sync only for what changed since the saved token.
+// Deletions are applied before upserts; `more` means another page is waiting.
 export const fetchCourses = () => {
-  return fetch(`${API_BASE}/courses`)
-    .then(response => {
-      if (!response.ok) {
-        return response.json().then(err => {
-          throw new Error(err.error || `HTTP error! Status: ${response.status}`);
+  const cache = readCourseCache();
+  const courses = new Map((cache ? cache.courses : []).map(course => [course.id, course]));
+
+  const sync = (token) => {
+    const params = new URLSearchParams({ include: 'courses', fields: COURSE_LIST_FIELDS });
+    if (token) {
+      params.set('since', token);
+    }
+    return fetch(`${API_BASE}/sync?${params}`)
+      .then(response => {
+        if (token && (response.status === 410 || response.status === 400)) {
+          // The token expired or is no longer understood: start over.
+          courses.clear();
+          return sync(null);
+        }
+        if (!response.ok) {
+          return response.json().then(err => {
+            throw new Error((err.errors && err.errors[0]) || `HTTP error! Status: ${response.status}`);
+          });
+        }
+        return response.json().then(changes => {
+          changes.deleted.courses.forEach(id => courses.delete(id));
+          changes.courses.forEach(course => courses.set(course.id, course));
+          return changes.more ? sync(changes.next) : changes.next;
         });
-      }
-      return response.json();
-    });
+      });
+  };
+
+  return sync(cache && cache.token).then(token => {
+    const list = Array.from(courses.values()).sort((a, b) => a.id - b.id);
+    writeCourseCache({ fields: COURSE_LIST_FIELDS, token, courses: list });
+    return list;
+  });
 };
 
 export const fetchCourseDetails = (id) => {
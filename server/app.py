@@ -1,20 +1,94 @@
-from flask import Flask, jsonify, make_response, request
-from flask_migrate import Migrate
-from flask_cors import CORS
+import time
+
+import click
+from flask import Flask, jsonify, make_response, request, session
+from sqlalchemy import delete, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import ObjectDeletedError
 from models import db, User, Course, Enrollment, Review
+from cache import response_cache
+from dashboard import user_dashboard
+from database import config_from_env, configure_engines, replica_reads, replicate_sqlite
+from encoding import FastJSONProvider, response_compression
+from group_commit import GroupCommitOverloaded, group_commit
+from hashing import password_hasher
+from instrumentation import instrumentation
+from jobs import drain, job_status, jobs, retry_dead
+from lookups import course_exists, lookups, recheck_references, user_role
+from bulk import BulkRequestError, ingest_enrollments, ingest_reviews, ingest_users, read_file_items, read_items
+from export import EXPORT_FORMATS, stream_enrollments, stream_reviews
+from queries import (
+    IF_MATCH_ANY, course_detail_statement, course_etag, course_page_statement, enrollments_statement,
+    next_page_link, parse_course_fields, parse_date_range, parse_if_match, parse_page_args, user_detail_statement,
+    users_statement,
+)
+from ratelimit import rate_limiter
+from recommendations import (
+    DEFAULT_RECOMMENDATIONS, MAX_RECOMMENDATIONS, build_similarities, recommend_courses,
+)
+from search import search_courses
+from stats import (
+    DEFAULT_LEADERBOARD_LIMIT, LEADERBOARD_SIZE, RefreshConflict, popular_courses, refresh_stats,
+    stats_refresher, top_rated_courses,
+)
+from serializers import course_serializer, enrollment_serializer, review_serializer, user_serializer
+from sync import SyncTokenExpired, parse_sync_args, prune_tombstones, sync_changes
+
+ACCOUNT_FIELDS = ('id', 'username', 'email', 'role')
+
+
+def init_migrations(app):
+    """Registers Flask-Migrate; create_app() only does so under the flask command.
+
+    Alembic is about half the import time of a serving worker, so it is
+    imported here, when `flask db` (or a script that migrates) needs it.
+    """
+    from flask_migrate import Migrate
+    Migrate(app, db)
 
-migrate = Migrate()
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///coursify.db'
+    app.config.update(config_from_env())
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    app.json.compact = False
+    app.json = FastJSONProvider(app)
     app.secret_key = 'your_super_secret_key'
+    app.config['BULK_MAX_ITEMS'] = 100_000
+    # When set, PATCH /courses/<id> without If-Match is refused with 428.
+    app.config['COURSE_PATCH_REQUIRE_IF_MATCH'] = False
+    # GET /sync: changes per stream per response, how far back a cursor stays for
+    # commits still in flight, and how long deletions are kept for returning clients.
+    # Every call re-sends the changes of the last SYNC_SETTLE_SECONDS; it has to
+    # exceed the SQLite busy timeout (5 s) plus the longest write transaction.
+    app.config['SYNC_PAGE_SIZE'] = 1000
+    app.config['SYNC_SETTLE_SECONDS'] = 10
+    app.config['SYNC_TOMBSTONE_DAYS'] = 30
+    # Origins allowed to call the API from a browser; None sends no CORS headers.
+    app.config['CORS_ORIGINS'] = '*'
+    if config:
+        app.config.update(config)
 
     db.init_app(app)
-    migrate.init_app(app, db)
-    CORS(app)
+    configure_engines(app)
+    if click.get_current_context(silent=True) is not None:
+        init_migrations(app)
+    response_cache.init_app(app)
+    instrumentation.init_app(app)
+    rate_limiter.init_app(app)
+    response_compression.init_app(app)
+    password_hasher.init_app(app)
+    lookups.init_app(app)
+    group_commit.init_app(app)
+    stats_refresher.init_app(app)
+    jobs.init_app(app)
+    if app.config['CORS_ORIGINS']:
+        from flask_cors import CORS
+        CORS(app, origins=app.config['CORS_ORIGINS'], expose_headers=['Link', 'ETag'])
+
+    def overloaded_response(e):
+        response = make_response(jsonify({"errors": [str(e)]}), 503)
+        response.headers['Retry-After'] = '1'
+        return response
 
     @app.errorhandler(400)
     def handle_400_error(e):
@@ -26,24 +100,134 @@ def create_app():
         return '<h1>Coursify API</h1>'
 
     @app.route('/users', methods=['GET'])
+    @replica_reads
     def get_users():
-        users = User.query.all()
-        user_data = [user.to_dict(rules=('-password_hash',)) for user in users]
-        return make_response(jsonify(user_data), 200)
+        users = db.session.scalars(users_statement()).all()
+        return make_response(jsonify(user_serializer.many(users)), 200)
+
+    @app.route('/users', methods=['POST'])
+    def create_user():
+        data = request.get_json(silent=True) or {}
+        try:
+            if not all(data.get(k) for k in ('username', 'email', 'password')):
+                return make_response(jsonify({"errors": ["Missing required fields"]}), 400)
+            new_user = User(
+                username=data['username'],
+                email=data['email'],
+                role=data.get('role', 'student'),
+            )
+            new_user.password = data['password']
+            db.session.add(new_user)
+            db.session.commit()
+            return make_response(jsonify(new_user.to_dict(only=ACCOUNT_FIELDS)), 201)
+        except IntegrityError:
+            db.session.rollback()
+            return make_response(jsonify({"errors": ["Username or email already taken"]}), 409)
+        except ValueError as e:
+            db.session.rollback()
+            return make_response(jsonify({"errors": [str(e)]}), 400)
+        except Exception as e:
+            db.session.rollback()
+            return make_response(jsonify({"errors": ["Server error: " + str(e)]}), 500)
+
+    @app.route('/login', methods=['POST'])
+    def login():
+        data = request.get_json(silent=True) or {}
+        identifier = data.get('username') or data.get('email')
+        if not identifier or not data.get('password'):
+            return make_response(jsonify({"errors": ["Missing required fields"]}), 400)
+
+        user = db.session.scalars(
+            select(User).where(or_(User.username == identifier, User.email == identifier))
+        ).first()
+        # Unknown users still pay for one hash check, so response time does not reveal them.
+        verified = password_hasher.verify(user.password_hash if user else None, data['password'])
+        if not (user and verified):
+            return make_response(jsonify({"errors": ["Invalid username or password"]}), 401)
+
+        if password_hasher.needs_rehash(user.password_hash):
+            user.password = data['password']
+            db.session.commit()
+        session['user_id'] = user.id
+        return make_response(jsonify(user.to_dict(only=ACCOUNT_FIELDS)), 200)
 
     @app.route('/users/<int:id>', methods=['GET'])
+    @replica_reads
     def get_user_by_id(id):
-        user = User.query.get(id)
+        user = db.session.scalars(user_detail_statement(id)).first()
         if not user:
             return make_response(jsonify({"error": "User not found"}), 404)
-        return make_response(jsonify(user.to_dict())), 200
+        return make_response(jsonify(user_serializer(user))), 200
+
+    @app.route('/users/<int:id>/dashboard', methods=['GET'])
+    @replica_reads
+    def get_user_dashboard(id):
+        dashboard = user_dashboard(db.session, id)
+        if dashboard is None:
+            return make_response(jsonify({"error": "User not found"}), 404)
+        return make_response(jsonify(dashboard), 200)
+
+    @app.route('/users/<int:id>/recommendations', methods=['GET'])
+    @replica_reads
+    def get_user_recommendations(id):
+        try:
+            limit = int(request.args.get('limit', DEFAULT_RECOMMENDATIONS))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= MAX_RECOMMENDATIONS:
+            return make_response(jsonify({"errors": [f"limit must be an integer between 1 and {MAX_RECOMMENDATIONS}."]}), 400)
+
+        recommendations = recommend_courses(db.session, id, limit)
+        if not recommendations and not db.session.get(User, id):
+            return make_response(jsonify({"error": "User not found"}), 404)
+        return make_response(jsonify(recommendations), 200)
+
+    def leaderboard_limit():
+        try:
+            limit = int(request.args.get('limit', DEFAULT_LEADERBOARD_LIMIT))
+        except ValueError:
+            return None
+        return limit if 1 <= limit <= LEADERBOARD_SIZE else None
+
+    @app.route('/stats/popular', methods=['GET'])
+    @replica_reads
+    def get_popular_courses():
+        limit = leaderboard_limit()
+        if limit is None:
+            return make_response(jsonify({"errors": [f"limit must be an integer between 1 and {LEADERBOARD_SIZE}."]}), 400)
+        return make_response(jsonify(popular_courses(db.session, limit)), 200)
+
+    @app.route('/stats/top-rated', methods=['GET'])
+    @replica_reads
+    def get_top_rated_courses():
+        limit = leaderboard_limit()
+        if limit is None:
+            return make_response(jsonify({"errors": [f"limit must be an integer between 1 and {LEADERBOARD_SIZE}."]}), 400)
+        difficulty = request.args.get('difficulty')
+        if difficulty is not None and difficulty not in Course.DIFFICULTIES:
+            return make_response(jsonify({"errors": [f"difficulty must be one of {list(Course.DIFFICULTIES)}."]}), 400)
+        difficulties = [difficulty] if difficulty else Course.DIFFICULTIES
+        return make_response(jsonify({d: top_rated_courses(db.session, d, limit) for d in difficulties}), 200)
 
     @app.route('/courses', methods=['GET', 'POST'])
+    @response_cache.cached(tags=lambda: ['courses'])
+    @replica_reads
     def courses_list_create():
         if request.method == 'GET':
-            courses = Course.query.all()
-            course_data = [course.to_dict() for course in courses]
-            return make_response(jsonify(course_data), 200)
+            try:
+                after_id, limit = parse_page_args(request.args)
+                fields = parse_course_fields(request.args)
+            except ValueError as e:
+                return make_response(jsonify({"errors": [str(e)]}), 400)
+
+            courses = db.session.scalars(course_page_statement(after_id, limit, fields)).all()
+            course_data = course_serializer.many(courses, only=fields)
+            response = make_response(jsonify(course_data), 200)
+            if len(courses) == limit:
+                response.headers['Link'] = next_page_link(
+                    request.base_url, request.args.to_dict(), after_id=courses[-1].id, limit=limit
+                )
+            return response
         
         elif request.method == 'POST':
             data = request.get_json()
@@ -52,10 +236,10 @@ def create_app():
                 if not all(k in data for k in required_fields):
                     return make_response(jsonify({"errors": ["Missing required fields"]}), 400)
                 
-                instructor = User.query.get(data['instructor_id'])
-                if not instructor:
+                role = user_role(data['instructor_id'])
+                if role is None:
                     return make_response(jsonify({"errors": ["Instructor not found"]}), 404)
-                if instructor.role != 'instructor':
+                if role != 'instructor':
                     return make_response(jsonify({"errors": ["User is not an instructor"]}), 400)
 
                 new_course = Course(
@@ -67,6 +251,7 @@ def create_app():
                 )
                 db.session.add(new_course)
                 db.session.commit()
+                response_cache.invalidate('courses')
                 return make_response(jsonify(new_course.to_dict()), 201)
             except ValueError as e:
                 db.session.rollback()
@@ -75,46 +260,140 @@ def create_app():
                 db.session.rollback()
                 return make_response(jsonify({"errors": ["Server error: " + str(e)]}), 500)
         # Ensure a response is always returned
+    @app.route('/courses/search', methods=['GET'])
+    @response_cache.cached(tags=lambda: ['courses'])
+    @replica_reads
+    def courses_search():
+        try:
+            _, limit = parse_page_args(request.args)
+            offset = int(request.args.get('offset', 0))
+            if offset < 0:
+                raise ValueError("offset must not be negative.")
+            include_reviews = request.args.get('include_reviews', '').lower() in ('1', 'true', 'yes')
+            results = search_courses(request.args.get('q'), limit, offset, include_reviews)
+        except ValueError as e:
+            return make_response(jsonify({"errors": [str(e)]}), 400)
+
+        response = make_response(jsonify(results), 200)
+        if len(results) == limit:
+            response.headers['Link'] = next_page_link(
+                request.base_url, request.args.to_dict(), offset=offset + limit, limit=limit
+            )
+        return response
+
     @app.route('/courses/<int:id>', methods=['GET', 'PATCH', 'DELETE'])
+    @response_cache.cached(tags=lambda id: [f'course:{id}'])
+    @replica_reads
     def course_detail_update_delete(id):
-        course = Course.query.get(id)
+        if request.method == 'PATCH':
+            return patch_course(id)
+        if request.method == 'DELETE':
+            return delete_course(id)
+
+        course = db.session.scalars(course_detail_statement(id)).first()
         if not course:
             return make_response(jsonify({"error": "Course not found"}), 404)
+        response = make_response(jsonify(course_serializer(course)), 200)
+        response.set_etag(course_etag(course.version, response.get_data()))
+        return response
 
-        if request.method == 'GET':
-            return make_response(jsonify(course.to_dict()), 200)
-        
-        elif request.method == 'PATCH':
-            data = request.get_json()
-            try:
-                for attr in data:
-                    if hasattr(course, attr):
-                        setattr(course, attr, data[attr])
-                db.session.commit()
-                return make_response(jsonify(course.to_dict()), 200)
-            except ValueError as e:
-                db.session.rollback()
-                return make_response(jsonify({"errors": [str(e)]}), 400)
-            except Exception as e:
-                db.session.rollback()
-                return make_response(jsonify({"errors": ["Server error: " + str(e)]}), 500)
+    def delete_course(id):
+        """Deletes with one statement; the foreign keys cascade to enrollments, reviews and derived rows."""
+        try:
+            deleted = db.session.execute(delete(Course).where(Course.id == id)).rowcount
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return make_response(jsonify({"errors": ["Deletion error: " + str(e)]}), 500)
+        if not deleted:
+            return make_response(jsonify({"error": "Course not found"}), 404)
+        response_cache.invalidate('courses', f'course:{id}')
+        return make_response('', 204)
 
-        elif request.method == 'DELETE':
-            try:
-                db.session.delete(course)
-                db.session.commit()
-                return make_response('', 204)
-            except Exception as e:
+    def patch_course(id):
+        """Updates the given fields with one versioned UPDATE; responds with only what changed."""
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not data:
+            return make_response(jsonify({"errors": ["Request body must be a JSON object of fields to update."]}), 400)
+        try:
+            expected_version = parse_if_match(request.headers.get('If-Match'))
+        except ValueError as e:
+            return make_response(jsonify({"errors": [str(e)]}), 400)
+        if expected_version is None and app.config['COURSE_PATCH_REQUIRE_IF_MATCH']:
+            return make_response(jsonify({"errors": ["If-Match with the course version is required."]}), 428)
+
+        try:
+            values = Course.validated_changes(data)
+            if 'instructor_id' in values:
+                role = user_role(values['instructor_id'])
+                if role is None:
+                    return make_response(jsonify({"errors": ["Instructor not found"]}), 404)
+                if role != 'instructor':
+                    return make_response(jsonify({"errors": ["User is not an instructor"]}), 400)
+
+            version = Course.update_fields(
+                db.session.connection(), id, values, None if expected_version == IF_MATCH_ANY else expected_version
+            )
+            if version is None:
+                current = db.session.scalar(select(Course.version).where(Course.id == id))
                 db.session.rollback()
-                return make_response(jsonify({"errors": ["Deletion error: " + str(e)]}), 500)
-        # Ensure a response is always returned
-        return make_response(jsonify({"errors": ["Invalid request method."]}), 405)
+                if current is None and expected_version == IF_MATCH_ANY:
+                    return make_response(jsonify({"errors": ["Course not found, and If-Match: * requires it."]}), 412)
+                if current is None:
+                    return make_response(jsonify({"error": "Course not found"}), 404)
+                response = make_response(jsonify({
+                    "errors": [f"Course was modified; it is now at version {current}."], "version": current,
+                }), 412)
+                response.set_etag(course_etag(current))
+                return response
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return make_response(jsonify({"errors": ["A course with that title already exists."]}), 409)
+        except ValueError as e:
+            db.session.rollback()
+            return make_response(jsonify({"errors": [str(e)]}), 400)
+        except Exception as e:
+            db.session.rollback()
+            return make_response(jsonify({"errors": ["Server error: " + str(e)]}), 500)
+
+        response_cache.invalidate('courses', f'course:{id}')
+        response = make_response(jsonify({"id": id, "version": version, **values}), 200)
+        response.set_etag(course_etag(version))
+        return response
+
+    # Not sent to a replica: its lag would let the cursors pass rows it has not received yet.
+    @app.route('/sync', methods=['GET'])
+    def sync():
+        try:
+            include, fields = parse_sync_args(request.args)
+            changes = sync_changes(
+                db.session, request.args.get('since'), include, fields, app.config['SYNC_PAGE_SIZE'],
+                app.config['SYNC_SETTLE_SECONDS'], app.config['SYNC_TOMBSTONE_DAYS'],
+            )
+        except SyncTokenExpired as e:
+            return make_response(jsonify({"errors": [str(e)]}), 410)
+        except ValueError as e:
+            return make_response(jsonify({"errors": [str(e)]}), 400)
+        return make_response(jsonify(changes), 200)
 
     @app.route('/enrollments', methods=['GET', 'POST'])
+    @replica_reads
     def enrollments_list_create():
         if request.method == 'GET':
-            enrollments = Enrollment.query.all()
-            return make_response(jsonify([e.to_dict() for e in enrollments]), 200)
+            try:
+                since, until = parse_date_range(request.args)
+            except ValueError as e:
+                return make_response(jsonify({"errors": [str(e)]}), 400)
+
+            fmt = request.args.get('format', 'json')
+            if fmt in EXPORT_FORMATS:
+                return stream_enrollments(fmt, since, until)
+            if fmt != 'json':
+                return make_response(jsonify({"errors": [f"format must be one of {['json', *EXPORT_FORMATS]}."]}), 400)
+
+            enrollments = db.session.scalars(enrollments_statement(since, until)).all()
+            return make_response(jsonify(enrollment_serializer.many(enrollments)), 200)
         elif request.method == 'POST':
             data = request.get_json()
             try:
@@ -122,28 +401,33 @@ def create_app():
                 if not all(field in data for field in required_fields):
                     return make_response(jsonify({"errors": ["Missing required fields"]}), 400)
                 
-                user = User.query.get(data['user_id'])
-                course = Course.query.get(data['course_id'])
-                if not user: 
+                if user_role(data['user_id']) is None:
                     return make_response(jsonify({"errors": ["User not found"]}), 404)
-                if not course: 
+                if not course_exists(data['course_id']):
                     return make_response(jsonify({"errors": ["Course not found"]}), 404)
 
-                existing_enrollment = Enrollment.query.filter_by(
-                    user_id=data['user_id'], 
-                    course_id=data['course_id']
-                ).first()
-                if existing_enrollment:
-                    return make_response(jsonify({"errors": ["User already enrolled"]}), 409)
-
+                # uq_enrollments_user_id_course_id rejects duplicates atomically.
                 new_enrollment = Enrollment(
                     user_id=data['user_id'],
                     course_id=data['course_id'],
                     enrollment_date=data['enrollment_date']
                 )
-                db.session.add(new_enrollment)
-                db.session.commit()
+                new_enrollment = db.session.get(Enrollment, group_commit.insert(new_enrollment))
+                response_cache.invalidate('courses', f'course:{new_enrollment.course_id}')
                 return make_response(jsonify(new_enrollment.to_dict()), 201)
+            except IntegrityError:
+                db.session.rollback()
+                missing = recheck_references(data['user_id'], data['course_id'])
+                if missing:
+                    return make_response(jsonify({"errors": [missing]}), 404)
+                return make_response(jsonify({"errors": ["User already enrolled"]}), 409)
+            except ObjectDeletedError:
+                # A concurrent delete of the user or course cascaded to the new row.
+                db.session.rollback()
+                missing = recheck_references(data['user_id'], data['course_id']) or "Enrollment not found"
+                return make_response(jsonify({"errors": [missing]}), 404)
+            except GroupCommitOverloaded as e:
+                return overloaded_response(e)
             except ValueError as e:
                 db.session.rollback()
                 return make_response(jsonify({"errors": [str(e)]}), 400)
@@ -153,6 +437,16 @@ def create_app():
         # Ensure a response is always returned for unsupported methods
         return make_response(jsonify({"errors": ["Invalid request method."]}), 405)
 
+    @app.route('/reviews', methods=['GET'])
+    def reviews_list():
+        fmt = request.args.get('format', 'json')
+        if fmt in EXPORT_FORMATS:
+            return stream_reviews(fmt)
+        if fmt != 'json':
+            return make_response(jsonify({"errors": [f"format must be one of {['json', *EXPORT_FORMATS]}."]}), 400)
+        reviews = Review.query.options(*review_serializer.loader_options()).all()
+        return make_response(jsonify(review_serializer.many(reviews)), 200)
+
     @app.route('/reviews', methods=['POST'])
     def create_review():
         data = request.get_json()
@@ -161,11 +455,9 @@ def create_app():
             if not all(k in data for k in required_fields):
                 return make_response(jsonify({"errors": ["Missing required fields"]}), 400)
             
-            user = User.query.get(data['user_id'])
-            course = Course.query.get(data['course_id'])
-            if not user: 
+            if user_role(data['user_id']) is None:
                 return make_response(jsonify({"errors": ["User not found"]}), 404)
-            if not course: 
+            if not course_exists(data['course_id']):
                 return make_response(jsonify({"errors": ["Course not found"]}), 404)
 
             new_review = Review(
@@ -174,9 +466,21 @@ def create_app():
                 user_id=data['user_id'],
                 course_id=data['course_id']
             )
-            db.session.add(new_review)
-            db.session.commit()
+            new_review = db.session.get(Review, group_commit.insert(new_review))
+            response_cache.invalidate('courses', f'course:{new_review.course_id}')
             return make_response(jsonify(new_review.to_dict()), 201)
+        except IntegrityError as e:
+            db.session.rollback()
+            missing = recheck_references(data['user_id'], data['course_id'])
+            if missing:
+                return make_response(jsonify({"errors": [missing]}), 404)
+            return make_response(jsonify({"errors": ["Server error: " + str(e)]}), 500)
+        except ObjectDeletedError:
+            db.session.rollback()
+            missing = recheck_references(data['user_id'], data['course_id']) or "Review not found"
+            return make_response(jsonify({"errors": [missing]}), 404)
+        except GroupCommitOverloaded as e:
+            return overloaded_response(e)
         except ValueError as e:
             db.session.rollback()
             return make_response(jsonify({"errors": [str(e)]}), 400)
@@ -184,16 +488,167 @@ def create_app():
             db.session.rollback()
             return make_response(jsonify({"errors": ["Server error: " + str(e)]}), 500)
 
+    def bulk_response(ingest):
+        try:
+            summary, course_ids = ingest(read_items(request, app.config['BULK_MAX_ITEMS']))
+            db.session.commit()
+        except BulkRequestError as e:
+            db.session.rollback()
+            return make_response(jsonify({"errors": [str(e)]}), 400)
+        except IntegrityError:
+            db.session.rollback()
+            return make_response(jsonify({"errors": ["A concurrent write conflicted with this batch; retry it."]}), 409)
+        except Exception as e:
+            db.session.rollback()
+            return make_response(jsonify({"errors": ["Server error: " + str(e)]}), 500)
+
+        if course_ids:
+            response_cache.invalidate('courses', *(f'course:{course_id}' for course_id in course_ids))
+        return make_response(jsonify(summary), 201 if not summary['failed'] else 207)
+
+    @app.route('/users/bulk', methods=['POST'])
+    def users_bulk_create():
+        return bulk_response(ingest_users)
+
+    @app.route('/enrollments/bulk', methods=['POST'])
+    def enrollments_bulk_create():
+        return bulk_response(ingest_enrollments)
+
+    @app.route('/reviews/bulk', methods=['POST'])
+    def reviews_bulk_create():
+        return bulk_response(ingest_reviews)
+
     @app.cli.command('seed')
-    def seed_command():
-        from seed import run_seed_data
+    @click.option('--scale', type=int, default=0,
+                  help='Generate this many students plus a proportional synthetic catalog.')
+    @click.option('--random-seed', type=int, default=42, help='Seed for the --scale generator.')
+    def seed_command(scale, random_seed):
+        from seed import run_scaled_seed, run_seed_data
         with app.app_context():
-            run_seed_data(app)
+            if scale:
+                run_scaled_seed(app, scale, random_seed)
+            else:
+                run_seed_data(app)
         print("Database seeded!")
 
+    @app.cli.command('import-users')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    def import_users_command(path):
+        """Imports users from a CSV (with a header row) or NDJSON file."""
+        with app.app_context():
+            try:
+                summary, _ = ingest_users(read_file_items(path, app.config['BULK_MAX_ITEMS']))
+                db.session.commit()
+            except (BulkRequestError, IntegrityError) as e:
+                db.session.rollback()
+                raise click.ClickException(str(e))
+        print(f"Imported {summary['created']} users, {summary['failed']} failed.")
+        for result in summary['results']:
+            if result['status'] != 201:
+                print(f"  item {result['index']}: {result['errors'][0]}")
+
+    @app.cli.command('rebuild-ratings')
+    def rebuild_ratings_command():
+        with app.app_context():
+            with db.engine.begin() as connection:
+                updated = Course.rebuild_rating_aggregates(connection)
+        print(f"Rebuilt rating aggregates; {updated} courses were out of date.")
+
+    @app.cli.command('build-similarities')
+    def build_similarities_command():
+        with app.app_context():
+            with db.engine.begin() as connection:
+                written = build_similarities(connection)
+        print(f"Stored {written} course similarities.")
+
+    @app.cli.command('refresh-stats')
+    @click.option('--full', is_flag=True, help='Rebuild the rollups from scratch instead of from the marks.')
+    @click.option('--interval', type=float, default=0,
+                  help='Refresh again every INTERVAL seconds; 0 refreshes once.')
+    def refresh_stats_command(full, interval):
+        while True:
+            started = time.perf_counter()
+            try:
+                with app.app_context():
+                    with db.engine.begin() as connection:
+                        folded = refresh_stats(connection, full=full)
+                print(f"Folded in {folded['enrollments']} enrollments and {folded['reviews']} reviews"
+                      f" in {time.perf_counter() - started:.3f}s.")
+            except RefreshConflict as e:
+                print(f"Skipped: {e}")
+            if not interval:
+                break
+            full = False
+            time.sleep(interval)
+
+    @app.cli.command('prune-tombstones')
+    def prune_tombstones_command():
+        """Deletes tombstones older than SYNC_TOMBSTONE_DAYS; older sync tokens already get 410."""
+        with app.app_context():
+            with db.engine.begin() as connection:
+                pruned = prune_tombstones(connection, app.config['SYNC_TOMBSTONE_DAYS'])
+        print(f"Pruned {pruned} tombstones.")
+
+    @app.cli.group('jobs')
+    def jobs_command():
+        """Inspects and runs the deferred follow-up jobs in the outbox."""
+
+    @jobs_command.command('status')
+    def jobs_status_command():
+        with app.app_context():
+            with db.engine.connect() as connection:
+                counts, failed = job_status(connection)
+        if not counts:
+            print("No jobs queued.")
+        for kind, status, count, oldest, next_due in counts:
+            print(f"{kind:<24} {status:<8} {count:>8} jobs, oldest from {oldest:%Y-%m-%d %H:%M:%S}, "
+                  f"next due {next_due:%Y-%m-%d %H:%M:%S}")
+        if failed:
+            print("Latest failures:")
+        for id, kind, status, attempts, run_after, error in failed:
+            print(f"  job {id} ({kind}, {status}, {attempts} attempts, next {run_after:%H:%M:%S}): {error}")
+
+    @jobs_command.command('drain')
+    @click.option('--kind', multiple=True, help='Only run jobs of this kind; may be repeated.')
+    def jobs_drain_command(kind):
+        """Runs every due job here, without waiting for the server processes."""
+        started = time.perf_counter()
+        outcomes = drain(app, kind)
+        print(f"Ran {outcomes['done']} jobs in {time.perf_counter() - started:.3f}s;"
+              f" {outcomes['failed']} failed and {outcomes['lost']} were taken over by another worker.")
+
+    @jobs_command.command('retry')
+    @click.option('--kind', multiple=True, help='Only retry jobs of this kind; may be repeated.')
+    def jobs_retry_command(kind):
+        """Makes dead jobs due again, with a fresh attempt count."""
+        with app.app_context():
+            with db.engine.begin() as connection:
+                retried = retry_dead(connection, kind)
+        print(f"Queued {retried} dead jobs again.")
+
+    @app.cli.command('replicate')
+    @click.option('--interval', type=float, default=0,
+                  help='Copy again every INTERVAL seconds; 0 copies once.')
+    def replicate_command(interval):
+        """Copies a SQLite primary into its SQLite replicas, standing in for real replication."""
+        with app.app_context():
+            engines = [db.engine] + [db.engines[key] for key in app.config['DATABASE_REPLICAS']]
+        if any(engine.dialect.name != 'sqlite' for engine in engines):
+            raise click.ClickException("replicate only copies between SQLite files.")
+        if len(engines) == 1:
+            raise click.ClickException("No replicas configured; set DATABASE_REPLICA_URLS.")
+        primary, replicas = engines[0].url.database, [engine.url.database for engine in engines[1:]]
+        while True:
+            started = time.perf_counter()
+            for replica in replicas:
+                replicate_sqlite(primary, replica)
+            print(f"Copied {primary} to {len(replicas)} replica(s) in {time.perf_counter() - started:.3f}s.")
+            if not interval:
+                break
+            time.sleep(interval)
+
     return app
 
-app_instance = create_app()
 
 if __name__ == '__main__':
-    app_instance.run(port=5555, debug=True)
\ No newline at end of file
+    create_app().run(port=5555, debug=True)
\ No newline at end of file
@@ -0,0 +1,217 @@
+"""Production ASGI entry point.
+
+    uvicorn asgi:app --workers 4 --port 5555
+
+The read endpoints for courses, users and enrollments are served by async
+handlers on an async SQLAlchemy engine (aiosqlite for SQLite). They share
+the statements in queries.py and the compiled serializers with the Flask
+views. Every other route, every write and the streaming exports are
+forwarded to the Flask app from create_app() through a WSGI adapter.
+
+A native handler is only used where it answers exactly like the Flask
+view. A route goes to Flask when a Flask-side feature applies to it: the
+response cache (with its 304s) for the course routes, a rate limit for
+the route, or instrumentation. With the default config the cache is on,
+so the course routes go to Flask and the user and enrollment reads stay
+native.
+
+With read replicas configured, the native handlers read from them under the
+same read-your-writes rule as the Flask views (see database.py).
+"""
+import contextlib
+
+from a2wsgi import WSGIMiddleware
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+
+from app import create_app
+from database import choose_replica
+from encoding import dumps_bytes
+from models import db
+from queries import (
+    course_detail_statement, course_etag, course_page_statement, enrollments_statement, next_page_link,
+    parse_course_fields, parse_date_range, parse_page_args, user_detail_statement, users_statement,
+)
+from ratelimit import route_limit
+from serializers import course_serializer, enrollment_serializer, user_serializer
+
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'mysql': 'mysql+aiomysql',
+}
+
+
+class SortedJSONResponse(JSONResponse):
+    """Compact JSON with sorted keys, byte for byte what the Flask views send (trailing newline included)."""
+
+    def render(self, content):
+        return dumps_bytes(content) + b'\n'
+
+
+class Forward:
+    """Returned from a handler to hand the request to another ASGI app unchanged."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        await self.app(scope, receive, send)
+
+
+def async_database_url(url):
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend!r} databases.")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+def create_async_db_engine(flask_app, bind_key=None):
+    config = flask_app.config
+    config.setdefault('ASYNC_POOL_SIZE', 10)
+    config.setdefault('ASYNC_MAX_OVERFLOW', 20)
+    config.setdefault('ASYNC_POOL_TIMEOUT', 30)
+    config.setdefault('ASYNC_POOL_RECYCLE', 1800)
+
+    with flask_app.app_context():
+        url = async_database_url(db.engines[bind_key].url)
+    options = {}
+    if url.database not in (None, '', ':memory:'):
+        # In-memory SQLite uses a StaticPool, which takes no sizing options.
+        options.update(
+            pool_size=config['ASYNC_POOL_SIZE'],
+            max_overflow=config['ASYNC_MAX_OVERFLOW'],
+            pool_timeout=config['ASYNC_POOL_TIMEOUT'],
+            pool_recycle=config['ASYNC_POOL_RECYCLE'],
+        )
+    return create_async_engine(url, **options)
+
+
+def served_by_flask(config, rule, cached):
+    """Whether GET `rule` (a Flask URL rule) needs the Flask view's cache, rate limit or instrumentation."""
+    return (
+        (cached and config['RESPONSE_CACHE_ENABLED'])
+        or route_limit(config, f'GET {rule}') is not None
+        or config['INSTRUMENTATION_ENABLED']
+    )
+
+
+def create_asgi_app(flask_app=None):
+    flask_app = flask_app or create_app()
+    replicas = flask_app.config['DATABASE_REPLICAS']
+    engines = {key: create_async_db_engine(flask_app, key) for key in [None, *replicas]}
+    sessionmakers = {key: async_sessionmaker(engine, expire_on_commit=False) for key, engine in engines.items()}
+    wsgi = WSGIMiddleware(flask_app)
+    config = flask_app.config
+
+    def Session(request):
+        # Every native route is a read, so it goes to a replica unless the client wrote recently.
+        return sessionmakers[choose_replica(replicas, request.cookies)]()
+
+    def error(message, status):
+        return SortedJSONResponse({"errors": [message]}, status_code=status)
+
+    def base_url(request):
+        return str(request.url.replace(query=''))
+
+    def gzipped(request, response):
+        # The condition under which GZipMiddleware below compresses the body.
+        return (config['COMPRESSION_ENABLED'] and 'gzip' in request.headers.get('Accept-Encoding', '')
+                and len(response.body) >= config['COMPRESSION_MIN_SIZE'])
+
+    async def get_users(request):
+        async with Session(request) as session:
+            users = (await session.scalars(users_statement())).all()
+            return SortedJSONResponse(user_serializer.many(users))
+
+    async def get_user_by_id(request):
+        async with Session(request) as session:
+            user = (await session.scalars(user_detail_statement(request.path_params['id']))).first()
+            if not user:
+                return SortedJSONResponse({"error": "User not found"}, status_code=404)
+            return SortedJSONResponse(user_serializer(user))
+
+    async def list_courses(request):
+        try:
+            after_id, limit = parse_page_args(request.query_params)
+            fields = parse_course_fields(request.query_params)
+        except ValueError as e:
+            return error(str(e), 400)
+
+        async with Session(request) as session:
+            courses = (await session.scalars(course_page_statement(after_id, limit, fields))).all()
+            response = SortedJSONResponse(course_serializer.many(courses, only=fields))
+        if len(courses) == limit:
+            response.headers['Link'] = next_page_link(
+                base_url(request), request.query_params, after_id=courses[-1].id, limit=limit
+            )
+        return response
+
+    async def get_course(request):
+        async with Session(request) as session:
+            course = (await session.scalars(course_detail_statement(request.path_params['id']))).first()
+            if not course:
+                return SortedJSONResponse({"error": "Course not found"}, status_code=404)
+            response = SortedJSONResponse(course_serializer(course))
+        # Like the Flask view: the version for If-Match, weak once the body is gzipped.
+        etag = f'"{course_etag(course.version, response.body)}"'
+        if gzipped(request, response):
+            etag = 'W/' + etag
+        response.headers['ETag'] = etag
+        return response
+
+    async def list_enrollments(request):
+        if request.query_params.get('format', 'json') != 'json':
+            return Forward(wsgi)  # streaming exports stay on the Flask path
+        try:
+            since, until = parse_date_range(request.query_params)
+        except ValueError as e:
+            return error(str(e), 400)
+
+        async with Session(request) as session:
+            enrollments = (await session.scalars(enrollments_statement(since, until))).all()
+            return SortedJSONResponse(enrollment_serializer.many(enrollments))
+
+    @contextlib.asynccontextmanager
+    async def lifespan(asgi_app):
+        yield
+        for engine in engines.values():
+            await engine.dispose()
+
+    native = [
+        # (path, handler, Flask URL rule, whether the Flask view is cached)
+        ('/users', get_users, '/users', False),
+        ('/users/{id:int}', get_user_by_id, '/users/<int:id>', False),
+        ('/courses', list_courses, '/courses', True),
+        ('/courses/{id:int}', get_course, '/courses/<int:id>', True),
+        ('/enrollments', list_enrollments, '/enrollments', False),
+    ]
+    routes = [
+        Route(path, handler, methods=['GET'])
+        for path, handler, rule, cached in native if not served_by_flask(config, rule, cached)
+    ]
+    # Anything not matched above (other methods included) goes to Flask.
+    routes.append(Mount('/', app=wsgi))
+    middleware = []
+    if config['CORS_ORIGINS']:
+        # Mirrors the Flask-CORS setup so native and forwarded routes answer alike.
+        origins = config['CORS_ORIGINS']
+        origins = [origins] if isinstance(origins, str) else list(origins)
+        middleware.append(Middleware(CORSMiddleware, allow_origins=origins, allow_methods=['*'], allow_headers=['*'],
+                                     expose_headers=['Link', 'ETag']))
+    if config['COMPRESSION_ENABLED']:
+        # Gzip only, for the native routes; forwarded responses arrive already encoded and pass through.
+        middleware.append(Middleware(GZipMiddleware, minimum_size=config['COMPRESSION_MIN_SIZE'],
+                                     compresslevel=config['COMPRESSION_LEVELS']['gzip']))
+    asgi_app = Starlette(routes=routes, middleware=middleware, lifespan=lifespan)
+    asgi_app.state.flask_app = flask_app
+    asgi_app.state.engines = engines
+    return asgi_app
+
+
+app = create_asgi_app()
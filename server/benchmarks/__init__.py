@@ -0,0 +1,5 @@
+"""Benchmark scripts for the Coursify API.
+
+Run them from the server directory as modules, e.g.
+`python -m benchmarks.serialization`.
+"""
@@ -0,0 +1,69 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+from app import create_app
+from models import db, User, Course, Enrollment, Review
+
+PASSWORD_HASH = 'scrypt:32768:8:1$benchmark$' + '0' * 128
+
+
+def make_app(database_uri='sqlite://', config=None):
+    """App bound to a throwaway database (in-memory by default) with the schema created.
+
+    The job workers are off unless config turns them on, so deferred work runs
+    inline and no thread outlives the benchmark's database.
+    """
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_uri, 'JOBS_ENABLED': False, **(config or {})})
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def populate(courses=200, students=500, enrollments_per_course=20, reviews_per_course=5, seed=42):
+    """Bulk-loads a synthetic catalog. Must run inside an app context."""
+    rng = random.Random(seed)
+    instructors = max(1, courses // 10)
+    now = datetime.utcnow()
+
+    db.session.execute(User.__table__.insert(), [
+        {'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': PASSWORD_HASH,
+         'role': 'instructor' if i <= instructors else 'student'}
+        for i in range(1, instructors + students + 1)
+    ])
+    db.session.execute(Course.__table__.insert(), [
+        {'title': f'Benchmark course number {i}', 'description': 'A synthetic course used for benchmarking. ' * 3,
+         'difficulty': rng.choice(['Beginner', 'Intermediate', 'Advanced']), 'duration_hours': rng.randint(1, 60),
+         'instructor_id': rng.randint(1, instructors)}
+        for i in range(1, courses + 1)
+    ])
+    student_ids = range(instructors + 1, instructors + students + 1)
+    enrollments, reviews = [], []
+    for course_id in range(1, courses + 1):
+        enrolled = rng.sample(student_ids, min(enrollments_per_course, students))
+        enrollments.extend(
+            {'user_id': user_id, 'course_id': course_id,
+             'enrollment_date': now - timedelta(days=rng.randint(0, 365))}
+            for user_id in enrolled
+        )
+        reviews.extend(
+            {'user_id': user_id, 'course_id': course_id, 'rating': rng.randint(1, 5),
+             'text_content': 'Synthetic review text for benchmarking purposes.'}
+            for user_id in enrolled[:reviews_per_course]
+        )
+    if enrollments:
+        db.session.execute(Enrollment.__table__.insert(), enrollments)
+    if reviews:
+        db.session.execute(Review.__table__.insert(), reviews)
+    Course.rebuild_rating_aggregates(db.session.connection())
+    db.session.commit()
+
+
+def timeit(func, repeat=5):
+    """Best-of-N wall time in seconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
@@ -0,0 +1,91 @@
+"""Latency budget check for GET /users/<id>/dashboard.
+
+    python -m benchmarks.dashboard [--enrollments 10000] [--budget-ms 750]
+
+Builds one student enrolled in --enrollments courses, a third of them
+reviewed (some twice, so the latest-review grouping is exercised). Then it
+times the endpoint, and separately the queries plus dict building. Exits
+non-zero if the endpoint's p95 exceeds the budget or a request runs more
+than two SQL statements. tests/test_dashboard.py asserts the same budget.
+The JSON output is compact (see encoding.py), so most of the endpoint time
+goes to the two queries and building the dicts.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import make_app, populate
+from benchmarks.load_test import percentile
+from dashboard import user_dashboard
+from instrumentation import query_budget
+from models import db, Enrollment, Review
+
+QUERY_BUDGET = 2
+BUDGET_MS = 750.0
+
+
+def timed(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)
+
+
+def enrolled_student(enrollments, seed=7):
+    """Loads `enrollments` courses and one student enrolled in all of them; returns (student id, reviewed ids).
+
+    Must run inside an app context.
+    """
+    rng = random.Random(seed)
+    populate(courses=enrollments, students=50, enrollments_per_course=0, reviews_per_course=0)
+    student = db.session.execute(db.text("SELECT MAX(id) FROM users")).scalar()
+    now = datetime.utcnow()
+    db.session.execute(Enrollment.__table__.insert(), [
+        {'user_id': student, 'course_id': course_id, 'enrollment_date': now - timedelta(minutes=course_id)}
+        for course_id in range(1, enrollments + 1)
+    ])
+    reviewed = rng.sample(range(1, enrollments + 1), enrollments // 3)
+    db.session.execute(Review.__table__.insert(), [
+        {'user_id': student, 'course_id': course_id, 'rating': rng.randint(1, 5),
+         'text_content': 'Dashboard benchmark review text.'}
+        for course_id in reviewed + reviewed[:len(reviewed) // 10]
+    ])
+    db.session.commit()
+    return student, reviewed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--enrollments', type=int, default=10_000)
+    parser.add_argument('--budget-ms', type=float, default=BUDGET_MS, help='p95 latency budget')
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        student, reviewed = enrolled_student(args.enrollments)
+
+    client = app.test_client()
+    url = f'/users/{student}/dashboard'
+    with query_budget(QUERY_BUDGET, app):
+        body = client.get(url).get_json()
+    assert body['summary']['enrollments'] == args.enrollments, body['summary']
+    assert body['summary']['reviewed'] == len(reviewed), body['summary']
+
+    with app.app_context():
+        build = timed(args.repeat, lambda: user_dashboard(db.session, student))
+    endpoint = timed(args.repeat, lambda: client.get(url).get_data())
+    print(f"{args.enrollments} enrollments")
+    print(f"  queries + dicts: p50 {percentile(build, 0.5) * 1000:.1f}ms, p95 {percentile(build, 0.95) * 1000:.1f}ms")
+    p95 = percentile(endpoint, 0.95) * 1000
+    print(f"  endpoint:        p50 {percentile(endpoint, 0.5) * 1000:.1f}ms, p95 {p95:.1f}ms"
+          f" (budget {args.budget_ms:g}ms)")
+    if p95 > args.budget_ms:
+        raise SystemExit("dashboard p95 is over budget")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Deleting a popular course: ORM cascade vs. ON DELETE CASCADE.
+
+    python -m benchmarks.deletes [--enrollments 100000] [--reviews 5000]
+
+Each run builds a fresh in-memory catalog with one course holding
+--enrollments enrollments and --reviews reviews. The ORM cascade loads
+every child into the session and deletes them one by one, which is how
+DELETE /courses/<id> used to work. DELETE /courses/<id> now issues a
+single DELETE and lets the foreign keys remove the children. Peak memory
+is traced Python allocations.
+"""
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.common import make_app, populate
+from models import db, Course, Enrollment, Review
+
+
+def orm_cascade(app, client):
+    course = db.session.get(Course, 1)
+    course.enrollments, course.reviews  # what cascade='all, delete-orphan' loaded before passive_deletes
+    db.session.delete(course)
+    db.session.commit()
+
+
+def delete_endpoint(app, client):
+    assert client.delete('/courses/1').status_code == 204
+
+
+def run(delete, enrollments, reviews):
+    app = make_app()
+    client = app.test_client()
+    with app.app_context():
+        populate(courses=1, students=enrollments, enrollments_per_course=enrollments, reviews_per_course=reviews)
+        tracemalloc.start()
+        start = time.perf_counter()
+        delete(app, client)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        left = Enrollment.query.count() + Review.query.count()
+        db.session.remove()
+    return elapsed, peak, left
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--enrollments', type=int, default=100_000)
+    parser.add_argument('--reviews', type=int, default=5_000)
+    args = parser.parse_args()
+
+    print(f"One course with {args.enrollments:,} enrollments and {args.reviews:,} reviews")
+    print(f"{'method':>18} {'ms':>10} {'peak MiB':>10} {'rows left':>10}")
+    for name, delete in (('orm cascade', orm_cascade), ('DELETE /courses/1', delete_endpoint)):
+        elapsed, peak, left = run(delete, args.enrollments, args.reviews)
+        print(f"{name:>18} {elapsed * 1000:>10.1f} {peak / 2 ** 20:>10.1f} {left:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Bytes and CPU per request for JSON responses, per encoding setup.
+
+    python -m benchmarks.encoding [--courses 200] [--requests 50]
+
+Each setup serves the same endpoints from an in-memory catalog with the
+response cache off, so every request renders and compresses its body:
+
+- before: Flask's pretty-printed JSON, uncompressed (the old default)
+- compact: FastJSONProvider, uncompressed
+- compact + <encoding>: FastJSONProvider, compressed when the client accepts it
+
+A last row runs with the response cache on. There the course endpoints are
+hits on a stored compressed variant; /reviews is not cached. CPU is
+process time per request, including the test client.
+"""
+import argparse
+import time
+
+from flask.json.provider import DefaultJSONProvider
+
+from benchmarks.common import make_app, populate
+from encoding import available_codecs
+
+ENDPOINTS = ('/courses?limit=200', '/courses/1', '/reviews')
+
+
+def measure(app, path, encoding, requests):
+    client = app.test_client()
+    headers = {'Accept-Encoding': encoding} if encoding else {}
+    response = client.get(path, headers=headers)
+    assert response.status_code == 200, response.status_code
+    started = time.process_time()
+    for _ in range(requests):
+        client.get(path, headers=headers)
+    return len(response.data), (time.process_time() - started) / requests
+
+
+def build(courses, config):
+    app = make_app(config=config)
+    with app.app_context():
+        populate(courses=courses, students=courses * 5, enrollments_per_course=20, reviews_per_course=5)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--courses', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=50)
+    args = parser.parse_args()
+
+    uncached = {'RESPONSE_CACHE_ENABLED': False}
+    before = build(args.courses, {**uncached, 'COMPRESSION_ENABLED': False})
+    before.json = DefaultJSONProvider(before)
+    before.json.compact = False
+    after = build(args.courses, uncached)
+    cached = build(args.courses, {})
+    setups = [('before', before, None), ('compact', after, None)]
+    setups += [(f'compact + {encoding}', after, encoding) for encoding in available_codecs()]
+    setups.append(('cached gzip variant', cached, 'gzip'))
+
+    print(f"{args.requests} requests per cell")
+    print(f"{'setup':>20} " + ' '.join(f"{path:>30}" for path in ENDPOINTS))
+    for name, app, encoding in setups:
+        cells = []
+        for path in ENDPOINTS:
+            size, cpu = measure(app, path, encoding, args.requests)
+            cells.append(f"{size / 1024:>10.1f} KiB {cpu * 1000:>8.2f} ms cpu")
+        print(f"{name:>20} " + ' '.join(f"{cell:>30}" for cell in cells))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Duplicate-enrollment lookup on a large enrollments table: full scan vs. index.
+
+    python -m benchmarks.enrollment_index [--rows 1000000] [--lookups 200]
+
+Uses the sqlite3 module directly so only the lookup itself is measured.
+"""
+import argparse
+import random
+import sqlite3
+import time
+
+LOOKUP = 'SELECT 1 FROM enrollments WHERE user_id = ? AND course_id = ? LIMIT 1'
+
+
+def build(rows, seed):
+    rng = random.Random(seed)
+    connection = sqlite3.connect(':memory:')
+    connection.execute(
+        'CREATE TABLE enrollments (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, '
+        'course_id INTEGER NOT NULL, enrollment_date DATETIME NOT NULL)'
+    )
+    users, courses = max(1, rows // 20), max(1, rows // 500)
+    pairs = set()
+    while len(pairs) < rows:
+        pairs.add((rng.randint(1, users), rng.randint(1, courses)))
+    connection.executemany(
+        "INSERT INTO enrollments (user_id, course_id, enrollment_date) VALUES (?, ?, '2026-01-01')",
+        pairs,
+    )
+    connection.commit()
+    return connection, list(pairs), users, courses
+
+
+def measure(connection, probes):
+    plan = connection.execute('EXPLAIN QUERY PLAN ' + LOOKUP, probes[0]).fetchall()[-1][-1]
+    start = time.perf_counter()
+    for probe in probes:
+        connection.execute(LOOKUP, probe).fetchone()
+    elapsed = time.perf_counter() - start
+    return plan, elapsed / len(probes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--lookups', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"Seeding {args.rows:,} enrollments...")
+    connection, pairs, users, courses = build(args.rows, args.seed)
+    rng = random.Random(args.seed)
+    # Half hits (existing enrollments), half misses (new enrollments).
+    probes = rng.sample(pairs, args.lookups // 2) + [
+        (users + rng.randint(1, 1000), rng.randint(1, courses)) for _ in range(args.lookups - args.lookups // 2)
+    ]
+
+    scan_plan, scan = measure(connection, probes)
+    connection.execute(
+        'CREATE UNIQUE INDEX uq_enrollments_user_id_course_id ON enrollments (user_id, course_id)'
+    )
+    index_plan, indexed = measure(connection, probes)
+
+    print(f"{'':<8} {'per lookup':>12}  plan")
+    print(f"{'scan':<8} {scan * 1e6:>10.1f}us  {scan_plan}")
+    print(f"{'index':<8} {indexed * 1e6:>10.1f}us  {index_plan}")
+    print(f"speedup: {scan / indexed:,.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""POST /enrollments latency with the similarity update inline vs. deferred to the job queue.
+
+    python -m benchmarks.jobs [--courses 300] [--students 2000] [--requests 500] [--rate 0]
+
+Builds a catalog where each student already holds about --per-student
+enrollments, so folding one new enrollment into course_similarities
+touches that many pairs. Then it posts --requests new enrollments, once
+with JOBS_ENABLED off (the fold runs inside the request's transaction)
+and once on (the request only adds an outbox row). By default requests
+are sent back to back. --rate spaces them out to that many per second,
+which leaves the job workers idle time the way real traffic does. It
+reports request latency and the time until the queue is empty, and checks
+that both runs store the same co-enrollment count for every pair they both
+keep. Which pairs make a course's top SIMILARITIES_PER_COURSE can differ
+with how the enrollments were batched (see record_enrollments()).
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import func, select
+
+from benchmarks.common import make_app, populate
+from benchmarks.load_test import percentile
+from jobs import jobs
+from models import db, CourseSimilarity, OutboxJob
+from recommendations import build_similarities
+
+
+def build(workdir, args, config):
+    app = make_app(f'sqlite:///{os.path.join(workdir, "bench.db")}', config)
+    with app.app_context():
+        populate(courses=args.courses, students=args.students, reviews_per_course=0,
+                 enrollments_per_course=args.students * args.per_student // args.courses)
+        build_similarities(db.session.connection())
+        db.session.commit()
+    instructors = max(1, args.courses // 10)
+    return app, range(instructors + 1, instructors + args.students + 1)
+
+
+def post_enrollments(app, students, args):
+    client = app.test_client()
+    rng = random.Random(11)
+    latencies, statuses = [], {}
+    started = time.perf_counter()
+    for i in range(args.requests):
+        if args.rate:
+            time.sleep(max(0, started + i / args.rate - time.perf_counter()))
+        body = {'user_id': rng.choice(students), 'course_id': rng.randint(1, args.courses),
+                'enrollment_date': '2024-06-01T00:00:00'}
+        sent = time.perf_counter()
+        status = client.post('/enrollments', json=body).status_code
+        latencies.append(time.perf_counter() - sent)
+        statuses[status] = statuses.get(status, 0) + 1
+    while True:
+        with app.app_context():
+            queued = db.session.scalar(select(func.count()).select_from(OutboxJob))
+            db.session.remove()
+        if not queued:
+            break
+        time.sleep(0.05)
+    return sorted(latencies), time.perf_counter() - started, statuses
+
+
+def similarity_counts(app):
+    with app.app_context():
+        return {
+            (a, b): n for a, b, n in db.session.execute(
+                select(CourseSimilarity.course_id, CourseSimilarity.similar_course_id, CourseSimilarity.co_count)
+            )
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--courses', type=int, default=300)
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--per-student', type=int, default=40)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--rate', type=float, default=0, help='Requests per second; 0 sends them back to back.')
+    args = parser.parse_args()
+
+    pace = f"{args.rate:g}/s" if args.rate else "back to back"
+    print(f"{args.requests} enrollments ({pace}), {args.per_student} prior enrollments per student")
+    print(f"{'similarity update':>18} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8} {'until drained s':>16}  statuses")
+    counts = {}
+    for name, config in (('inline', {'JOBS_ENABLED': False}), ('deferred', {'JOBS_ENABLED': True, 'JOBS_POLL_INTERVAL': 0.5})):
+        with tempfile.TemporaryDirectory(prefix='coursify-bench-') as workdir:
+            app, students = build(workdir, args, config)
+            latencies, total, statuses = post_enrollments(app, list(students), args)
+            counts[name] = similarity_counts(app)
+            jobs.shutdown(app)
+        print(f"{name:>18} {percentile(latencies, 0.5) * 1000:>8.2f} {percentile(latencies, 0.95) * 1000:>8.2f} "
+              f"{statistics.mean(latencies) * 1000:>8.2f} {total:>16.2f}  {statuses}")
+    inline, deferred = counts['inline'], counts['deferred']
+    assert all(inline[pair] == deferred[pair] for pair in inline.keys() & deferred.keys()), \
+        "co-enrollment counts differ"
+
+
+if __name__ == '__main__':
+    main()
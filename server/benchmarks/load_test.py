@@ -0,0 +1,105 @@
+"""Closed-loop HTTP load test for comparing the WSGI and ASGI servers.
+
+Start both servers against the same database, then point the script at them:
+
+    gunicorn --preload -w 4 -b :5555 wsgi:app
+    uvicorn asgi:app --workers 4 --port 5556
+    python -m benchmarks.load_test --url http://localhost:5555 --url http://localhost:5556 \\
+        --path /courses --path /courses/1 --concurrency 32 --duration 10
+
+Each worker thread keeps one keep-alive connection open and cycles through
+the paths. Requests/sec and latency percentiles are printed per target.
+
+With the response cache on (the default) both servers answer the course
+routes from Flask's cache (see asgi.py). Compare /users paths to measure
+the async handlers.
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def worker(target, paths, deadline, latencies, errors):
+    parts = urlsplit(target)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+    i = 0
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            errors.append(path)
+            connection.close()
+            continue
+        latencies.append(time.perf_counter() - start)
+        if response.status >= 400:
+            errors.append(path)
+    connection.close()
+
+
+def run(target, paths, concurrency, duration):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    threads = [
+        threading.Thread(target=worker, args=(target, paths, deadline, latencies, errors))
+        for _ in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'url': target,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        **{
+            f'p{int(q * 100)}_ms': round(percentile(latencies, q) * 1000, 2) if latencies else None
+            for q in (0.5, 0.95, 0.99)
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', action='append', required=True, help='server base URL; repeat to compare')
+    parser.add_argument('--path', action='append', help='path to request; repeat to mix (default /courses)')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per target')
+    parser.add_argument('--output', help='also write the results as JSON to this file')
+    args = parser.parse_args()
+    paths = args.path or ['/courses']
+
+    results = []
+    print(f"{'url':<32} {'req/s':>9} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}")
+    for target in args.url:
+        result = run(target.rstrip('/'), paths, args.concurrency, args.duration)
+        results.append(result)
+        print(f"{result['url']:<32} {result['requests_per_second']:>9} {result['p50_ms']:>6}ms "
+              f"{result['p95_ms']:>6}ms {result['p99_ms']:>6}ms {result['errors']:>7}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'paths': paths, 'concurrency': args.concurrency, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
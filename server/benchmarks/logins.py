@@ -0,0 +1,73 @@
+"""Logins per second for one app process, hashing inline vs on the process pool.
+
+    python -m benchmarks.logins [--method scrypt:32768:8:1] [--threads 8] [--workers 0 --workers 4]
+
+Each configuration gets a fresh app over a temporary SQLite file. The app's
+request threads post to /login for --duration seconds. Workers 0 hashes in
+the request thread. The pool's throughput scales with the cores it is
+given; on one core it mostly takes the hashing off the request threads.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from benchmarks.common import make_app, populate
+from hashing import password_hasher
+from models import db, User
+
+USERS = 200
+
+
+def run(method, workers, threads, duration):
+    with tempfile.TemporaryDirectory(prefix='coursify-bench-') as workdir:
+        app = make_app(f'sqlite:///{os.path.join(workdir, "bench.db")}')
+        app.config.update(PASSWORD_HASH_METHOD=method, PASSWORD_HASH_WORKERS=workers)
+        with app.app_context():
+            populate(courses=10, students=USERS, enrollments_per_course=0, reviews_per_course=0)
+            pwhash = password_hasher.hash('password')
+            db.session.execute(User.__table__.update().values(password_hash=pwhash))
+            db.session.commit()
+
+        counts = [0] * threads
+        deadline = time.perf_counter() + duration
+
+        def worker(slot):
+            client = app.test_client()
+            i = slot
+            while time.perf_counter() < deadline:
+                response = client.post('/login', json={'username': f'user{i % USERS + 1}', 'password': 'password'})
+                if response.status_code != 200:
+                    raise SystemExit(f"login failed: {response.status_code} {response.get_data(as_text=True)}")
+                counts[slot] += 1
+                i += threads
+
+        pool = [threading.Thread(target=worker, args=(slot,)) for slot in range(threads)]
+        started = time.perf_counter()
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        password_hasher.shutdown()
+        return sum(counts) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--method', default='scrypt:32768:8:1')
+    parser.add_argument('--threads', type=int, default=8, help='request threads in the app process')
+    parser.add_argument('--workers', type=int, action='append', help='PASSWORD_HASH_WORKERS values to compare')
+    parser.add_argument('--duration', type=float, default=5.0)
+    args = parser.parse_args()
+    workers = args.workers or [0, os.cpu_count() or 1]
+
+    print(f"{args.method}, {args.threads} request threads, {os.cpu_count()} cores")
+    print(f"{'hash workers':>12} {'logins/s':>10}")
+    for count in workers:
+        print(f"{count or 'inline':>12} {run(args.method, count, args.threads, args.duration):>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
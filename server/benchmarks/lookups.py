@@ -0,0 +1,124 @@
+"""Existence checks on the write paths: lookup cache off vs. on, plus a consistency run.
+
+    python -m benchmarks.lookups [--requests 2000] [--threads 4]
+
+Posts reviews for random (student, course) pairs, from one hot set of
+students and courses, and reports statements and wall time per request.
+Then it checks consistency under concurrent deletes. Writer threads
+enroll students while another thread deletes half the courses. Every
+post must answer 201 or 404, and no enrollment may point at a deleted
+course. Posting to a deleted course afterwards must always give 404,
+including through a worker that cached the course before another process
+deleted it.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from sqlalchemy import event
+
+from benchmarks.common import make_app, populate
+from models import db
+
+COURSES = 200
+STUDENTS = 1000
+
+
+def build(workdir, config=None):
+    app = make_app(f'sqlite:///{os.path.join(workdir, "bench.db")}', config)
+    with app.app_context():
+        populate(courses=COURSES, students=STUDENTS, enrollments_per_course=0, reviews_per_course=0)
+    return app
+
+
+def review_throughput(app, requests):
+    statements = []
+    with app.app_context():
+        engine = db.engine
+    count = lambda *args: statements.append(1)
+    event.listen(engine, 'before_cursor_execute', count)
+    rng = random.Random(1)
+    client = app.test_client()
+    started = time.perf_counter()
+    for _ in range(requests):
+        client.post('/reviews', json={
+            'user_id': COURSES // 10 + rng.randint(1, 50), 'course_id': rng.randint(1, 20),
+            'rating': 4, 'text_content': 'Benchmark review text.',
+        })
+    elapsed = time.perf_counter() - started
+    event.remove(engine, 'before_cursor_execute', count)
+    return len(statements) / requests, elapsed / requests
+
+
+def enroll(client, user_id, course_id):
+    return client.post('/enrollments', json={
+        'user_id': user_id, 'course_id': course_id, 'enrollment_date': '2024-01-01T00:00:00',
+    }).status_code
+
+
+def check_concurrent_deletes(app, workdir, threads):
+    deleted = list(range(2, COURSES + 1, 2))
+    unexpected = []
+
+    def writer(slot):
+        client = app.test_client()
+        for course_id in range(1, COURSES + 1):
+            status = enroll(client, COURSES // 10 + 1 + slot, course_id)
+            if status not in (201, 404):
+                unexpected.append(status)
+
+    def deleter():
+        client = app.test_client()
+        for course_id in deleted:
+            client.delete(f'/courses/{course_id}')
+
+    pool = [threading.Thread(target=writer, args=(slot,)) for slot in range(threads)]
+    pool.append(threading.Thread(target=deleter))
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+
+    client = app.test_client()
+    after = {enroll(client, STUDENTS, course_id) for course_id in deleted}
+    # Another process deletes a course this worker has cached; no ORM events fire here.
+    assert enroll(client, STUDENTS - 1, 1) == 201
+    connection = sqlite3.connect(os.path.join(workdir, 'bench.db'))
+    connection.execute('PRAGMA foreign_keys=ON')
+    with connection:
+        connection.execute('DELETE FROM courses WHERE id = 1')
+    connection.close()
+    external = enroll(client, STUDENTS - 2, 1)
+    with app.app_context():
+        orphans = db.session.execute(db.text(
+            'SELECT COUNT(*) FROM enrollments LEFT JOIN courses ON courses.id = enrollments.course_id '
+            'WHERE courses.id IS NULL'
+        )).scalar()
+    return unexpected, after, external, orphans
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'POST /reviews':>22} {'statements':>11} {'ms':>8}")
+    for name, config in (('lookup cache off', {'LOOKUP_CACHE_ENABLED': False}), ('lookup cache on', {})):
+        with tempfile.TemporaryDirectory(prefix='coursify-bench-') as workdir:
+            statements, seconds = review_throughput(build(workdir, config), args.requests)
+        print(f"{name:>22} {statements:>11.1f} {seconds * 1000:>8.2f}")
+
+    with tempfile.TemporaryDirectory(prefix='coursify-bench-') as workdir:
+        unexpected, after, external, orphans = check_concurrent_deletes(build(workdir), workdir, args.threads)
+    print(f"concurrent deletes: unexpected statuses {unexpected or 'none'}, orphaned enrollments {orphans}, "
+          f"posts to deleted courses {sorted(after)}, after an external delete {external}")
+    assert not unexpected and not orphans and after == {404} and external == 404
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Per-request overhead of the rate limiter and admission control.
+
+    python -m benchmarks.ratelimit [--requests 20000] [--threads 4] [--redis-url URL]
+
+Times a trivial POST route through the test client, with the checks off
+and on, from --threads threads at once. The limits are high enough that
+every request passes, so the numbers are the cost of the check itself. It
+also times MemoryBuckets.take() on its own over 10k client keys. With
+--redis-url it adds the shared Redis backend.
+"""
+import argparse
+import threading
+import time
+
+from benchmarks.common import make_app
+from ratelimit import MemoryBuckets
+
+UNLIMITED = (1e9, 1e9)
+
+
+def per_request(config, requests, threads):
+    app = make_app(config=config)
+    app.add_url_rule('/ping', 'ping', lambda: '', methods=['POST'])
+    app.test_client().post('/ping')
+
+    def worker(slot):
+        client = app.test_client()
+        environ = {'REMOTE_ADDR': f'10.0.{slot // 256}.{slot % 256}'}
+        for _ in range(requests // threads):
+            client.post('/ping', environ_base=environ)
+
+    pool = [threading.Thread(target=worker, args=(slot,)) for slot in range(threads)]
+    started = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return (time.perf_counter() - started) / (requests // threads * threads)
+
+
+def per_take(buckets, calls, keys=10_000):
+    started = time.perf_counter()
+    for i in range(calls):
+        buckets.take(f'client:{i % keys}', *UNLIMITED)
+    return (time.perf_counter() - started) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20_000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--redis-url')
+    args = parser.parse_args()
+
+    limited = {'RATE_LIMIT_ENABLED': True, 'RATE_LIMITS': {'POST /ping': UNLIMITED}}
+    setups = {
+        'no checks': {},
+        'rate limit (memory)': limited,
+        'admission control': {'ADMISSION_MAX_WRITES': 1_000},
+        'both': {**limited, 'ADMISSION_MAX_WRITES': 1_000},
+    }
+    if args.redis_url:
+        setups['rate limit (redis)'] = {**limited, 'RATE_LIMIT_BACKEND': 'redis',
+                                        'RATE_LIMIT_REDIS_URL': args.redis_url}
+
+    print(f"{args.requests:,} requests from {args.threads} threads")
+    baseline = None
+    for name, config in setups.items():
+        seconds = per_request(config, args.requests, args.threads)
+        baseline = baseline or seconds
+        print(f"{name:>22} {seconds * 1e6:>8.1f} us/request  {(seconds - baseline) * 1e6:>+7.1f} us")
+    print(f"{'MemoryBuckets.take':>22} {per_take(MemoryBuckets(), args.requests) * 1e6:>8.2f} us/call")
+
+
+if __name__ == '__main__':
+    main()
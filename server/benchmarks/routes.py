@@ -0,0 +1,298 @@
+"""Exercises every route of create_app() under concurrency.
+
+    python -m benchmarks.routes --scale 5000 --output results.json
+    python -m benchmarks.routes --database instance/coursify.db --compare results.json
+
+Requests go through one Flask test client per worker thread, so the numbers
+cover the app and the database but not a network server. For each scenario
+the suite reports requests/sec, p50/p95/p99 latency and SQL statements per
+request. --output stores the results as JSON. --compare prints the change
+against an earlier run and exits non-zero if any scenario regressed by
+more than --threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask_migrate import upgrade
+from sqlalchemy import event
+
+from app import create_app, init_migrations
+from benchmarks.load_test import percentile
+from models import db
+from seed import TOPICS, run_scaled_seed
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+BULK_ITEMS = 100
+# Scenarios that return whole tables run this fraction of --requests.
+HEAVY_FRACTION = 0.05
+
+
+class Context:
+    """Id ranges and state shared by the request factories."""
+
+    def __init__(self, users, courses):
+        self.users = users
+        self.courses = courses
+        self.lock = threading.Lock()
+        self.created_courses = []
+        self.counter = 0
+
+    def unique(self):
+        with self.lock:
+            self.counter += 1
+            return f'{os.getpid()}-{time.time_ns()}-{self.counter}'
+
+    def pop_created_course(self):
+        with self.lock:
+            return self.created_courses.pop() if self.created_courses else self.courses
+
+
+def _enrollment(rng, ctx):
+    return {'user_id': rng.randint(1, ctx.users), 'course_id': rng.randint(1, ctx.courses),
+            'enrollment_date': (datetime.utcnow() - timedelta(days=rng.randint(0, 365))).isoformat()}
+
+
+def _review(rng, ctx):
+    return {'user_id': rng.randint(1, ctx.users), 'course_id': rng.randint(1, ctx.courses),
+            'rating': rng.randint(1, 5), 'text_content': 'Benchmark review, written by the route suite.'}
+
+
+def _new_user(ctx):
+    name = f'bench{ctx.unique()}'
+    return {'username': name, 'email': f'{name}@example.com', 'password': 'password'}
+
+
+def _new_course(rng, ctx):
+    return {'title': f'Benchmark course {ctx.unique()}', 'description': 'Created by the route benchmark suite.',
+            'difficulty': 'Beginner', 'duration_hours': rng.randint(1, 40), 'instructor_id': 1}
+
+
+def _record_created_course(ctx, response):
+    if response.status_code == 201:
+        with ctx.lock:
+            ctx.created_courses.append(response.get_json()['id'])
+
+
+# name -> (endpoint, request factory, heavy, response hook). Factories return
+# (method, path, json body). Scenarios run in this order, so the course
+# delete scenario removes courses made by course_create.
+SCENARIOS = {
+    'home': ('home', lambda rng, ctx: ('GET', '/', None), False, None),
+    'users_list': ('get_users', lambda rng, ctx: ('GET', '/users', None), True, None),
+    'user_detail': ('get_user_by_id', lambda rng, ctx: ('GET', f'/users/{rng.randint(1, ctx.users)}', None),
+                    False, None),
+    'user_create': ('create_user', lambda rng, ctx: ('POST', '/users', _new_user(ctx)), False, None),
+    'users_bulk': ('users_bulk_create',
+                   lambda rng, ctx: ('POST', '/users/bulk', [_new_user(ctx) for _ in range(BULK_ITEMS)]), True, None),
+    'login': ('login', lambda rng, ctx: ('POST', '/login', {'username': f'user{rng.randint(1, ctx.users)}',
+                                                             'password': 'password'}), False, None),
+    'user_dashboard': ('get_user_dashboard',
+                       lambda rng, ctx: ('GET', f'/users/{rng.randint(1, ctx.users)}/dashboard', None), False, None),
+    'user_recommendations': ('get_user_recommendations',
+                             lambda rng, ctx: ('GET', f'/users/{rng.randint(1, ctx.users)}/recommendations', None),
+                             False, None),
+    'stats_popular': ('get_popular_courses', lambda rng, ctx: ('GET', '/stats/popular', None), False, None),
+    'stats_top_rated': ('get_top_rated_courses', lambda rng, ctx: ('GET', '/stats/top-rated', None), False, None),
+    'courses_page': ('courses_list_create',
+                     lambda rng, ctx: ('GET', f'/courses?after_id={rng.randint(0, ctx.courses)}', None), False, None),
+    'courses_fields': ('courses_list_create',
+                       lambda rng, ctx: ('GET', '/courses?fields=id,title,difficulty&limit=200', None), False, None),
+    'course_search': ('courses_search',
+                      lambda rng, ctx: ('GET', f'/courses/search?q={rng.choice(TOPICS).split()[0]}', None),
+                      False, None),
+    'course_detail': ('course_detail_update_delete',
+                      lambda rng, ctx: ('GET', f'/courses/{rng.randint(1, ctx.courses)}', None), False, None),
+    'course_create': ('courses_list_create', lambda rng, ctx: ('POST', '/courses', _new_course(rng, ctx)),
+                      False, _record_created_course),
+    'course_update': ('course_detail_update_delete',
+                      lambda rng, ctx: ('PATCH', f'/courses/{rng.randint(1, ctx.courses)}',
+                                        {'duration_hours': rng.randint(1, 80)}), False, None),
+    'course_delete': ('course_detail_update_delete',
+                      lambda rng, ctx: ('DELETE', f'/courses/{ctx.pop_created_course()}', None), False, None),
+    'enrollments_list': ('enrollments_list_create', lambda rng, ctx: ('GET', '/enrollments', None), True, None),
+    'enrollments_recent': ('enrollments_list_create',
+                           lambda rng, ctx: ('GET', f'/enrollments?since={(datetime.utcnow() - timedelta(days=7)).date()}',
+                                             None), False, None),
+    'enrollments_ndjson': ('enrollments_list_create', lambda rng, ctx: ('GET', '/enrollments?format=ndjson', None),
+                           True, None),
+    'enrollment_create': ('enrollments_list_create', lambda rng, ctx: ('POST', '/enrollments', _enrollment(rng, ctx)),
+                          False, None),
+    'enrollments_bulk': ('enrollments_bulk_create',
+                         lambda rng, ctx: ('POST', '/enrollments/bulk', [_enrollment(rng, ctx) for _ in range(BULK_ITEMS)]),
+                         False, None),
+    'reviews_list': ('reviews_list', lambda rng, ctx: ('GET', '/reviews', None), True, None),
+    'reviews_csv': ('reviews_list', lambda rng, ctx: ('GET', '/reviews?format=csv', None), True, None),
+    'review_create': ('create_review', lambda rng, ctx: ('POST', '/reviews', _review(rng, ctx)), False, None),
+    'reviews_bulk': ('reviews_bulk_create',
+                     lambda rng, ctx: ('POST', '/reviews/bulk', [_review(rng, ctx) for _ in range(BULK_ITEMS)]),
+                     False, None),
+}
+
+
+def prepare_app(args, workdir):
+    if args.database:
+        uri = f'sqlite:///{os.path.abspath(args.database)}'
+    else:
+        uri = f'sqlite:///{os.path.join(workdir, "bench.db")}'
+    app = create_app({'SQLALCHEMY_DATABASE_URI': uri})
+    if not args.database:
+        init_migrations(app)
+        with app.app_context():
+            upgrade(directory=MIGRATIONS)
+        run_scaled_seed(app, args.scale, args.seed)
+    return app
+
+
+def run_scenario(app, ctx, name, total, concurrency, seed):
+    _, make_request, _, on_response = SCENARIOS[name]
+    local = threading.local()
+    samples, errors, statuses = [], [], {}
+    lock = threading.Lock()
+
+    def count_statement(*_):
+        if getattr(local, 'active', False):
+            local.statements += 1
+
+    def worker(worker_id, count):
+        rng = random.Random(f'{seed}-{name}-{worker_id}')
+        client = app.test_client()
+        local.active = True
+        for _ in range(count):
+            method, path, body = make_request(rng, ctx)
+            local.statements = 0
+            start = time.perf_counter()
+            try:
+                response = client.open(path, method=method, json=body)
+                response.get_data()
+            except Exception as e:
+                with lock:
+                    errors.append(repr(e))
+                continue
+            elapsed = time.perf_counter() - start
+            if on_response:
+                on_response(ctx, response)
+            with lock:
+                samples.append((elapsed, local.statements))
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                if response.status_code >= 500:
+                    errors.append(f'{method} {path}: {response.status_code}')
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count_statement)
+    try:
+        shares = [total // concurrency + (i < total % concurrency) for i in range(concurrency)]
+        threads = [threading.Thread(target=worker, args=(i, n)) for i, n in enumerate(shares) if n]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_statement)
+
+    latencies = sorted(s[0] for s in samples)
+    return {
+        'requests': len(samples),
+        'errors': len(errors),
+        'statuses': {str(k): v for k, v in sorted(statuses.items())},
+        'requests_per_second': round(len(samples) / wall, 1) if wall else None,
+        **{
+            f'p{int(q * 100)}_ms': round(percentile(latencies, q) * 1000, 2) if latencies else None
+            for q in (0.5, 0.95, 0.99)
+        },
+        'queries_per_request': round(sum(s[1] for s in samples) / len(samples), 2) if samples else None,
+        'first_error': errors[0] if errors else None,
+    }
+
+
+def compare(previous, current, threshold):
+    """Prints p50/p95/queries changes per scenario; returns the names that regressed."""
+    regressed = []
+    print(f"\n{'scenario':<22} {'p50':>16} {'p95':>16} {'queries':>14}")
+    for name, now in current['scenarios'].items():
+        before = previous.get('scenarios', {}).get(name)
+        if not before:
+            print(f'{name:<22} (new)')
+            continue
+        cells, worse = [], False
+        for key in ('p50_ms', 'p95_ms', 'queries_per_request'):
+            old, new = before.get(key), now.get(key)
+            if not old or new is None:
+                cells.append('-')
+                continue
+            change = (new - old) / old
+            worse = worse or change > threshold
+            cells.append(f'{old:g}->{new:g} {change:+.0%}')
+        if worse:
+            regressed.append(name)
+        print(f"{name:<22} {cells[0]:>16} {cells[1]:>16} {cells[2]:>14}{'  REGRESSED' if worse else ''}")
+    return regressed
+
+
+def run_suite(args, app):
+    ctx = Context(users=0, courses=0)
+    with app.app_context():
+        ctx.users = db.session.execute(db.text('SELECT MAX(id) FROM users')).scalar() or 1
+        ctx.courses = db.session.execute(db.text('SELECT MAX(id) FROM courses')).scalar() or 1
+
+    exercised = {SCENARIOS[name][0] for name in SCENARIOS}
+    missing = sorted({rule.endpoint for rule in app.url_map.iter_rules()} - exercised - {'static'})
+    if missing:
+        print(f"warning: no scenario for {', '.join(missing)}", file=sys.stderr)
+
+    results = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(timespec='seconds'),
+            'database': args.database, 'scale': None if args.database else args.scale,
+            'concurrency': args.concurrency, 'requests': args.requests,
+            'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+        },
+        'scenarios': {},
+    }
+    print(f"{'scenario':<22} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'queries':>8} {'errors':>7}")
+    for name in args.scenario or SCENARIOS:
+        total = max(1, round(args.requests * HEAVY_FRACTION)) if SCENARIOS[name][2] else args.requests
+        result = run_scenario(app, ctx, name, total, args.concurrency, args.seed)
+        results['scenarios'][name] = result
+        print(f"{name:<22} {result['requests_per_second']:>8} {result['p50_ms']:>7}ms {result['p95_ms']:>7}ms "
+              f"{result['p99_ms']:>7}ms {result['queries_per_request']:>8} {result['errors']:>7}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressed = compare(json.load(f), results, args.threshold)
+        if regressed:
+            sys.exit(f"regressed: {', '.join(regressed)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', help='existing SQLite database to run against (it will be written to)')
+    parser.add_argument('--scale', type=int, default=2000, help='students to seed when no --database is given')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS), help='run only these; repeatable')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='earlier results JSON to diff against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='relative slowdown counted as a regression')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='coursify-bench-') as workdir:
+        run_suite(args, prepare_app(args, workdir))
+
+if __name__ == '__main__':
+    main()
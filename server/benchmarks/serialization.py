@@ -0,0 +1,40 @@
+"""Compares SerializerMixin.to_dict() with the compiled serializers.
+
+    python -m benchmarks.serialization [--courses N]
+"""
+import argparse
+
+from benchmarks.common import make_app, populate, timeit
+from models import db, User, Course, Enrollment
+from serializers import course_serializer, enrollment_serializer, user_serializer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--courses', type=int, default=500)
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        populate(courses=args.courses)
+        cases = [
+            ('courses', Course, course_serializer),
+            ('enrollments', Enrollment, enrollment_serializer),
+            ('users', User, user_serializer),
+        ]
+        print(f"{'case':<12} {'rows':>7} {'to_dict':>10} {'compiled':>10} {'speedup':>8}")
+        for name, model, serializer in cases:
+            # Load the full graph up front so both sides measure serialization only.
+            rows = db.session.query(model).options(*serializer.loader_options()).all()
+            expected = [row.to_dict() for row in rows]
+            if serializer.many(rows) != expected:
+                raise SystemExit(f"compiled output for {name} differs from to_dict()")
+
+            baseline = timeit(lambda: [row.to_dict() for row in rows])
+            compiled = timeit(lambda: serializer.many(rows))
+            print(f"{name:<12} {len(rows):>7} {baseline * 1000:>8.1f}ms {compiled * 1000:>8.1f}ms "
+                  f"{baseline / compiled:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Process start-up: import time per entry module, and time to a first response.
+
+    python -m benchmarks.startup [--module app --module asgi ...] [--top 12] [--runs 3]
+
+Each entry module is imported in a fresh interpreter under -X importtime.
+The report lists the total, the self time per top-level package, and the
+slowest imports the module makes directly (cumulative). The best of --runs
+is kept for each module.
+
+Then it times the start-up phases in a fresh process against a small
+SQLite catalog: import app, create_app(), warm() (see preload.py) and the
+first GET /courses and GET /courses/1. The same phases run with and without
+the warm-up, so the cost moved from the first requests shows up before the
+fork.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+SERVER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODULES = ('app', 'asgi', 'seed')
+
+PHASES = """
+import json, sys, time
+timings = {}
+started = time.perf_counter()
+from app import create_app
+timings['import app'] = time.perf_counter() - started
+started = time.perf_counter()
+app = create_app({'SQLALCHEMY_DATABASE_URI': sys.argv[1], 'RESPONSE_CACHE_ENABLED': False})
+timings['create_app()'] = time.perf_counter() - started
+if sys.argv[2] == 'warm':
+    from preload import warm
+    started = time.perf_counter()
+    warm(app)
+    timings['warm()'] = time.perf_counter() - started
+client = app.test_client()
+for path in ('/courses', '/courses/1'):
+    started = time.perf_counter()
+    assert client.get(path).status_code == 200
+    timings['first GET ' + path] = time.perf_counter() - started
+print(json.dumps(timings))
+"""
+
+
+def parse_importtime(stderr):
+    """Parses -X importtime output into [(depth, name, self_us, cumulative_us)] in report order."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        imports.append((depth, name.strip(), int(self_us), int(cumulative_us)))
+    return imports
+
+
+def import_profile(module):
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=SERVER, capture_output=True, text=True, env={**os.environ, 'PYTHONPATH': SERVER},
+    )
+    if result.returncode:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    return own_imports(parse_importtime(result.stderr), module)
+
+
+def own_imports(imports, module):
+    """The lines for `import module`: its own line and the nested ones printed just before it."""
+    end = max(i for i, entry in enumerate(imports) if entry[0] == 0 and entry[1] == module)
+    start = end
+    while start > 0 and imports[start - 1][0] > 0:
+        start -= 1
+    return imports[start:end + 1]
+
+
+def report_imports(module, imports, top):
+    by_package = defaultdict(int)
+    for _, name, self_us, _ in imports:
+        by_package[name.split('.')[0]] += self_us
+    direct = [entry for entry in imports if entry[0] == 1]
+
+    print(f"import {module}: {imports[-1][3] / 1000:.1f} ms, {len(imports)} modules")
+    print(f"  {'self time by package':<40} {'ms':>8}")
+    for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {package:<40} {self_us / 1000:>8.1f}")
+    print(f"  {'direct imports (cumulative)':<40} {'ms':>8}")
+    for _, name, _, cumulative_us in sorted(direct, key=lambda entry: -entry[3])[:top]:
+        print(f"  {name:<40} {cumulative_us / 1000:>8.1f}")
+
+
+def startup_phases(database_uri, mode):
+    result = subprocess.run(
+        [sys.executable, '-c', PHASES, database_uri, mode],
+        cwd=SERVER, capture_output=True, text=True, env={**os.environ, 'PYTHONPATH': SERVER},
+    )
+    if result.returncode:
+        raise RuntimeError(f"start-up run failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--module', action='append', dest='modules')
+    parser.add_argument('--top', type=int, default=12)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    for module in args.modules or DEFAULT_MODULES:
+        runs = [import_profile(module) for _ in range(args.runs)]
+        best = min(runs, key=lambda imports: imports[-1][3])
+        report_imports(module, best, args.top)
+        print()
+
+    from benchmarks.common import make_app, populate
+    from models import db
+
+    with tempfile.TemporaryDirectory(prefix='coursify-bench-') as workdir:
+        database_uri = f'sqlite:///{os.path.join(workdir, "bench.db")}'
+        app = make_app(database_uri)
+        with app.app_context():
+            populate(courses=200, students=1000, enrollments_per_course=20, reviews_per_course=5)
+            db.engine.dispose()
+        results = {mode: min((startup_phases(database_uri, mode) for _ in range(args.runs)),
+                             key=lambda timings: sum(timings.values()))
+                   for mode in ('cold', 'warm')}
+
+    phases = list(results['warm'])
+    print(f"{'phase':>22} " + ' '.join(f"{mode + ' ms':>10}" for mode in results))
+    for phase in phases:
+        cells = [f"{results[mode][phase] * 1000:>10.1f}" if phase in results[mode] else f"{'-':>10}"
+                 for mode in results]
+        print(f"{phase:>22} " + ' '.join(cells))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Enrollments per second through POST /enrollments, per SQLite mode.
+
+    python -m benchmarks.writes [--threads 32] [--duration 5] [--duplicates 0.1]
+
+Each configuration gets a fresh app over a temporary SQLite file. The
+app's request threads post enrollments for --duration seconds. A fraction
+of them (--duplicates) repeats an earlier pair and must come back as 409.
+The configurations are the old rollback journal with a full sync, and WAL
+with synchronous=NORMAL or FULL, each with and without group commit. Under
+NORMAL a WAL commit does not sync, so group commit mostly pays off under
+FULL or on disks where a sync is slow.
+"""
+import argparse
+import itertools
+import os
+import random
+import tempfile
+import threading
+import time
+
+from benchmarks.common import make_app, populate
+from database import DEFAULT_SQLITE_PRAGMAS
+from group_commit import group_commit
+
+COURSES = 500
+STUDENTS = 2000
+
+FULL_SYNC = {**DEFAULT_SQLITE_PRAGMAS, 'synchronous': 'FULL'}
+CONFIGURATIONS = {
+    'rollback journal': {'SQLITE_PRAGMAS': {**DEFAULT_SQLITE_PRAGMAS, 'journal_mode': 'DELETE', 'synchronous': 'FULL'}},
+    'wal': {},
+    'wal + group commit': {'GROUP_COMMIT_ENABLED': True},
+    'wal full sync': {'SQLITE_PRAGMAS': FULL_SYNC},
+    'wal full sync + group': {'SQLITE_PRAGMAS': FULL_SYNC, 'GROUP_COMMIT_ENABLED': True},
+}
+
+
+def run(config, threads, duration, duplicates):
+    with tempfile.TemporaryDirectory(prefix='coursify-bench-') as workdir:
+        app = make_app(f'sqlite:///{os.path.join(workdir, "bench.db")}', config)
+        with app.app_context():
+            populate(courses=COURSES, students=STUDENTS, enrollments_per_course=0, reviews_per_course=0)
+
+        # Students vary fastest, so each one holds a few enrollments, as in real traffic.
+        pairs = itertools.product(range(1, COURSES + 1), range(COURSES // 10 + 1, COURSES // 10 + STUDENTS + 1))
+        pairs_lock = threading.Lock()
+        statuses = [{} for _ in range(threads)]
+        deadline = time.perf_counter() + duration
+
+        def worker(slot):
+            client = app.test_client()
+            rng = random.Random(slot)
+            sent = []
+            while time.perf_counter() < deadline:
+                if sent and rng.random() < duplicates:
+                    user_id, course_id = rng.choice(sent)
+                else:
+                    with pairs_lock:
+                        course_id, user_id = next(pairs)
+                    sent.append((user_id, course_id))
+                response = client.post('/enrollments', json={
+                    'user_id': user_id, 'course_id': course_id, 'enrollment_date': '2024-01-01T00:00:00',
+                })
+                statuses[slot][response.status_code] = statuses[slot].get(response.status_code, 0) + 1
+
+        pool = [threading.Thread(target=worker, args=(slot,)) for slot in range(threads)]
+        started = time.perf_counter()
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        group_commit.shutdown(app)
+        totals = {}
+        for counts in statuses:
+            for status, count in counts.items():
+                totals[status] = totals.get(status, 0) + count
+        return sum(totals.values()) / elapsed, totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=32, help='request threads in the app process')
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--duplicates', type=float, default=0.1, help='fraction of requests repeating a pair')
+    args = parser.parse_args()
+
+    print(f"{args.threads} request threads, {args.duplicates:.0%} duplicates")
+    print(f"{'mode':>22} {'writes/s':>10}  statuses")
+    for name, config in CONFIGURATIONS.items():
+        rate, statuses = run(config, args.threads, args.duration, args.duplicates)
+        print(f"{name:>22} {rate:>10.1f}  {dict(sorted(statuses.items()))}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+"""Bulk user, enrollment and review ingestion.
+
+Items are validated with the models' own validators, checked against the
+database with set-based lookups, and inserted in chunks of executemany
+INSERTs within a single transaction. Every item gets a result entry, so one
+bad row does not sink the batch.
+"""
+import csv
+import json
+from collections import Counter, defaultdict
+
+from sqlalchemy import insert, select, tuple_
+
+from hashing import password_hasher
+from models import db, User, Course, Enrollment, Review
+from recommendations import defer_record_enrollments
+
+CHUNK_SIZE = 500
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+
+class BulkRequestError(ValueError):
+    """The request body as a whole could not be read."""
+
+
+def read_items(request, max_items):
+    """Yields (index, item_or_error) from a JSON array body or an NDJSON stream."""
+    if request.mimetype in NDJSON_MIMETYPES:
+        items = _read_ndjson(request.stream)
+    else:
+        data = request.get_json(silent=True)
+        if not isinstance(data, list):
+            raise BulkRequestError("Body must be a JSON array or an NDJSON stream.")
+        items = iter(data)
+
+    for index, item in enumerate(items):
+        if index >= max_items:
+            raise BulkRequestError(f"A bulk request may contain at most {max_items} items.")
+        yield index, item
+
+
+def read_file_items(path, max_items):
+    """Like read_items, for a CSV file with a header row or an NDJSON file."""
+    with open(path, newline='') as f:
+        items = csv.DictReader(f) if path.endswith('.csv') else _read_ndjson(f)
+        for index, item in enumerate(items):
+            if index >= max_items:
+                raise BulkRequestError(f"An import may contain at most {max_items} items.")
+            yield index, item
+
+
+def _read_ndjson(stream):
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield ValueError("Line is not valid JSON.")
+
+
+def _error(index, status, message):
+    return {"index": index, "status": status, "errors": [message]}
+
+
+def _check_fields(item, required_fields):
+    if isinstance(item, ValueError):
+        raise item
+    if not isinstance(item, dict):
+        raise ValueError("Item must be a JSON object.")
+    if not all(k in item for k in required_fields):
+        raise ValueError("Missing required fields")
+    for key in ('user_id', 'course_id'):
+        if not isinstance(item[key], int) or isinstance(item[key], bool):
+            raise ValueError(f"{key} must be an integer.")
+
+
+def _existing_values(column, values):
+    found = set()
+    values = list(values)
+    for start in range(0, len(values), CHUNK_SIZE):
+        chunk = values[start:start + CHUNK_SIZE]
+        found.update(db.session.scalars(select(column).where(column.in_(chunk))))
+    return found
+
+
+def _existing_ids(model, ids):
+    return _existing_values(model.id, ids)
+
+
+def _insert_chunks(table, rows):
+    ids = []
+    statement = insert(table).returning(table.c.id, sort_by_parameter_order=True)
+    for start in range(0, len(rows), CHUNK_SIZE):
+        ids.extend(db.session.scalars(statement, rows[start:start + CHUNK_SIZE]))
+    return ids
+
+
+def _resolve_references(candidates, results):
+    """Drops candidates whose user or course does not exist, recording a 404 for each."""
+    users = _existing_ids(User, {row['user_id'] for _, row in candidates})
+    courses = _existing_ids(Course, {row['course_id'] for _, row in candidates})
+    resolved = []
+    for index, row in candidates:
+        if row['user_id'] not in users:
+            results[index] = _error(index, 404, "User not found")
+        elif row['course_id'] not in courses:
+            results[index] = _error(index, 404, "Course not found")
+        else:
+            resolved.append((index, row))
+    return resolved
+
+
+def _finish(results, inserted, ids):
+    for (index, _), new_id in zip(inserted, ids):
+        results[index] = {"index": index, "status": 201, "id": new_id}
+    ordered = [results[i] for i in sorted(results)]
+    return {
+        "created": len(ids),
+        "failed": len(ordered) - len(ids),
+        "results": ordered,
+    }
+
+
+def ingest_enrollments(items):
+    """Inserts enrollments; returns (summary, affected course ids). Caller commits."""
+    results, candidates = {}, []
+    for index, item in items:
+        try:
+            _check_fields(item, ('user_id', 'course_id', 'enrollment_date'))
+            candidates.append((index, {
+                'user_id': item['user_id'],
+                'course_id': item['course_id'],
+                'enrollment_date': Enrollment.validate_enrollment_date(None, 'enrollment_date', item['enrollment_date']),
+            }))
+        except ValueError as e:
+            results[index] = _error(index, 400, str(e))
+
+    candidates = _resolve_references(candidates, results)
+
+    pairs = {(row['user_id'], row['course_id']) for _, row in candidates}
+    enrolled = set()
+    pair_list = list(pairs)
+    for start in range(0, len(pair_list), CHUNK_SIZE):
+        chunk = pair_list[start:start + CHUNK_SIZE]
+        enrolled.update(db.session.execute(
+            select(Enrollment.user_id, Enrollment.course_id)
+            .where(tuple_(Enrollment.user_id, Enrollment.course_id).in_(chunk))
+        ).tuples())
+
+    inserted = []
+    for index, row in candidates:
+        pair = (row['user_id'], row['course_id'])
+        if pair in enrolled:
+            results[index] = _error(index, 409, "User already enrolled")
+        else:
+            enrolled.add(pair)
+            inserted.append((index, row))
+
+    ids = _insert_chunks(Enrollment.__table__, [row for _, row in inserted])
+    # Core inserts skip the Enrollment mapper event, so fold in the similarities as one job.
+    defer_record_enrollments(db.session.connection(), ids, db.session)
+    return _finish(results, inserted, ids), {row['course_id'] for _, row in inserted}
+
+
+def ingest_reviews(items):
+    """Inserts reviews and folds them into the course rating aggregates; caller commits."""
+    results, candidates = {}, []
+    for index, item in items:
+        try:
+            _check_fields(item, ('text_content', 'rating', 'user_id', 'course_id'))
+            candidates.append((index, {
+                'text_content': Review.validate_text_content(None, 'text_content', item['text_content']),
+                'rating': Review.validate_rating(None, 'rating', item['rating']),
+                'user_id': item['user_id'],
+                'course_id': item['course_id'],
+            }))
+        except ValueError as e:
+            results[index] = _error(index, 400, str(e))
+
+    inserted = _resolve_references(candidates, results)
+    ids = _insert_chunks(Review.__table__, [row for _, row in inserted])
+
+    # Core inserts skip the Review mapper events, so apply the aggregates per course here.
+    ratings = defaultdict(Counter)
+    for _, row in inserted:
+        ratings[row['course_id']][row['rating']] += 1
+    connection = db.session.connection()
+    for course_id, counts in ratings.items():
+        Course.apply_rating_delta(connection, course_id, counts)
+
+    return _finish(results, inserted, ids), set(ratings)
+
+
+def ingest_users(items):
+    """Inserts users, hashing all their passwords in parallel on the hashing pool; caller commits."""
+    results, candidates = {}, []
+    for index, item in items:
+        try:
+            if isinstance(item, ValueError):
+                raise item
+            if not isinstance(item, dict):
+                raise ValueError("Item must be a JSON object.")
+            if not all(item.get(k) for k in ('username', 'email', 'password')):
+                raise ValueError("Missing required fields")
+            candidates.append((index, {
+                'username': User.validate_username(None, 'username', item['username']),
+                'email': User.validate_email(None, 'email', item['email']),
+                'role': User.validate_role(None, 'role', item.get('role') or 'student'),
+                'password': str(item['password']),
+            }))
+        except ValueError as e:
+            results[index] = _error(index, 400, str(e))
+
+    taken_usernames = _existing_values(User.username, {row['username'] for _, row in candidates})
+    taken_emails = _existing_values(User.email, {row['email'] for _, row in candidates})
+    inserted = []
+    for index, row in candidates:
+        if row['username'] in taken_usernames or row['email'] in taken_emails:
+            results[index] = _error(index, 409, "Username or email already taken")
+        else:
+            taken_usernames.add(row['username'])
+            taken_emails.add(row['email'])
+            inserted.append((index, row))
+
+    hashes = password_hasher.hash_many([row.pop('password') for _, row in inserted])
+    for (_, row), pwhash in zip(inserted, hashes):
+        row['password_hash'] = pwhash
+    ids = _insert_chunks(User.__table__, [row for _, row in inserted])
+    return _finish(results, inserted, ids), set()
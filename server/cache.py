@@ -0,0 +1,224 @@
+"""In-process response cache with ETag support for the catalog endpoints.
+
+Cached GET responses are keyed by endpoint, path and query string. Each entry
+is tagged (e.g. 'courses', 'course:7'), and the current version of every tag
+is folded into the key. Invalidating a tag bumps its version, so every entry
+that depended on it becomes unreachable at once and is evicted later by
+LRU/TTL. Because of this a backend only needs get/set/add/incr, and a shared
+store such as Redis works across workers.
+
+Compressed variants are cached next to the plain entry, under its key plus
+the content encoding. A client that accepts an encoding gets the stored
+bytes without compressing again. Their Content-Encoding, Vary and weak ETag
+come from encoding.py, for hits and misses alike.
+"""
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request
+
+from database import request_used_replica
+from encoding import response_compression
+
+TAG_PREFIX = 'coursify:tag:'
+ENTRY_PREFIX = 'coursify:response:'
+CACHED_HEADERS = ('Content-Type', 'Link')
+
+
+class MemoryBackend:
+    """Thread-safe LRU with per-entry TTL. Tag counters are kept apart so they are never evicted."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_counters(self, keys):
+        with self._lock:
+            return [self._counters.get(key) for key in keys]
+
+    def add_counter(self, key, value):
+        with self._lock:
+            self._counters.setdefault(key, value)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+
+
+class RedisBackend:
+    """Backend over a redis-py compatible client, shared by every worker pointing at it.
+
+    Entry eviction is left to Redis' TTLs and maxmemory policy.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url):
+        import redis
+        return cls(redis.Redis.from_url(url))
+
+    def get(self, key):
+        raw = self.client.get(key)
+        return None if raw is None else pickle.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, pickle.dumps(value), ex=ttl or None)
+
+    def get_counters(self, keys):
+        return [None if v is None else int(v) for v in self.client.mget(keys)]
+
+    def add_counter(self, key, value):
+        self.client.set(key, value, nx=True)
+
+    def incr(self, key):
+        return self.client.incr(key)
+
+    def clear(self):
+        for prefix in (TAG_PREFIX, ENTRY_PREFIX):
+            for key in self.client.scan_iter(prefix + '*'):
+                self.client.delete(key)
+
+
+def make_etag(body):
+    return hashlib.sha256(body).hexdigest()[:32]
+
+
+class ResponseCache:
+    """Flask extension; configure with RESPONSE_CACHE_* settings and call init_app()."""
+
+    def init_app(self, app):
+        app.config.setdefault('RESPONSE_CACHE_ENABLED', True)
+        app.config.setdefault('RESPONSE_CACHE_BACKEND', 'memory')
+        app.config.setdefault('RESPONSE_CACHE_TTL', 300)
+        app.config.setdefault('RESPONSE_CACHE_MAX_ENTRIES', 1024)
+        app.config.setdefault('RESPONSE_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+
+        backend = app.config['RESPONSE_CACHE_BACKEND']
+        if backend == 'memory':
+            backend = MemoryBackend(app.config['RESPONSE_CACHE_MAX_ENTRIES'])
+        elif backend == 'redis':
+            backend = RedisBackend.from_url(app.config['RESPONSE_CACHE_REDIS_URL'])
+        elif isinstance(backend, str):
+            raise ValueError(f"Unknown RESPONSE_CACHE_BACKEND {backend!r}.")
+        app.extensions['response_cache'] = backend
+
+    @property
+    def backend(self):
+        return current_app.extensions['response_cache']
+
+    def _tag_versions(self, tags):
+        keys = [TAG_PREFIX + tag for tag in tags]
+        versions = self.backend.get_counters(keys)
+        if None in versions:
+            # Seed missing counters from the clock so that a counter lost to
+            # eviction or a restart can never come back at an old version.
+            for key, version in zip(keys, versions):
+                if version is None:
+                    self.backend.add_counter(key, time.time_ns())
+            versions = self.backend.get_counters(keys)
+        return versions
+
+    def _entry_key(self, tags):
+        versions = ','.join(f'{tag}={version}' for tag, version in zip(tags, self._tag_versions(tags)))
+        query = '&'.join(sorted(request.query_string.decode().split('&')))
+        return f'{ENTRY_PREFIX}{request.endpoint}:{request.path}?{query}|{versions}'
+
+    def _ttl(self):
+        ttl = current_app.config['RESPONSE_CACHE_TTL']
+        if request_used_replica():
+            # The replica may not have the write behind the last invalidation yet,
+            # so keep its answer no longer than the replication lag window.
+            window = current_app.config['READ_YOUR_WRITES_SECONDS']
+            ttl = min(ttl, window) if ttl else window
+        return ttl
+
+    def cached(self, tags):
+        """Caches successful GET responses of a view.
+
+        `tags` is called with the view's keyword arguments and returns the
+        tags the response depends on. Other methods pass straight through.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method != 'GET' or not current_app.config['RESPONSE_CACHE_ENABLED']:
+                    return view(*args, **kwargs)
+
+                key = self._entry_key(tags(**kwargs))
+                encoding = response_compression.accepted_encoding()
+                entry = self.backend.get(f'{key}|{encoding}') if encoding else None
+                if entry is not None:
+                    status, body, headers, etag = entry
+                    response = current_app.response_class(body, status=status, headers=headers)
+                    response.headers['X-Cache'] = 'HIT'
+                    response.set_etag(etag)
+                    response_compression.mark_encoded(response, encoding)
+                    return response.make_conditional(request)
+
+                entry = self.backend.get(key)
+                if entry is not None:
+                    status, body, headers, etag = entry
+                    response = current_app.response_class(body, status=status, headers=headers)
+                    response.headers['X-Cache'] = 'HIT'
+                else:
+                    response = current_app.make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or response.is_streamed:
+                        return response
+                    body = response.get_data()
+                    # A view may set its own validator (see queries.course_etag).
+                    etag = response.get_etag()[0] or make_etag(body)
+                    headers = [(h, response.headers[h]) for h in CACHED_HEADERS if h in response.headers]
+                    self.backend.set(key, (200, body, headers, etag), self._ttl())
+                    response.headers['X-Cache'] = 'MISS'
+                response.set_etag(etag)
+                response = response.make_conditional(request)
+                if encoding and response_compression.eligible(response):
+                    compressed = response_compression.compress(body, encoding)
+                    self.backend.set(f'{key}|{encoding}', (200, compressed, headers, etag), self._ttl())
+                    response_compression.encode(response, encoding, compressed)
+                return response
+            return wrapper
+        return decorator
+
+    def invalidate(self, *tags):
+        if not current_app.config['RESPONSE_CACHE_ENABLED']:
+            return
+        for tag in tags:
+            self.backend.incr(TAG_PREFIX + tag)
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,90 @@
+"""Per-user dashboard: enrollments with course, instructor, own review and course rating.
+
+Built from two statements: the user row by primary key, and one SELECT that
+joins the user's enrollments to courses and instructors, plus the user's
+latest review per course. Those reviews come from a GROUP BY over
+ix_reviews_user_id. Course averages come from the denormalized rating
+columns. No relationship is loaded.
+"""
+from sqlalchemy import func, select
+from sqlalchemy.orm import aliased
+
+from models import User, Course, Enrollment, Review
+
+USER_COLUMNS = (User.id, User.username, User.email, User.role)
+
+
+def dashboard_statement(user_id):
+    instructor = aliased(User, name='instructor')
+    latest_review = (
+        select(Review.course_id, func.max(Review.id).label('review_id'))
+        .where(Review.user_id == user_id)
+        .group_by(Review.course_id)
+        .subquery('latest_review')
+    )
+    return (
+        select(
+            Enrollment.id.label('enrollment_id'), Enrollment.enrollment_date,
+            Course.id.label('course_id'), Course.title, Course.difficulty, Course.duration_hours,
+            Course.rating_count, Course.rating_sum,
+            instructor.id.label('instructor_id'), instructor.username.label('instructor_username'),
+            Review.id.label('review_id'), Review.rating, Review.text_content,
+        )
+        .select_from(Enrollment)
+        .join(Course, Course.id == Enrollment.course_id)
+        .join(instructor, instructor.id == Course.instructor_id)
+        .outerjoin(latest_review, latest_review.c.course_id == Enrollment.course_id)
+        .outerjoin(Review, Review.id == latest_review.c.review_id)
+        .where(Enrollment.user_id == user_id)
+        .order_by(Enrollment.enrollment_date.desc(), Enrollment.id.desc())
+    )
+
+
+def _enrollments(rows):
+    """Plain tuple unpacking; at 10k rows the Row attribute lookups show up in profiles."""
+    date_format = Enrollment.datetime_format
+    rating_average_of = Course.rating_average_of
+    instructors = {}
+    enrollments = []
+    for (enrollment_id, enrollment_date, course_id, title, difficulty, duration_hours, rating_count, rating_sum,
+         instructor_id, instructor_username, review_id, rating, text_content) in rows:
+        instructor = instructors.get(instructor_id)
+        if instructor is None:
+            instructor = instructors[instructor_id] = {'id': instructor_id, 'username': instructor_username}
+        enrollments.append({
+            'id': enrollment_id,
+            'enrollment_date': enrollment_date.strftime(date_format),
+            'course': {
+                'id': course_id,
+                'title': title,
+                'difficulty': difficulty,
+                'duration_hours': duration_hours,
+                'instructor': instructor,
+                'rating_count': rating_count,
+                'rating_average': rating_average_of(rating_count, rating_sum),
+            },
+            'review': None if review_id is None else {
+                'id': review_id, 'rating': rating, 'text_content': text_content,
+            },
+        })
+    return enrollments
+
+
+def user_dashboard(session, user_id):
+    """Returns the dashboard dict, or None if there is no such user."""
+    # Core execution: there are no entities in the result, so the ORM loading path is pure overhead.
+    connection = session.connection()
+    user = connection.execute(select(*USER_COLUMNS).where(User.id == user_id)).first()
+    if user is None:
+        return None
+    enrollments = _enrollments(connection.execute(dashboard_statement(user_id)))
+    ratings = [e['review']['rating'] for e in enrollments if e['review']]
+    return {
+        'user': dict(user._mapping),
+        'summary': {
+            'enrollments': len(enrollments),
+            'reviewed': len(ratings),
+            'average_rating_given': round(sum(ratings) / len(ratings), 2) if ratings else None,
+        },
+        'enrollments': enrollments,
+    }
@@ -0,0 +1,173 @@
+"""Engine configuration, read-replica routing and SQLite tuning.
+
+config_from_env() maps DATABASE_* environment variables onto the
+Flask-SQLAlchemy settings:
+
+    DATABASE_URL            primary database (default sqlite:///coursify.db)
+    DATABASE_REPLICA_URLS   comma-separated read replicas, added as binds
+                            replica1, replica2, ...
+    DATABASE_POOL_SIZE, DATABASE_MAX_OVERFLOW, DATABASE_POOL_TIMEOUT,
+    DATABASE_POOL_RECYCLE, DATABASE_ECHO
+                            engine options, applied to every bind
+    READ_YOUR_WRITES_SECONDS
+                            how long a client reads from the primary after
+                            a write (default 5)
+
+Views decorated with @replica_reads serve GET requests from one replica,
+picked per request. Within such a request the RoutingSession sends every
+statement except flushes and DML there, and every other request uses the
+primary only. After a successful write the response sets a cookie that
+pins the client's reads to the primary for READ_YOUR_WRITES_SECONDS. That
+window has to cover the replication lag.
+
+SQLite connections get the SQLITE_PRAGMAS settings as they are opened:
+WAL, so readers never block the writer; synchronous=NORMAL, so a commit
+appends to the WAL without an fsync (a power loss can drop the last
+transactions but cannot corrupt the file); a busy timeout, so concurrent
+writers queue instead of failing with "database is locked"; and
+foreign_keys, which SQLite leaves off by default. Without it the ON DELETE
+CASCADE constraints would not remove a deleted course's or user's rows.
+
+`flask replicate` is a local stand-in for streaming replication between
+SQLite files. It copies the primary into every replica with the online
+backup API, once or every --interval seconds.
+"""
+import os
+import random
+import sqlite3
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Delete, Insert, Update, event
+
+DEFAULT_DATABASE_URL = 'sqlite:///coursify.db'
+DEFAULT_READ_YOUR_WRITES_SECONDS = 5
+READ_YOUR_WRITES_COOKIE = 'coursify_primary_until'
+WRITE_METHODS = frozenset({'POST', 'PUT', 'PATCH', 'DELETE'})
+ENGINE_OPTION_VARIABLES = {
+    'DATABASE_POOL_SIZE': ('pool_size', int),
+    'DATABASE_MAX_OVERFLOW': ('max_overflow', int),
+    'DATABASE_POOL_TIMEOUT': ('pool_timeout', float),
+    'DATABASE_POOL_RECYCLE': ('pool_recycle', int),
+    'DATABASE_ECHO': ('echo', lambda value: value.lower() in ('1', 'true', 'yes')),
+}
+
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'foreign_keys': 'ON',
+}
+
+
+def config_from_env(environ=os.environ):
+    config = {'SQLALCHEMY_DATABASE_URI': environ.get('DATABASE_URL', DEFAULT_DATABASE_URL)}
+    replicas = [url.strip() for url in environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    if replicas:
+        binds = {f'replica{i}': url for i, url in enumerate(replicas, 1)}
+        config['SQLALCHEMY_BINDS'] = binds
+        config['DATABASE_REPLICAS'] = list(binds)
+    options = {
+        option: convert(environ[name])
+        for name, (option, convert) in ENGINE_OPTION_VARIABLES.items() if name in environ
+    }
+    if options:
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    if 'READ_YOUR_WRITES_SECONDS' in environ:
+        config['READ_YOUR_WRITES_SECONDS'] = float(environ['READ_YOUR_WRITES_SECONDS'])
+    return config
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that reads from the request's replica, if it has one."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not isinstance(clause, (Insert, Update, Delete)):
+            replica = g.get('read_replica') if has_request_context() else None
+            if replica is not None:
+                return self._db.engines[replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def reads_pinned_to_primary(cookies, now=None):
+    try:
+        return float(cookies.get(READ_YOUR_WRITES_COOKIE, 0)) > (now or time.time())
+    except ValueError:
+        return False
+
+
+def choose_replica(replicas, cookies):
+    """A replica bind key for a read request, or None to use the primary."""
+    if not replicas or reads_pinned_to_primary(cookies):
+        return None
+    return random.choice(replicas)
+
+
+def request_used_replica():
+    return has_request_context() and g.get('read_replica') is not None
+
+
+def replica_reads(view):
+    """Serves the view's GET requests from a replica unless the client wrote recently."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method == 'GET':
+            g.read_replica = choose_replica(current_app.config['DATABASE_REPLICAS'], request.cookies)
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _pin_writers_to_primary(response):
+    if request.method in WRITE_METHODS and response.status_code < 400 and current_app.config['DATABASE_REPLICAS']:
+        seconds = current_app.config['READ_YOUR_WRITES_SECONDS']
+        response.set_cookie(READ_YOUR_WRITES_COOKIE, f'{time.time() + seconds:.3f}',
+                            max_age=int(seconds) + 1, httponly=True, samesite='Lax')
+    return response
+
+
+def _sqlite_connect(pragmas):
+    def connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+    return connect
+
+
+def configure_engines(app):
+    """Call after db.init_app(): tunes the SQLite engines and enables replica routing."""
+    app.config.setdefault('SQLITE_PRAGMAS', DEFAULT_SQLITE_PRAGMAS)
+    app.config.setdefault('DATABASE_REPLICAS', [])
+    app.config.setdefault('READ_YOUR_WRITES_SECONDS', DEFAULT_READ_YOUR_WRITES_SECONDS)
+    db = app.extensions['sqlalchemy']
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', _sqlite_connect(dict(app.config['SQLITE_PRAGMAS'])))
+    app.after_request(_pin_writers_to_primary)
+
+
+def begin_write(connection):
+    """Takes SQLite's write lock now, unless the connection already has a transaction open.
+
+    pysqlite only opens a transaction before DML. A SAVEPOINT issued first
+    would start one, and its RELEASE would commit. A transaction that reads
+    before it writes also fails on lock upgrade, skipping the busy timeout.
+    Other databases need nothing here.
+    """
+    if connection.dialect.name == 'sqlite' and not connection.connection.dbapi_connection.in_transaction:
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+
+def replicate_sqlite(primary_path, replica_path):
+    """Copies the primary into the replica in one backup step; readers see either copy, never a mix."""
+    source = sqlite3.connect(primary_path)
+    target = sqlite3.connect(replica_path, timeout=30)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
@@ -0,0 +1,159 @@
+"""Response encoding: fast JSON and negotiated compression.
+
+FastJSONProvider renders JSON with orjson when it is installed, and with
+the standard library otherwise. The output is what Flask's default
+provider gives: sorted keys, HTTP dates for datetimes. It is compact
+unless the app runs in debug mode.
+
+ResponseCompression compresses response bodies of at least
+COMPRESSION_MIN_SIZE bytes with the best encoding the client accepts.
+Candidates are zstd (needs the zstandard package), br (needs brotli) and
+gzip, in that order of preference. It only touches complete responses
+with a COMPRESSION_MIMETYPES type, so streamed exports pass through
+unchanged. Compressed responses get a weak ETag, because the bytes differ
+per encoding. If-None-Match still matches across encodings. The response
+cache stores each encoded variant it serves (see cache.py).
+"""
+import gzip
+import json
+
+from flask import current_app, request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DEFAULT_MIN_SIZE = 1024
+DEFAULT_LEVELS = {'zstd': 3, 'br': 5, 'gzip': 6}
+DEFAULT_MIMETYPES = ('application/json', 'text/html', 'text/plain', 'text/csv')
+
+_default = DefaultJSONProvider.default  # Flask's conversions for dates, decimals, UUIDs and dataclasses
+
+
+def _zstd(body, level):
+    import zstandard
+    # Compressor objects are not thread-safe, and cheap to create.
+    return zstandard.ZstdCompressor(level=level).compress(body)
+
+
+def _brotli(body, level):
+    import brotli
+    return brotli.compress(body, quality=level)
+
+
+def _gzip(body, level):
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def available_codecs():
+    """Encodings that can be produced here, most preferred first."""
+    codecs = {}
+    for encoding, module, compress in (('zstd', 'zstandard', _zstd), ('br', 'brotli', _brotli)):
+        try:
+            __import__(module)
+        except ImportError:
+            continue
+        codecs[encoding] = compress
+    codecs['gzip'] = _gzip
+    return codecs
+
+
+def dumps_bytes(obj, sort_keys=True, indent=None):
+    """UTF-8 JSON for `obj`; unknown types fall back to Flask's conversions."""
+    if orjson is not None:
+        options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_default, option=options)
+    separators = None if indent else (',', ':')
+    return json.dumps(
+        obj, default=_default, sort_keys=sort_keys, indent=indent, separators=separators, ensure_ascii=False,
+    ).encode('utf-8')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, encoding through dumps_bytes()."""
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps_bytes(obj, sort_keys=self.sort_keys).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = self.compact is False or (self.compact is None and self._app.debug)
+        body = dumps_bytes(obj, sort_keys=self.sort_keys, indent=2 if pretty else None)
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
+
+
+class ResponseCompression:
+    """Flask extension; configure with COMPRESSION_* settings and call init_app()."""
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESSION_ENABLED', True)
+        app.config.setdefault('COMPRESSION_MIN_SIZE', DEFAULT_MIN_SIZE)
+        app.config.setdefault('COMPRESSION_LEVELS', DEFAULT_LEVELS)
+        app.config.setdefault('COMPRESSION_MIMETYPES', DEFAULT_MIMETYPES)
+        codecs = available_codecs()
+        app.config.setdefault('COMPRESSION_ENCODINGS', list(codecs))
+        app.extensions['compression'] = {
+            encoding: codecs[encoding] for encoding in app.config['COMPRESSION_ENCODINGS'] if encoding in codecs
+        }
+        if app.config['COMPRESSION_ENABLED']:
+            app.after_request(self._compress_response)
+
+    def accepted_encoding(self):
+        """The best encoding the client accepts, or None to send the body as is."""
+        if not current_app.config['COMPRESSION_ENABLED']:
+            return None
+        return request.accept_encodings.best_match(list(current_app.extensions['compression']))
+
+    def eligible(self, response):
+        """Whether the body depends on Accept-Encoding: complete, large enough and of a compressible type."""
+        return (
+            response.status_code == 200
+            and not response.is_streamed
+            and 'Content-Encoding' not in response.headers
+            and response.mimetype in current_app.config['COMPRESSION_MIMETYPES']
+            and response.content_length is not None
+            and response.content_length >= current_app.config['COMPRESSION_MIN_SIZE']
+        )
+
+    def compress(self, body, encoding):
+        level = current_app.config['COMPRESSION_LEVELS'][encoding]
+        return current_app.extensions['compression'][encoding](body, level)
+
+    def encode(self, response, encoding, body=None):
+        """Switches the response to `encoding`; `body` is the already compressed data, if any."""
+        response.set_data(body if body is not None else self.compress(response.get_data(), encoding))
+        return self.mark_encoded(response, encoding)
+
+    def mark_encoded(self, response, encoding):
+        """Sets the headers of a body already in `encoding`, and weakens its ETag.
+
+        The encoded bytes differ from the plain ones, so a strong validator of
+        the plain body would be wrong for them. Every encoded response,
+        cached or not, gets its headers here.
+        """
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def _compress_response(self, response):
+        if not self.eligible(response):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = self.accepted_encoding()
+        if encoding is not None:
+            self.encode(response, encoding)
+        return response
+
+
+response_compression = ResponseCompression()
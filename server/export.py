@@ -0,0 +1,84 @@
+"""Streaming NDJSON/CSV exports.
+
+Rows come from column-only SELECTs executed with yield_per, so the driver
+hands them over a batch at a time. They are written out in chunks through a
+generator response, which keeps memory flat however large the table is.
+"""
+import csv
+import io
+import json
+
+from flask import Response, stream_with_context
+from sqlalchemy import select
+
+from models import db, User, Course, Enrollment, Review
+from queries import enrollment_filters
+from serializers import enrollment_serializer, review_serializer
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+BATCH_SIZE = 1000
+
+ENROLLMENT_CSV_COLUMNS = (
+    Enrollment.id, Enrollment.user_id, Enrollment.course_id, Enrollment.enrollment_date,
+    User.username, User.email, Course.title.label('course_title'),
+)
+REVIEW_CSV_COLUMNS = (
+    Review.id, Review.user_id, Review.course_id, Review.rating, Review.text_content,
+    User.username, Course.title.label('course_title'),
+)
+
+
+def _joined(statement, model):
+    return (
+        statement.select_from(model)
+        .join(User, model.user_id == User.id)
+        .join(Course, model.course_id == Course.id)
+        .order_by(model.id)
+        .execution_options(yield_per=BATCH_SIZE)
+    )
+
+
+def _ndjson_chunks(serializer, statement):
+    lines = []
+    for row in db.session.execute(statement):
+        lines.append(json.dumps(serializer.from_row(row)))
+        if len(lines) >= BATCH_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def _csv_chunks(statement):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    result = db.session.execute(statement)
+    writer.writerow(result.keys())
+    for count, row in enumerate(result, 1):
+        writer.writerow(row)
+        if count % BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _stream(fmt, name, serializer, model, csv_columns, filters):
+    if fmt == 'ndjson':
+        statement = _joined(select(*serializer.row_columns()), model).where(*filters)
+        chunks, mimetype = _ndjson_chunks(serializer, statement), 'application/x-ndjson'
+    else:
+        statement = _joined(select(*csv_columns), model).where(*filters)
+        chunks, mimetype = _csv_chunks(statement), 'text/csv'
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={name}.{fmt}'
+    return response
+
+
+def stream_enrollments(fmt, since=None, until=None):
+    return _stream(fmt, 'enrollments', enrollment_serializer, Enrollment, ENROLLMENT_CSV_COLUMNS,
+                   enrollment_filters(since, until))
+
+
+def stream_reviews(fmt):
+    return _stream(fmt, 'reviews', review_serializer, Review, REVIEW_CSV_COLUMNS, [])
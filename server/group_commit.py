@@ -0,0 +1,183 @@
+"""Optional group commit for single-row inserts.
+
+With GROUP_COMMIT_ENABLED, POST /enrollments and POST /reviews do not commit
+themselves. They validate in the request thread, then hand the new instance
+to one writer thread per process through a bounded queue. The writer takes
+whatever arrives within GROUP_COMMIT_WINDOW seconds (up to
+GROUP_COMMIT_MAX_BATCH items) and inserts each item under its own SAVEPOINT.
+It commits them all at once, so one journal sync covers the whole batch.
+Each request then gets its own outcome back. A duplicate enrollment rolls
+back only its savepoint and still raises IntegrityError in its request.
+
+A full queue raises GroupCommitOverloaded instead of blocking, which the
+routes turn into a 503. Mapper events run in the writer's flush, so
+rating aggregates and similarity counts commit with the rows they belong
+to.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+from flask import current_app
+
+from database import begin_write
+from models import db
+
+DEFAULT_WINDOW = 0.002
+DEFAULT_MAX_BATCH = 256
+DEFAULT_QUEUE_SIZE = 4096
+DEFAULT_TIMEOUT = 10.0
+
+
+class GroupCommitOverloaded(Exception):
+    """The writer's queue is full."""
+
+
+class _Pending:
+    __slots__ = ('instance', 'future')
+
+    def __init__(self, instance):
+        self.instance = instance
+        self.future = Future()
+
+
+class Writer:
+    """The queue and thread behind one app. Started lazily, once per process."""
+
+    def __init__(self, app):
+        self.app = app
+        self.window = app.config['GROUP_COMMIT_WINDOW']
+        self.max_batch = app.config['GROUP_COMMIT_MAX_BATCH']
+        self.queue = queue.Queue(app.config['GROUP_COMMIT_QUEUE_SIZE'])
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        # A thread does not survive fork(), so a forked server worker starts its own.
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self.queue = queue.Queue(self.queue.maxsize)
+                self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+
+    def submit(self, instance):
+        self._ensure_started()
+        pending = _Pending(instance)
+        try:
+            self.queue.put_nowait(pending)
+        except queue.Full:
+            raise GroupCommitOverloaded("Too many writes are queued; retry shortly.") from None
+        return pending.future
+
+    def _collect(self):
+        batch = [self.queue.get()]
+        if batch[0] is None:
+            return None
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            try:
+                item = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if item is None:
+                # Stop after this batch.
+                self.queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                batch = self._collect()
+                if batch is None:
+                    return
+                try:
+                    self._write(batch)
+                finally:
+                    db.session.remove()
+
+    def _write(self, batch):
+        session = db.session
+        begin_write(session.connection())
+        written = []
+        for pending in batch:
+            if not pending.future.set_running_or_notify_cancel():
+                continue
+            try:
+                with session.begin_nested():
+                    session.add(pending.instance)
+            except Exception as e:
+                pending.future.set_exception(e)
+                continue
+            # Read before the commit expires it, which would cost a SELECT per row.
+            written.append((pending, pending.instance.id))
+        try:
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            for pending, _ in written:
+                pending.future.set_exception(e)
+            return
+        for pending, primary_key in written:
+            pending.future.set_result(primary_key)
+
+    def shutdown(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and self._pid == os.getpid():
+            self.queue.put(None)
+            thread.join()
+
+
+class GroupCommit:
+    """Flask extension; configure with GROUP_COMMIT_* settings and call init_app()."""
+
+    def init_app(self, app):
+        app.config.setdefault('GROUP_COMMIT_ENABLED', False)
+        app.config.setdefault('GROUP_COMMIT_WINDOW', DEFAULT_WINDOW)
+        app.config.setdefault('GROUP_COMMIT_MAX_BATCH', DEFAULT_MAX_BATCH)
+        app.config.setdefault('GROUP_COMMIT_QUEUE_SIZE', DEFAULT_QUEUE_SIZE)
+        app.config.setdefault('GROUP_COMMIT_TIMEOUT', DEFAULT_TIMEOUT)
+        if app.config['GROUP_COMMIT_ENABLED']:
+            app.extensions['group_commit'] = Writer(app)
+
+    @property
+    def enabled(self):
+        return 'group_commit' in current_app.extensions
+
+    def insert(self, instance):
+        """Inserts and commits a new instance; returns its primary key.
+
+        Raises what the insert raised (IntegrityError for a duplicate), or
+        GroupCommitOverloaded. Without group commit this is add() plus
+        commit() on the request's own session.
+        """
+        if not self.enabled:
+            db.session.add(instance)
+            db.session.commit()
+            return instance.id
+        # End this request's read transaction, so the writer's commit is visible once it returns.
+        db.session.rollback()
+        future = current_app.extensions['group_commit'].submit(instance)
+        try:
+            return future.result(current_app.config['GROUP_COMMIT_TIMEOUT'])
+        except TimeoutError:
+            if future.cancel():
+                raise GroupCommitOverloaded("The write timed out in the queue; retry shortly.") from None
+            # Already being written; its outcome is moments away.
+            return future.result()
+
+    def shutdown(self, app=None):
+        writer = (app or current_app).extensions.get('group_commit')
+        if writer is not None:
+            writer.shutdown()
+
+
+group_commit = GroupCommit()
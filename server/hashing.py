@@ -0,0 +1,120 @@
+"""Password hashing off the request thread.
+
+Hashes are created and checked with werkzeug.security in a process pool of
+PASSWORD_HASH_WORKERS processes, so bursts of signups or logins queue for
+pool time instead of holding the interpreter in every request thread. Set
+the worker count to 0 to hash inline.
+
+PASSWORD_HASH_METHOD takes any werkzeug method string, e.g.
+'scrypt:32768:8:1' or 'pbkdf2:sha256:600000'. Every stored hash carries the
+parameters it was made with. needs_rehash() flags hashes whose parameters
+differ from the configured ones, so a successful login can upgrade them.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from itertools import repeat
+
+from flask import current_app, has_app_context
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+DEFAULT_SALT_LENGTH = 16
+MAP_CHUNK_SIZE = 16
+
+
+@lru_cache(maxsize=None)
+def reference_hash(method):
+    """A throwaway hash made with `method`; its prefix is the normalized parameter string."""
+    return generate_password_hash(os.urandom(16).hex(), method)
+
+
+def method_prefix(method):
+    return reference_hash(method).split('$', 1)[0]
+
+
+class PasswordHasher:
+    """Flask extension; configure with PASSWORD_HASH_* settings and call init_app().
+
+    Outside an app context the defaults apply and hashing runs inline.
+    """
+
+    def __init__(self):
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault('PASSWORD_HASH_METHOD', DEFAULT_METHOD)
+        app.config.setdefault('PASSWORD_HASH_SALT_LENGTH', DEFAULT_SALT_LENGTH)
+        app.config.setdefault('PASSWORD_HASH_WORKERS', os.cpu_count() or 1)
+
+    def _settings(self):
+        if not has_app_context():
+            return DEFAULT_METHOD, DEFAULT_SALT_LENGTH, 0
+        config = current_app.config
+        return config['PASSWORD_HASH_METHOD'], config['PASSWORD_HASH_SALT_LENGTH'], config['PASSWORD_HASH_WORKERS']
+
+    def _executor(self, workers):
+        with self._lock:
+            # A pool does not survive fork(), so a forked server worker builds its own.
+            if self._pool is None or self._pool_pid != os.getpid():
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context(method))
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _discard_pool(self, pool):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False)
+
+    def _run(self, workers, fn, *args):
+        pool = self._executor(workers)
+        try:
+            return pool.submit(fn, *args).result()
+        except BrokenProcessPool:
+            # A pool process died (the OOM killer, say); start a fresh pool and retry once.
+            self._discard_pool(pool)
+            return self._executor(workers).submit(fn, *args).result()
+
+    def hash(self, password):
+        method, salt_length, workers = self._settings()
+        if not workers:
+            return generate_password_hash(password, method, salt_length)
+        return self._run(workers, generate_password_hash, password, method, salt_length)
+
+    def hash_many(self, passwords):
+        """Hashes a batch across every pool process; returns the hashes in order."""
+        method, salt_length, workers = self._settings()
+        if not workers:
+            return [generate_password_hash(p, method, salt_length) for p in passwords]
+        return list(self._executor(workers).map(
+            generate_password_hash, passwords, repeat(method), repeat(salt_length), chunksize=MAP_CHUNK_SIZE
+        ))
+
+    def verify(self, pwhash, password):
+        """Checks a password. With pwhash=None it still spends the time, so unknown users cannot be told apart."""
+        method, _, workers = self._settings()
+        if pwhash is None:
+            pwhash = reference_hash(method)
+        if not workers:
+            return check_password_hash(pwhash, password)
+        return self._run(workers, check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        method, _, _ = self._settings()
+        return pwhash.split('$', 1)[0] != method_prefix(method)
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,253 @@
+"""Opt-in per-request instrumentation.
+
+With INSTRUMENTATION_ENABLED set, every request records the number of SQL
+statements and the time spent in them (from SQLAlchemy engine events), the
+time spent in the compiled serializers (database time during lazy loads is
+excluded), and the total. The numbers go out in a Server-Timing header and
+into per-route histograms served in the Prometheus text format at
+INSTRUMENTATION_METRICS_PATH. Histograms live in process memory, so each
+worker exposes its own.
+
+Streamed responses finish after the request hooks, so their body is not
+covered.
+
+query_budget() is independent of the flag and meant for tests.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+from models import db
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+METRICS_MIMETYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class RequestStats:
+    __slots__ = ('started', 'queries', 'db_time', 'serialize_time', '_query_starts')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self._query_starts = []
+
+
+def current_stats():
+    return g.get('request_stats') if has_request_context() else None
+
+
+@contextmanager
+def serialization_timer():
+    """Adds the block's run time, minus any SQL it issued, to the request's serialization time."""
+    stats = current_stats()
+    if stats is None:
+        yield
+        return
+    started, db_before = time.perf_counter(), stats.db_time
+    try:
+        yield
+    finally:
+        stats.serialize_time += time.perf_counter() - started - (stats.db_time - db_before)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_stats()
+    if stats is not None:
+        stats._query_starts.append(time.perf_counter())
+
+
+def _query_finished():
+    stats = current_stats()
+    if stats is not None and stats._query_starts:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - stats._query_starts.pop()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _query_finished()
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute does not fire for a failed statement.
+    _query_finished()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, **extra):
+    pairs = list(zip(names, values)) + list(extra.items())
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # label values -> [count per bucket..., overflow, sum]
+
+    def observe(self, label_values, value):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for label_values, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_labels(self.label_names, label_values, le=bound)} {cumulative}')
+            labels = _labels(self.label_names, label_values)
+            lines.append(f'{self.name}_sum{labels} {series[-1]}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+
+    def inc(self, label_values):
+        self._values[label_values] = self._values.get(label_values, 0) + 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        for label_values, value in sorted(self._values.items()):
+            lines.append(f'{self.name}{_labels(self.label_names, label_values)} {value}')
+        return lines
+
+
+class Metrics:
+    """The per-app metric families; updates and rendering hold one lock."""
+
+    def __init__(self):
+        route = ('route', 'method')
+        self.requests = Counter('coursify_requests_total', 'Requests served.', route + ('status',))
+        self.duration = Histogram('coursify_request_duration_seconds', 'Time spent in the request handlers.',
+                                  route, DURATION_BUCKETS)
+        self.db_time = Histogram('coursify_request_db_seconds', 'Time spent executing SQL per request.',
+                                 route, DURATION_BUCKETS)
+        self.serialize_time = Histogram('coursify_request_serialize_seconds',
+                                        'Time spent serializing models per request.', route, DURATION_BUCKETS)
+        self.queries = Histogram('coursify_request_queries', 'SQL statements executed per request.',
+                                 route, QUERY_BUCKETS)
+        self._lock = threading.Lock()
+
+    def record(self, route, method, status, total, stats):
+        with self._lock:
+            self.requests.inc((route, method, str(status)))
+            self.duration.observe((route, method), total)
+            self.db_time.observe((route, method), stats.db_time)
+            self.serialize_time.observe((route, method), stats.serialize_time)
+            self.queries.observe((route, method), stats.queries)
+
+    def render(self):
+        with self._lock:
+            families = (self.requests, self.duration, self.db_time, self.serialize_time, self.queries)
+            return '\n'.join(line for family in families for line in family.render()) + '\n'
+
+
+class Instrumentation:
+    """Flask extension; configure with INSTRUMENTATION_* settings and call init_app() after db.init_app()."""
+
+    def init_app(self, app):
+        app.config.setdefault('INSTRUMENTATION_ENABLED', False)
+        app.config.setdefault('INSTRUMENTATION_SERVER_TIMING', True)
+        app.config.setdefault('INSTRUMENTATION_METRICS_PATH', '/metrics')
+        if not app.config['INSTRUMENTATION_ENABLED']:
+            return
+
+        app.extensions['instrumentation'] = Metrics()
+        with app.app_context():
+            engines = list(db.engines.values())
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(engine, 'handle_error', _handle_error)
+
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        if app.config['INSTRUMENTATION_METRICS_PATH']:
+            app.add_url_rule(app.config['INSTRUMENTATION_METRICS_PATH'], 'metrics', self._metrics_view)
+
+    @property
+    def metrics(self):
+        return current_app.extensions['instrumentation']
+
+    def _start(self):
+        g.request_stats = RequestStats()
+
+    def _finish(self, response):
+        stats = g.pop('request_stats', None)
+        if stats is None:
+            return response
+        total = time.perf_counter() - stats.started
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        self.metrics.record(route, request.method, response.status_code, total, stats)
+        if current_app.config['INSTRUMENTATION_SERVER_TIMING']:
+            response.headers['Server-Timing'] = (
+                f'db;dur={stats.db_time * 1000:.2f};desc="{stats.queries} queries", '
+                f'serialize;dur={stats.serialize_time * 1000:.2f}, '
+                f'total;dur={total * 1000:.2f}'
+            )
+        return response
+
+    def _metrics_view(self):
+        return current_app.response_class(self.metrics.render(), mimetype=METRICS_MIMETYPE)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A block ran more SQL statements than its budget allowed."""
+
+
+@contextmanager
+def query_budget(max_queries, app=None):
+    """Test helper that fails when the block runs more than `max_queries` SQL statements.
+
+        with query_budget(3, app):
+            client.get('/courses')
+
+    Only statements from the calling thread count, which covers the Flask
+    test client. Yields the list of statements for further assertions.
+    """
+    if app is None:
+        app = current_app._get_current_object()
+    with app.app_context():
+        engines = list(db.engines.values())
+    thread = threading.get_ident()
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == thread:
+            statements.append(statement)
+
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', record)
+    if len(statements) > max_queries:
+        raise QueryBudgetExceeded(
+            f"{len(statements)} queries ran, the budget is {max_queries}:\n" + '\n'.join(statements)
+        )
+
+
+instrumentation = Instrumentation()
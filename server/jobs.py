@@ -0,0 +1,359 @@
+"""Durable outbox and in-process workers for the follow-up work of a write.
+
+A write with follow-up work calls defer() inside its own transaction.
+defer() inserts an outbox_jobs row on the same connection, so the job
+commits or rolls back with the write. The request does not wait for the job
+to run.
+
+The queue only carries folding new enrollments into the course similarities
+(recommendations.py). That is the one follow-up whose cost grows with the
+data. The rest of a write's follow-up stays inline on purpose. The course
+rating aggregates are one UPDATE in the write's own transaction, so a course
+never shows a rating its reviews do not add up to. Response cache
+invalidation is an in-process dict operation, and it must happen before the
+response so the writer's next read is fresh. The stats rollups are already
+refreshed in the background by stats.py. Nothing sends notifications yet;
+when something does, it should register a handler here.
+
+Each app process runs a dispatcher thread that feeds a pool of JOBS_WORKERS
+threads. Its first request starts them, because a thread does not survive
+fork(). The dispatcher wakes when a session that deferred work commits, and
+every JOBS_POLL_INTERVAL seconds otherwise. The timed wake picks up jobs
+left by other processes, by the command line or by a crash.
+
+The dispatcher waits JOBS_BATCH_WINDOW seconds after a wake-up, and then
+each free worker claims up to JOBS_BATCH_SIZE due jobs. Jobs of a kind
+registered with a merge function run as one handler call. Claiming
+a job bumps its attempt count and leases it for JOBS_LEASE seconds. The
+worker then runs the handler in a transaction that also deletes the
+job's row, matched on that attempt count. So a job's database work
+commits at most once, even when its lease runs out and another worker
+takes it over.
+
+A failed attempt is retried after JOBS_RETRY_BASE * 2 ** (attempts - 1)
+seconds, capped at JOBS_RETRY_MAX, with jitter. A failed batch is rerun
+one job at a time, so one bad job does not hold back the rest. After
+JOBS_MAX_ATTEMPTS failures the row stays with status 'dead' and its last
+error.
+
+    flask jobs status            jobs by kind and status, and the latest failures
+    flask jobs drain [--kind K]  runs the due jobs in this process until none is left
+    flask jobs retry [--kind K]  makes dead jobs due again
+
+With JOBS_ENABLED off, against an in-memory SQLite database, or outside an
+app context, defer() runs the handler at once instead, in the caller's
+transaction. jobs.shutdown(app) stops an app's workers; it also runs at exit.
+"""
+import atexit
+import os
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app, has_app_context
+from sqlalchemy import delete, event, func, insert, or_, select, tuple_, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from database import begin_write
+from models import db, OutboxJob
+
+HANDLERS = {}
+MERGERS = {}
+ENQUEUED_KEY = 'jobs_enqueued'
+MAX_ERROR_LENGTH = 2000
+
+jobs_table = OutboxJob.__table__
+
+
+def handler(kind, merge=None):
+    """Registers the decorated function(connection, payload) as the handler of `kind`.
+
+    With merge(payloads) -> payload, a worker runs the jobs of that kind it
+    claimed together, as one call in one transaction.
+    """
+    def register(function):
+        HANDLERS[kind] = function
+        if merge is not None:
+            MERGERS[kind] = merge
+        return function
+    return register
+
+
+def _runner():
+    return current_app.extensions.get('jobs') if has_app_context() else None
+
+
+def defer(connection, kind, payload, session=None):
+    """Runs the `kind` handler on payload once the caller's transaction commits.
+
+    The job is inserted on `connection`, in the caller's transaction, and
+    payload must be JSON. Passing the session that owns the transaction
+    lets its commit wake this process's workers. Without a job runner the
+    handler runs now, on `connection`.
+    """
+    if _runner() is None:
+        HANDLERS[kind](connection, payload)
+        return
+    now = datetime.utcnow()
+    connection.execute(insert(jobs_table).values(kind=kind, payload=payload, run_after=now, created_at=now))
+    if session is not None:
+        session.info[ENQUEUED_KEY] = True
+
+
+def discard(connection, kind):
+    """Deletes the pending and dead jobs of a kind, for work that a full rebuild has redone."""
+    return connection.execute(delete(jobs_table).where(jobs_table.c.kind == kind)).rowcount
+
+
+def claim(connection, limit, lease, kinds=None):
+    """Leases up to `limit` due jobs; returns their (id, kind, payload, attempts) rows. Caller commits."""
+    now = datetime.utcnow()
+    due = [
+        jobs_table.c.status == 'pending',
+        jobs_table.c.run_after <= now,
+        or_(jobs_table.c.locked_until.is_(None), jobs_table.c.locked_until <= now),
+    ]
+    if kinds:
+        due.append(jobs_table.c.kind.in_(kinds))
+    begin_write(connection)
+    ids = select(jobs_table.c.id).where(*due).order_by(jobs_table.c.run_after, jobs_table.c.id).limit(limit)
+    # The conditions are repeated so that a row another claimer just took is skipped.
+    return connection.execute(
+        update(jobs_table)
+        .where(jobs_table.c.id.in_(ids.scalar_subquery()), *due)
+        .values(attempts=jobs_table.c.attempts + 1, locked_until=now + timedelta(seconds=lease))
+        .returning(jobs_table.c.id, jobs_table.c.kind, jobs_table.c.payload, jobs_table.c.attempts)
+    ).all()
+
+
+def retry_delay(attempts, base, cap):
+    delay = min(cap, base * 2 ** (attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def run_jobs(engine, jobs, config):
+    """Runs claimed jobs; returns the count per outcome: done, failed, or lost to another worker."""
+    outcomes = Counter()
+    by_kind = defaultdict(list)
+    for job in jobs:
+        by_kind[job.kind].append(job)
+    for kind, group in by_kind.items():
+        batches = [group] if kind in MERGERS and len(group) > 1 else [[job] for job in group]
+        for batch in batches:
+            outcomes.update(_run_batch(engine, kind, batch, config))
+    return outcomes
+
+
+def _run_batch(engine, kind, batch, config):
+    try:
+        with engine.begin() as connection:
+            begin_write(connection)
+            # Deleting only the rows still at the claimed attempt fences off a worker whose lease ran out.
+            ours = set(connection.scalars(
+                delete(jobs_table)
+                .where(tuple_(jobs_table.c.id, jobs_table.c.attempts).in_([(job.id, job.attempts) for job in batch]))
+                .returning(jobs_table.c.id)
+            ))
+            payloads = [job.payload for job in batch if job.id in ours]
+            if payloads:
+                HANDLERS[kind](connection, MERGERS[kind](payloads) if len(payloads) > 1 else payloads[0])
+        return {'done': len(ours), 'lost': len(batch) - len(ours)}
+    except Exception as e:
+        if len(batch) > 1:
+            # Find the job that fails; the others go through on their own.
+            outcomes = Counter()
+            for job in batch:
+                outcomes.update(_run_batch(engine, kind, [job], config))
+            return outcomes
+        error = f'{type(e).__name__}: {e}'[:MAX_ERROR_LENGTH]
+    job = batch[0]
+    delay = retry_delay(job.attempts, config['JOBS_RETRY_BASE'], config['JOBS_RETRY_MAX'])
+    with engine.begin() as connection:
+        begin_write(connection)
+        failed = connection.execute(
+            update(jobs_table)
+            .where(jobs_table.c.id == job.id, jobs_table.c.attempts == job.attempts)
+            .values(status='dead' if job.attempts >= config['JOBS_MAX_ATTEMPTS'] else 'pending',
+                    locked_until=None, last_error=error, run_after=datetime.utcnow() + timedelta(seconds=delay))
+        ).rowcount
+    return {'failed': failed, 'lost': 1 - failed}
+
+
+def drain(app, kinds=None):
+    """Runs every due job in this thread until none is left; returns the count per outcome."""
+    outcomes = Counter(done=0, failed=0, lost=0)
+    with app.app_context():
+        engine = db.engine
+    while True:
+        with engine.begin() as connection:
+            jobs = claim(connection, app.config['JOBS_BATCH_SIZE'], app.config['JOBS_LEASE'], kinds)
+        if not jobs:
+            return outcomes
+        outcomes.update(run_jobs(engine, jobs, app.config))
+
+
+def retry_dead(connection, kinds=None):
+    """Makes dead jobs due now with a fresh attempt count; returns how many."""
+    statement = update(jobs_table).where(jobs_table.c.status == 'dead')
+    if kinds:
+        statement = statement.where(jobs_table.c.kind.in_(kinds))
+    return connection.execute(
+        statement.values(status='pending', attempts=0, locked_until=None, run_after=datetime.utcnow())
+    ).rowcount
+
+
+def job_status(connection, failures=10):
+    """Returns (rows of kind, status, count, oldest created_at, next run_after; the latest failed jobs)."""
+    counts = connection.execute(
+        select(jobs_table.c.kind, jobs_table.c.status, func.count(), func.min(jobs_table.c.created_at),
+               func.min(jobs_table.c.run_after))
+        .group_by(jobs_table.c.kind, jobs_table.c.status)
+        .order_by(jobs_table.c.kind, jobs_table.c.status)
+    ).all()
+    failed = connection.execute(
+        select(jobs_table.c.id, jobs_table.c.kind, jobs_table.c.status, jobs_table.c.attempts,
+               jobs_table.c.run_after, jobs_table.c.last_error)
+        .where(jobs_table.c.last_error.is_not(None))
+        .order_by(jobs_table.c.run_after.desc())
+        .limit(failures)
+    ).all()
+    return counts, failed
+
+
+class JobRunner:
+    """The dispatcher thread and worker pool of one app. Started lazily, once per process."""
+
+    def __init__(self, app):
+        self.app = app
+        self.workers = app.config['JOBS_WORKERS']
+        self.poll_interval = app.config['JOBS_POLL_INTERVAL']
+        self.batch_size = app.config['JOBS_BATCH_SIZE']
+        self.window = app.config['JOBS_BATCH_WINDOW']
+        self._pid = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        # A thread does not survive fork(), so a forked server worker starts its own.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._wake = threading.Event()
+                self._wake.set()  # look for jobs left from before this process started
+                self._stopping = False
+                self._slots = threading.BoundedSemaphore(self.workers)
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='jobs')
+                self._thread = threading.Thread(target=self._dispatch, name='jobs-dispatch', daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+                atexit.register(self.shutdown)
+
+    def wake(self):
+        if self._pid == os.getpid():
+            self._wake.set()
+
+    def shutdown(self):
+        """Stops the dispatcher and waits for the batches already running; unclaimed jobs stay queued."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is None or self._pid != os.getpid():
+                return
+            self._stopping = True
+            self._pid = None
+        self._wake.set()
+        thread.join()
+        self._pool.shutdown(wait=True)
+        atexit.unregister(self.shutdown)
+
+    def _dispatch(self):
+        with self.app.app_context():
+            engine = db.engine
+        while True:
+            self._wake.wait(self.poll_interval)
+            if self._stopping:
+                return
+            # Let the writes still in flight join the batch, instead of one wake-up per commit.
+            time.sleep(self.window)
+            self._wake.clear()
+            if self._stopping:
+                return
+            try:
+                self._submit_due(engine)
+            except Exception:
+                self.app.logger.exception("Claiming jobs failed.")
+
+    def _submit_due(self, engine):
+        # Each free worker gets a batch of up to JOBS_BATCH_SIZE jobs.
+        while self._slots.acquire(blocking=False):
+            jobs = []
+            try:
+                with engine.begin() as connection:
+                    jobs = claim(connection, self.batch_size, self.app.config['JOBS_LEASE'])
+            finally:
+                if not jobs:
+                    self._slots.release()
+            if not jobs:
+                return
+            self._pool.submit(self._run, engine, jobs)
+
+    def _run(self, engine, jobs):
+        try:
+            run_jobs(engine, jobs, self.app.config)
+        except Exception:
+            self.app.logger.exception("Recording the outcome of %d jobs failed.", len(jobs))
+        finally:
+            self._slots.release()
+            self._wake.set()  # more may be due
+
+
+@event.listens_for(Session, 'after_commit')
+def _committed(session):
+    if session.info.pop(ENQUEUED_KEY, False):
+        runner = _runner()
+        if runner is not None:
+            runner.wake()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _rolled_back(session):
+    session.info.pop(ENQUEUED_KEY, None)
+
+
+class Jobs:
+    """Flask extension; configure with JOBS_* settings and call init_app()."""
+
+    def init_app(self, app):
+        app.config.setdefault('JOBS_ENABLED', True)
+        app.config.setdefault('JOBS_WORKERS', 2)
+        app.config.setdefault('JOBS_POLL_INTERVAL', 2)
+        app.config.setdefault('JOBS_BATCH_SIZE', 100)
+        app.config.setdefault('JOBS_BATCH_WINDOW', 0.1)
+        app.config.setdefault('JOBS_LEASE', 60)
+        app.config.setdefault('JOBS_MAX_ATTEMPTS', 8)
+        app.config.setdefault('JOBS_RETRY_BASE', 1)
+        app.config.setdefault('JOBS_RETRY_MAX', 300)
+        if app.config['JOBS_ENABLED'] and not _in_memory(app.config.get('SQLALCHEMY_DATABASE_URI')):
+            runner = app.extensions['jobs'] = JobRunner(app)
+            app.before_request(runner.ensure_started)
+
+    def shutdown(self, app=None):
+        runner = (app or current_app).extensions.get('jobs')
+        if runner is not None:
+            runner.shutdown()
+
+
+def _in_memory(uri):
+    # An in-memory SQLite database is one connection shared by every thread,
+    # so a worker's statements would interleave with the request's own.
+    if not uri:
+        return False
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+jobs = Jobs()
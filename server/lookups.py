@@ -0,0 +1,195 @@
+"""Read-through cache of the facts the write paths check: does a user or
+course exist, and what is a user's role.
+
+POST /enrollments, POST /reviews and the course writes ask user_role() and
+course_exists() instead of loading the rows. Answers come from a bounded
+LRU in process memory, and only positive answers are cached. A missing
+row is looked up every time, so an id that appears later needs no
+invalidation.
+
+Invalidation is versioned. Each kind ('user', 'course') has a generation
+number that every invalidation bumps. A lookup notes the generation
+before it queries and stores its answer only if the generation is
+unchanged. That way a read that raced a delete cannot put the deleted row
+back. ORM deletes and updates of a user, ORM deletes of a course, and
+bulk ORM statements against either invalidate when they flush and again
+when they commit. The second pass covers reads that ran between the two
+and still saw the old row. Deleting a user clears every cached course,
+because the database cascades to the user's courses.
+
+The cache is per process. Another worker's deletes are seen after
+LOOKUP_CACHE_TTL seconds at the latest. Until then the foreign keys
+reject the insert, and recheck_references() turns the IntegrityError into
+a 404.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from models import db, Course, User
+
+KINDS = ('user', 'course')
+INVALIDATIONS_KEY = 'lookup_invalidations'
+
+
+class LookupCache:
+    """Thread-safe LRU of (kind, id) -> value with a TTL and per-kind generations."""
+
+    def __init__(self, max_entries=10_000, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._generations = dict.fromkeys(KINDS, 0)
+        self._lock = threading.Lock()
+
+    def get(self, kind, id):
+        """Returns (hit, value, generation); a miss hands the generation back to put()."""
+        with self._lock:
+            generation = self._generations[kind]
+            item = self._entries.get((kind, id))
+            if item is None:
+                return False, None, generation
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._entries[(kind, id)]
+                return False, None, generation
+            self._entries.move_to_end((kind, id))
+            return True, value, generation
+
+    def put(self, kind, id, value, generation):
+        with self._lock:
+            if self._generations[kind] != generation:
+                return  # invalidated while the value was being read
+            self._entries[(kind, id)] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end((kind, id))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, kind, id=None):
+        """Forgets one id, or every id of the kind when id is None."""
+        with self._lock:
+            self._generations[kind] += 1
+            if id is not None:
+                self._entries.pop((kind, id), None)
+            else:
+                for key in [key for key in self._entries if key[0] == kind]:
+                    del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for kind in KINDS:
+                self._generations[kind] += 1
+
+
+def _cache():
+    return current_app.extensions.get('lookup_cache') if has_app_context() else None
+
+
+def _read_through(kind, id, statement):
+    cache = _cache()
+    # Other id types (strings, floats) go straight to the database, so every
+    # cached key is one that an invalidation by primary key can reach.
+    if cache is None or type(id) is not int:
+        return db.session.scalar(statement)
+    hit, value, generation = cache.get(kind, id)
+    if hit:
+        return value
+    value = db.session.scalar(statement)
+    if value is not None:
+        cache.put(kind, id, value, generation)
+    return value
+
+
+def user_role(user_id):
+    """The user's role, or None if there is no such user."""
+    return _read_through('user', user_id, select(User.role).where(User.id == user_id))
+
+
+def course_exists(course_id):
+    return _read_through('course', course_id, select(Course.id).where(Course.id == course_id)) is not None
+
+
+def recheck_references(user_id=None, course_id=None):
+    """After an IntegrityError: forgets the ids and returns the error for the first one gone, or None."""
+    cache = _cache()
+    checks = (('user', user_id, User, "User not found"), ('course', course_id, Course, "Course not found"))
+    for kind, id, model, message in checks:
+        if id is None:
+            continue
+        if cache is not None and type(id) is int:
+            cache.invalidate(kind, id)
+        if db.session.scalar(select(model.id).where(model.id == id)) is None:
+            return message
+    return None
+
+
+def _invalidate(session, kind, id=None):
+    cache = _cache()
+    if cache is not None:
+        cache.invalidate(kind, id)
+    if session is not None:
+        session.info.setdefault(INVALIDATIONS_KEY, set()).add((kind, id))
+
+
+@event.listens_for(User, 'after_update')
+def _user_updated(mapper, connection, target):
+    _invalidate(Session.object_session(target), 'user', target.id)
+
+
+@event.listens_for(User, 'after_delete')
+def _user_deleted(mapper, connection, target):
+    session = Session.object_session(target)
+    _invalidate(session, 'user', target.id)
+    _invalidate(session, 'course')
+
+
+@event.listens_for(Course, 'after_delete')
+def _course_deleted(mapper, connection, target):
+    _invalidate(Session.object_session(target), 'course', target.id)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _bulk_statement(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete) or orm_execute_state.bind_mapper is None:
+        return
+    model = orm_execute_state.bind_mapper.class_
+    if model is User:
+        _invalidate(orm_execute_state.session, 'user')
+        if orm_execute_state.is_delete:
+            _invalidate(orm_execute_state.session, 'course')
+    elif model is Course and orm_execute_state.is_delete:
+        _invalidate(orm_execute_state.session, 'course')
+
+
+@event.listens_for(Session, 'after_commit')
+def _committed(session):
+    cache = _cache()
+    for kind, id in session.info.pop(INVALIDATIONS_KEY, ()):
+        if cache is not None:
+            cache.invalidate(kind, id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _rolled_back(session):
+    session.info.pop(INVALIDATIONS_KEY, None)
+
+
+class Lookups:
+    """Flask extension; configure with LOOKUP_CACHE_* settings and call init_app()."""
+
+    def init_app(self, app):
+        app.config.setdefault('LOOKUP_CACHE_ENABLED', True)
+        app.config.setdefault('LOOKUP_CACHE_MAX_ENTRIES', 10_000)
+        app.config.setdefault('LOOKUP_CACHE_TTL', 30)
+        if app.config['LOOKUP_CACHE_ENABLED']:
+            app.extensions['lookup_cache'] = LookupCache(
+                app.config['LOOKUP_CACHE_MAX_ENTRIES'], app.config['LOOKUP_CACHE_TTL'],
+            )
+
+
+lookups = Lookups()
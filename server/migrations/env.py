@@ -14,6 +14,8 @@ config = context.config
 fileConfig(config.config_file_name)
 logger = logging.getLogger('alembic.env')
 
+FTS_SUFFIXES = tuple(f'_fts{shadow}' for shadow in ('', '_config', '_data', '_docsize', '_idx', '_content'))
+
 
 def get_engine():
     try:
@@ -90,21 +92,45 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
+    # The FTS5 search tables (and their shadow tables) are created by a
+    # migration with raw SQL and have no models; autogenerate must not drop them.
+    def include_name(name, type_, parent_names):
+        if type_ == 'table':
+            return not name.endswith(FTS_SUFFIXES)
+        return True
+
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    if conf_args.get("include_name") is None:
+        conf_args["include_name"] = include_name
 
     connectable = get_engine()
 
     with connectable.connect() as connection:
-        context.configure(
-            connection=connection,
-            target_metadata=get_metadata(),
-            **conf_args
-        )
-
-        with context.begin_transaction():
-            context.run_migrations()
+        # SQLite batch migrations recreate tables, and with foreign_keys on,
+        # DROP TABLE would first delete (or cascade to) the referencing rows.
+        # The pragma has no effect inside a transaction, hence the commits.
+        foreign_keys = None
+        if connection.dialect.name == 'sqlite':
+            foreign_keys = connection.exec_driver_sql('PRAGMA foreign_keys').scalar()
+            connection.exec_driver_sql('PRAGMA foreign_keys=OFF')
+            connection.commit()
+
+        try:
+            context.configure(
+                connection=connection,
+                target_metadata=get_metadata(),
+                **conf_args
+            )
+
+            with context.begin_transaction():
+                context.run_migrations()
+        finally:
+            if foreign_keys is not None:
+                connection.rollback()
+                connection.exec_driver_sql(f'PRAGMA foreign_keys={foreign_keys}')
+                connection.commit()
 
 
 if context.is_offline_mode():
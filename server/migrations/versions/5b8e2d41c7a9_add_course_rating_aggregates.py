@@ -0,0 +1,42 @@
+"""add course rating aggregates
+
+Revision ID: 5b8e2d41c7a9
+Revises: 34f79c3130ed
+Create Date: 2026-10-17 09:12:41.503117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e2d41c7a9'
+down_revision = '34f79c3130ed'
+branch_labels = None
+depends_on = None
+
+RATING_COLUMNS = ['rating_count', 'rating_sum'] + [f'rating_{n}_count' for n in range(1, 6)]
+
+
+def upgrade():
+    with op.batch_alter_table('courses', schema=None) as batch_op:
+        for column in RATING_COLUMNS:
+            batch_op.add_column(sa.Column(column, sa.Integer(), nullable=False, server_default='0'))
+
+    # Backfill from existing reviews.
+    star_counts = ', '.join(
+        f'rating_{n}_count = (SELECT COUNT(*) FROM reviews WHERE reviews.course_id = courses.id AND reviews.rating = {n})'
+        for n in range(1, 6)
+    )
+    op.execute(
+        'UPDATE courses SET '
+        'rating_count = (SELECT COUNT(*) FROM reviews WHERE reviews.course_id = courses.id), '
+        'rating_sum = (SELECT COALESCE(SUM(rating), 0) FROM reviews WHERE reviews.course_id = courses.id), '
+        + star_counts
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('courses', schema=None) as batch_op:
+        for column in reversed(RATING_COLUMNS):
+            batch_op.drop_column(column)
@@ -0,0 +1,48 @@
+"""add lookup indexes and unique enrollment
+
+Revision ID: 8d3f6a0e2b14
+Revises: 5b8e2d41c7a9
+Create Date: 2026-10-17 10:03:27.918352
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d3f6a0e2b14'
+down_revision = '5b8e2d41c7a9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Drop duplicate enrollments left by the old check-then-insert race,
+    # keeping the earliest row of each (user_id, course_id) pair.
+    op.execute(
+        'DELETE FROM enrollments WHERE id NOT IN '
+        '(SELECT MIN(id) FROM enrollments GROUP BY user_id, course_id)'
+    )
+    with op.batch_alter_table('enrollments', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_enrollments_user_id_course_id', ['user_id', 'course_id'])
+        batch_op.create_index(batch_op.f('ix_enrollments_course_id'), ['course_id'], unique=False)
+
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.create_index('ix_reviews_course_id_rating', ['course_id', 'rating'], unique=False)
+        batch_op.create_index(batch_op.f('ix_reviews_user_id'), ['user_id'], unique=False)
+
+    with op.batch_alter_table('courses', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_courses_instructor_id'), ['instructor_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('courses', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_courses_instructor_id'))
+
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_reviews_user_id'))
+        batch_op.drop_index('ix_reviews_course_id_rating')
+
+    with op.batch_alter_table('enrollments', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_enrollments_course_id'))
+        batch_op.drop_constraint('uq_enrollments_user_id_course_id', type_='unique')
@@ -0,0 +1,59 @@
+"""add course statistics
+
+Revision ID: a7c2e9f41d08
+Revises: e6a9d03b7f21
+Create Date: 2026-10-17 15:08:44.207319
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c2e9f41d08'
+down_revision = 'e6a9d03b7f21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Rollups and leaderboards for stats.py. Populate with `flask refresh-stats`.
+    op.create_table('course_daily_enrollments',
+    sa.Column('course_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('enrollments', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['course_id'], ['courses.id']),
+    sa.PrimaryKeyConstraint('course_id', 'day')
+    )
+    op.create_index('ix_course_daily_enrollments_day', 'course_daily_enrollments',
+                    ['day', 'course_id', 'enrollments'], unique=False)
+    op.create_table('difficulty_rating_stats',
+    sa.Column('difficulty', sa.String(length=50), nullable=False),
+    sa.Column('rating_count', sa.Integer(), nullable=False),
+    sa.Column('rating_sum', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('difficulty')
+    )
+    op.create_table('stats_watermarks',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('last_id', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.create_table('leaderboard_entries',
+    sa.Column('board', sa.String(length=50), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.Column('course_id', sa.Integer(), nullable=False),
+    sa.Column('title', sa.String(length=255), nullable=False),
+    sa.Column('difficulty', sa.String(length=50), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['course_id'], ['courses.id']),
+    sa.PrimaryKeyConstraint('board', 'rank')
+    )
+
+
+def downgrade():
+    op.drop_table('leaderboard_entries')
+    op.drop_table('stats_watermarks')
+    op.drop_table('difficulty_rating_stats')
+    op.drop_index('ix_course_daily_enrollments_day', table_name='course_daily_enrollments')
+    op.drop_table('course_daily_enrollments')
@@ -0,0 +1,84 @@
+"""cascade deletes
+
+Revision ID: b9e4c72a5d30
+Revises: f3b8d61c0a25
+Create Date: 2026-10-17 18:52:16.740193
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b9e4c72a5d30'
+down_revision = 'f3b8d61c0a25'
+branch_labels = None
+depends_on = None
+
+# (table, column, referred table) for every foreign key that now cascades.
+FOREIGN_KEYS = [
+    ('courses', 'instructor_id', 'users'),
+    ('enrollments', 'user_id', 'users'),
+    ('enrollments', 'course_id', 'courses'),
+    ('reviews', 'user_id', 'users'),
+    ('reviews', 'course_id', 'courses'),
+    ('course_similarities', 'course_id', 'courses'),
+    ('course_similarities', 'similar_course_id', 'courses'),
+    ('course_daily_enrollments', 'course_id', 'courses'),
+    ('leaderboard_entries', 'course_id', 'courses'),
+]
+
+# The constraints were created unnamed. This convention names the reflected
+# ones on SQLite the way PostgreSQL named them, so one drop works for both.
+NAMING_CONVENTION = {'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+
+# Recreating courses and reviews on SQLite drops their full-text search
+# triggers (see c41a7e95d2f3), so they are created again afterwards.
+SQLITE_FTS_TRIGGERS = [
+    """CREATE TRIGGER courses_fts_ai AFTER INSERT ON courses BEGIN
+        INSERT INTO courses_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER courses_fts_ad AFTER DELETE ON courses BEGIN
+        INSERT INTO courses_fts(courses_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    """CREATE TRIGGER courses_fts_au AFTER UPDATE OF title, description ON courses BEGIN
+        INSERT INTO courses_fts(courses_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO courses_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER reviews_fts_ai AFTER INSERT ON reviews BEGIN
+        INSERT INTO reviews_fts(rowid, text_content) VALUES (new.id, new.text_content);
+    END""",
+    """CREATE TRIGGER reviews_fts_ad AFTER DELETE ON reviews BEGIN
+        INSERT INTO reviews_fts(reviews_fts, rowid, text_content) VALUES ('delete', old.id, old.text_content);
+    END""",
+    """CREATE TRIGGER reviews_fts_au AFTER UPDATE OF text_content ON reviews BEGIN
+        INSERT INTO reviews_fts(reviews_fts, rowid, text_content) VALUES ('delete', old.id, old.text_content);
+        INSERT INTO reviews_fts(rowid, text_content) VALUES (new.id, new.text_content);
+    END""",
+]
+
+
+def _replace_foreign_keys(ondelete):
+    tables = dict.fromkeys(table for table, _, _ in FOREIGN_KEYS)
+    for table in tables:
+        with op.batch_alter_table(table, schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+            for fk_table, column, referred in FOREIGN_KEYS:
+                if fk_table != table:
+                    continue
+                name = f'{table}_{column}_fkey'
+                batch_op.drop_constraint(name, type_='foreignkey')
+                batch_op.create_foreign_key(name, referred, [column], ['id'], ondelete=ondelete)
+
+    if op.get_bind().dialect.name == 'sqlite':
+        for statement in SQLITE_FTS_TRIGGERS:
+            op.execute(statement)
+
+
+def upgrade():
+    _replace_foreign_keys('CASCADE')
+
+
+def downgrade():
+    _replace_foreign_keys(None)
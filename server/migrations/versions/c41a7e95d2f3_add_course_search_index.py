@@ -0,0 +1,76 @@
+"""add course search index
+
+Revision ID: c41a7e95d2f3
+Revises: 8d3f6a0e2b14
+Create Date: 2026-10-17 11:26:05.344810
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41a7e95d2f3'
+down_revision = '8d3f6a0e2b14'
+branch_labels = None
+depends_on = None
+
+# External-content FTS5 tables mirror courses and reviews by rowid. The triggers
+# keep them in sync; the course update trigger only watches the indexed
+# columns so rating aggregate updates do not touch the index.
+SQLITE_UPGRADE = [
+    "CREATE VIRTUAL TABLE courses_fts USING fts5("
+    "title, description, content='courses', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE VIRTUAL TABLE reviews_fts USING fts5("
+    "text_content, content='reviews', content_rowid='id', tokenize='porter unicode61')",
+    "INSERT INTO courses_fts(courses_fts) VALUES ('rebuild')",
+    "INSERT INTO reviews_fts(reviews_fts) VALUES ('rebuild')",
+    """CREATE TRIGGER courses_fts_ai AFTER INSERT ON courses BEGIN
+        INSERT INTO courses_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER courses_fts_ad AFTER DELETE ON courses BEGIN
+        INSERT INTO courses_fts(courses_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    """CREATE TRIGGER courses_fts_au AFTER UPDATE OF title, description ON courses BEGIN
+        INSERT INTO courses_fts(courses_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO courses_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER reviews_fts_ai AFTER INSERT ON reviews BEGIN
+        INSERT INTO reviews_fts(rowid, text_content) VALUES (new.id, new.text_content);
+    END""",
+    """CREATE TRIGGER reviews_fts_ad AFTER DELETE ON reviews BEGIN
+        INSERT INTO reviews_fts(reviews_fts, rowid, text_content) VALUES ('delete', old.id, old.text_content);
+    END""",
+    """CREATE TRIGGER reviews_fts_au AFTER UPDATE OF text_content ON reviews BEGIN
+        INSERT INTO reviews_fts(reviews_fts, rowid, text_content) VALUES ('delete', old.id, old.text_content);
+        INSERT INTO reviews_fts(rowid, text_content) VALUES (new.id, new.text_content);
+    END""",
+]
+
+SQLITE_DOWNGRADE = [
+    'DROP TRIGGER IF EXISTS reviews_fts_au',
+    'DROP TRIGGER IF EXISTS reviews_fts_ad',
+    'DROP TRIGGER IF EXISTS reviews_fts_ai',
+    'DROP TRIGGER IF EXISTS courses_fts_au',
+    'DROP TRIGGER IF EXISTS courses_fts_ad',
+    'DROP TRIGGER IF EXISTS courses_fts_ai',
+    'DROP TABLE IF EXISTS reviews_fts',
+    'DROP TABLE IF EXISTS courses_fts',
+]
+
+
+def upgrade():
+    # Other databases use the LIKE fallback in search.py.
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for statement in SQLITE_UPGRADE:
+        op.execute(statement)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for statement in SQLITE_DOWNGRADE:
+        op.execute(statement)
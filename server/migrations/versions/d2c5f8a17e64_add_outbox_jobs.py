@@ -0,0 +1,38 @@
+"""add outbox jobs
+
+Revision ID: d2c5f8a17e64
+Revises: b9e4c72a5d30
+Create Date: 2026-10-17 20:12:37.604118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2c5f8a17e64'
+down_revision = 'b9e4c72a5d30'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Deferred follow-up work for jobs.py; rows are deleted once their job has run.
+    op.create_table('outbox_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=50), nullable=False),
+    sa.Column('payload', sa.JSON(), nullable=False),
+    sa.Column('status', sa.String(length=10), nullable=False, server_default='pending'),
+    sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('run_after', sa.DateTime(), nullable=False),
+    sa.Column('locked_until', sa.DateTime(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_outbox_jobs_status_run_after', 'outbox_jobs', ['status', 'run_after'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_outbox_jobs_status_run_after', table_name='outbox_jobs')
+    op.drop_table('outbox_jobs')
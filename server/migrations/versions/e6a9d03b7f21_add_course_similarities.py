@@ -0,0 +1,34 @@
+"""add course similarities
+
+Revision ID: e6a9d03b7f21
+Revises: c41a7e95d2f3
+Create Date: 2026-10-17 13:42:10.518264
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6a9d03b7f21'
+down_revision = 'c41a7e95d2f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The composite primary key doubles as the (course_id, ...) lookup index
+    # used when serving recommendations. Populate with `flask build-similarities`.
+    op.create_table('course_similarities',
+    sa.Column('course_id', sa.Integer(), nullable=False),
+    sa.Column('similar_course_id', sa.Integer(), nullable=False),
+    sa.Column('co_count', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['course_id'], ['courses.id']),
+    sa.ForeignKeyConstraint(['similar_course_id'], ['courses.id']),
+    sa.PrimaryKeyConstraint('course_id', 'similar_course_id')
+    )
+
+
+def downgrade():
+    op.drop_table('course_similarities')
@@ -0,0 +1,84 @@
+"""add sync timestamps and tombstones
+
+Revision ID: e7b1f40c9a36
+Revises: d2c5f8a17e64
+Create Date: 2026-10-17 22:41:09.518203
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b1f40c9a36'
+down_revision = 'd2c5f8a17e64'
+branch_labels = None
+depends_on = None
+
+SYNCED_TABLES = ('courses', 'reviews', 'enrollments')
+
+# Rows recorded by the AFTER DELETE triggers for GET /sync. Cascaded deletes
+# fire them too. SQLite's timestamp is padded to microseconds to match the
+# format SQLAlchemy stores.
+SQLITE_UPGRADE = [
+    f"""CREATE TRIGGER {table}_tombstone AFTER DELETE ON {table} BEGIN
+        INSERT INTO tombstones(entity, entity_id, deleted_at)
+        VALUES ('{table}', old.id, strftime('%Y-%m-%d %H:%M:%f', 'now') || '000');
+    END"""
+    for table in SYNCED_TABLES
+]
+SQLITE_DOWNGRADE = [f'DROP TRIGGER IF EXISTS {table}_tombstone' for table in SYNCED_TABLES]
+
+POSTGRESQL_UPGRADE = [
+    """CREATE OR REPLACE FUNCTION record_tombstone() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO tombstones(entity, entity_id, deleted_at)
+        VALUES (TG_TABLE_NAME, OLD.id, clock_timestamp() AT TIME ZONE 'UTC');
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql""",
+    *(f"CREATE TRIGGER {table}_tombstone AFTER DELETE ON {table} "
+      f"FOR EACH ROW EXECUTE FUNCTION record_tombstone()" for table in SYNCED_TABLES),
+]
+POSTGRESQL_DOWNGRADE = [
+    *(f'DROP TRIGGER IF EXISTS {table}_tombstone ON {table}' for table in SYNCED_TABLES),
+    'DROP FUNCTION IF EXISTS record_tombstone()',
+]
+
+TRIGGERS = {
+    'sqlite': (SQLITE_UPGRADE, SQLITE_DOWNGRADE),
+    'postgresql': (POSTGRESQL_UPGRADE, POSTGRESQL_DOWNGRADE),
+}
+
+
+def upgrade():
+    now = datetime.utcnow()
+    for table in SYNCED_TABLES:
+        # A constant default lets SQLite add the column in place. Batch mode would
+        # rebuild the table and lose the search index triggers on it.
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=False,
+                                       server_default='1970-01-01 00:00:00.000000'))
+        op.execute(sa.table(table, sa.column('updated_at', sa.DateTime())).update().values(updated_at=now))
+        op.create_index(f'ix_{table}_updated_at_id', table, ['updated_at', 'id'], unique=False)
+
+    op.create_table('tombstones',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('entity', sa.String(length=20), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_tombstones_deleted_at_id', 'tombstones', ['deleted_at', 'id'], unique=False)
+    for statement in TRIGGERS.get(op.get_bind().dialect.name, ((), ()))[0]:
+        op.execute(statement)
+
+
+def downgrade():
+    for statement in TRIGGERS.get(op.get_bind().dialect.name, ((), ()))[1]:
+        op.execute(statement)
+    op.drop_index('ix_tombstones_deleted_at_id', table_name='tombstones')
+    op.drop_table('tombstones')
+    for table in reversed(SYNCED_TABLES):
+        op.drop_index(f'ix_{table}_updated_at_id', table_name=table)
+        op.drop_column(table, 'updated_at')
@@ -0,0 +1,26 @@
+"""add course version
+
+Revision ID: f3b8d61c0a25
+Revises: a7c2e9f41d08
+Create Date: 2026-10-17 17:41:09.318652
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b8d61c0a25'
+down_revision = 'a7c2e9f41d08'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('courses', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    with op.batch_alter_table('courses', schema=None) as batch_op:
+        batch_op.drop_column('version')
@@ -1,10 +1,12 @@
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy_serializer import SerializerMixin
+from sqlalchemy import event, func, inspect, or_, select, update
 from sqlalchemy.orm import validates
 from datetime import datetime, timedelta
-from werkzeug.security import generate_password_hash, check_password_hash
+from database import RoutingSession
+from hashing import password_hasher
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model, SerializerMixin):
     __tablename__ = 'users'
@@ -14,10 +16,14 @@ class User(db.Model, SerializerMixin):
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(128), nullable=False)
     role = db.Column(db.String(50), nullable=False, default='student')
-    
-    enrollments = db.relationship('Enrollment', backref='user', cascade='all, delete-orphan', lazy=True)
-    reviews = db.relationship('Review', backref='user', cascade='all, delete-orphan', lazy=True)
-    courses = db.relationship('Course', backref='instructor', cascade='all, delete-orphan', lazy=True)
+
+    # The foreign keys cascade in the database; passive_deletes stops the ORM loading children to delete them.
+    enrollments = db.relationship('Enrollment', backref='user', cascade='all, delete-orphan',
+                                  passive_deletes=True, lazy=True)
+    reviews = db.relationship('Review', backref='user', cascade='all, delete-orphan',
+                              passive_deletes=True, lazy=True)
+    courses = db.relationship('Course', backref='instructor', cascade='all, delete-orphan',
+                              passive_deletes=True, lazy=True)
 
     serialize_rules = (
         '-password_hash',
@@ -33,10 +39,10 @@ class User(db.Model, SerializerMixin):
 
     @password.setter
     def password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def verify_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
 
     @validates('username')
     def validate_username(self, key, username):
@@ -62,16 +68,50 @@ class User(db.Model, SerializerMixin):
 
 class Course(db.Model, SerializerMixin):
     __tablename__ = 'courses'
+    # GET /sync scans each synced table by (updated_at, id).
+    __table_args__ = (
+        db.Index('ix_courses_updated_at_id', 'updated_at', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255), unique=True, nullable=False)
     description = db.Column(db.Text, nullable=False)
     difficulty = db.Column(db.String(50), nullable=False)
     duration_hours = db.Column(db.Integer, nullable=False)
-    instructor_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-
-    enrollments = db.relationship('Enrollment', backref='course', cascade='all, delete-orphan', lazy=True)
-    reviews = db.relationship('Review', backref='course', cascade='all, delete-orphan', lazy=True)
+    instructor_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+
+    # Denormalized review aggregates, kept in step with the reviews table by the
+    # Review mapper events below and rebuilt in bulk by `flask rebuild-ratings`.
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_1_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_2_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_3_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_4_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_5_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Bumped by every update; PATCH /courses/<id> compares it against If-Match.
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    # Set by every insert and update, Core UPDATEs of the rating aggregates included.
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    enrollments = db.relationship('Enrollment', backref='course', cascade='all, delete-orphan',
+                                  passive_deletes=True, lazy=True)
+    reviews = db.relationship('Review', backref='course', cascade='all, delete-orphan',
+                              passive_deletes=True, lazy=True)
+
+    __mapper_args__ = {'version_id_col': version}
+
+    DIFFICULTIES = ('Beginner', 'Intermediate', 'Advanced')
+    EDITABLE_FIELDS = ('title', 'description', 'difficulty', 'duration_hours', 'instructor_id')
+    RATING_VALUES = (1, 2, 3, 4, 5)
+    RATING_COLUMNS = ('rating_count', 'rating_sum') + tuple(f'rating_{n}_count' for n in RATING_VALUES)
+
+    serializable_keys = (
+        'id', 'title', 'description', 'difficulty', 'duration_hours', 'instructor_id', 'version',
+        'rating_count', 'rating_average', 'rating_histogram',
+        'enrollments', 'reviews', 'instructor',
+    )
 
     serialize_rules = (
         '-enrollments.course',
@@ -96,9 +136,8 @@ class Course(db.Model, SerializerMixin):
 
     @validates('difficulty')
     def validate_difficulty(self, key, difficulty):
-        valid_difficulties = ['Beginner', 'Intermediate', 'Advanced']
-        if difficulty not in valid_difficulties:
-            raise ValueError(f"Difficulty must be one of {valid_difficulties}.")
+        if difficulty not in self.DIFFICULTIES:
+            raise ValueError(f"Difficulty must be one of {list(self.DIFFICULTIES)}.")
         return difficulty
 
     @validates('duration_hours')
@@ -109,18 +148,153 @@ class Course(db.Model, SerializerMixin):
             raise ValueError("Duration must be a positive number in hours.")
         return duration_hours
 
+    @staticmethod
+    def rating_average_of(rating_count, rating_sum):
+        if not rating_count:
+            return None
+        return round(rating_sum / rating_count, 2)
+
+    @property
+    def rating_average(self):
+        return self.rating_average_of(self.rating_count, self.rating_sum)
+
+    @classmethod
+    def summary_columns(cls):
+        """The columns summary() reads, for selecting course summaries without loading the rows."""
+        return (cls.id, cls.title, cls.difficulty, cls.duration_hours, cls.instructor_id,
+                cls.rating_count, cls.rating_sum)
+
+    @classmethod
+    def summary(cls, row):
+        """The summary dict (search results, recommendations) of a row selected with summary_columns()."""
+        return {
+            'id': row.id,
+            'title': row.title,
+            'difficulty': row.difficulty,
+            'duration_hours': row.duration_hours,
+            'instructor_id': row.instructor_id,
+            'rating_count': row.rating_count,
+            'rating_average': cls.rating_average_of(row.rating_count, row.rating_sum),
+        }
+
+    @property
+    def rating_histogram(self):
+        return {str(n): getattr(self, f'rating_{n}_count') for n in self.RATING_VALUES}
+
+    @classmethod
+    def validated_changes(cls, data):
+        """Runs the column validators over a partial update; returns the values to write."""
+        unknown = [key for key in data if key not in cls.EDITABLE_FIELDS]
+        if unknown:
+            raise ValueError(
+                f"Fields cannot be updated: {', '.join(unknown)}. Editable fields are {list(cls.EDITABLE_FIELDS)}."
+            )
+        probe = cls()
+        for key, value in data.items():
+            setattr(probe, key, value)
+        return {key: getattr(probe, key) for key in data}
+
+    @classmethod
+    def update_fields(cls, connection, course_id, values, expected_version=None):
+        """Writes `values` and bumps the version in one UPDATE.
+
+        With `expected_version` the row only changes if its version still
+        matches. Returns the new version, or None when no row was updated.
+        """
+        courses = cls.__table__
+        statement = (
+            update(courses)
+            .where(courses.c.id == course_id)
+            .values(**values, version=courses.c.version + 1)
+            .returning(courses.c.version)
+        )
+        if expected_version is not None:
+            statement = statement.where(courses.c.version == expected_version)
+        return connection.execute(statement).scalar()
+
+    @classmethod
+    def rating_delta_values(cls, counts, sign=1):
+        """Column increments for adding (sign=1) or removing (sign=-1) reviews.
+
+        `counts` maps a star rating to the number of reviews with that rating.
+        """
+        table = cls.__table__
+        values = {
+            'rating_count': table.c.rating_count + sign * sum(counts.values()),
+            'rating_sum': table.c.rating_sum + sign * sum(rating * n for rating, n in counts.items()),
+        }
+        for rating, n in counts.items():
+            column = f'rating_{rating}_count'
+            values[column] = table.c[column] + sign * n
+        return values
+
+    @classmethod
+    def apply_rating_delta(cls, connection, course_id, counts, sign=1):
+        connection.execute(
+            update(cls.__table__)
+            .where(cls.__table__.c.id == course_id)
+            .values(**cls.rating_delta_values(counts, sign))
+        )
+
+    @classmethod
+    def subtract_user_ratings(cls, connection, user_id):
+        """Removes a user's remaining reviews from the aggregates, ahead of the cascade that deletes them."""
+        reviews = Review.__table__
+        counts = {}
+        for course_id, rating, n in connection.execute(
+            select(reviews.c.course_id, reviews.c.rating, func.count())
+            .where(reviews.c.user_id == user_id)
+            .group_by(reviews.c.course_id, reviews.c.rating)
+        ):
+            counts.setdefault(course_id, {})[rating] = n
+        for course_id, course_counts in counts.items():
+            cls.apply_rating_delta(connection, course_id, course_counts, sign=-1)
+
+    @classmethod
+    def rebuild_rating_aggregates(cls, connection):
+        """Recomputes the courses' rating columns from the reviews table in one UPDATE; returns how many changed.
+
+        Only courses whose columns disagree with their reviews are written, so
+        the others keep their updated_at and GET /sync does not send them again.
+        """
+        reviews = Review.__table__
+        courses = cls.__table__
+
+        def review_aggregate(expression, *criteria):
+            return (
+                select(func.coalesce(expression, 0))
+                .where(reviews.c.course_id == courses.c.id, *criteria)
+                .scalar_subquery()
+            )
+
+        values = {
+            'rating_count': review_aggregate(func.count(reviews.c.id)),
+            'rating_sum': review_aggregate(func.sum(reviews.c.rating)),
+        }
+        for n in cls.RATING_VALUES:
+            values[f'rating_{n}_count'] = review_aggregate(func.count(reviews.c.id), reviews.c.rating == n)
+        stale = or_(*(courses.c[column] != value for column, value in values.items()))
+        return connection.execute(update(courses).where(stale).values(**values)).rowcount
+
     def __repr__(self):
         return f'<Course {self.id}: {self.title}>'
 
 class Enrollment(db.Model, SerializerMixin):
     __tablename__ = 'enrollments'
+    # The unique pair also serves as the user_id index.
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'course_id', name='uq_enrollments_user_id_course_id'),
+        db.Index('ix_enrollments_updated_at_id', 'updated_at', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id', ondelete='CASCADE'), nullable=False, index=True)
     enrollment_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     serialize_rules = (
+        '-updated_at',  # sync bookkeeping (see sync.py), not part of the API
         '-user.enrollments',
         '-user.reviews',
         '-user.courses',
@@ -150,14 +324,21 @@ class Enrollment(db.Model, SerializerMixin):
 
 class Review(db.Model, SerializerMixin):
     __tablename__ = 'reviews'
+    # (course_id, rating) covers the per-course rating aggregates.
+    __table_args__ = (
+        db.Index('ix_reviews_course_id_rating', 'course_id', 'rating'),
+        db.Index('ix_reviews_updated_at_id', 'updated_at', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     text_content = db.Column(db.Text, nullable=False)
     rating = db.Column(db.Integer, nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id', ondelete='CASCADE'), nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     serialize_rules = (
+        '-updated_at',  # sync bookkeeping (see sync.py), not part of the API
         '-user.reviews',
         '-user.enrollments',
         '-user.courses',
@@ -182,4 +363,169 @@ class Review(db.Model, SerializerMixin):
         return rating
 
     def __repr__(self):
-        return f'<Review {self.id}: Course {self.course_id} by User {self.user_id} - Rating: {self.rating}>'
\ No newline at end of file
+        return f'<Review {self.id}: Course {self.course_id} by User {self.user_id} - Rating: {self.rating}>'
+
+class CourseSimilarity(db.Model):
+    """Precomputed item-item similarity between two courses, stored in both directions.
+
+    Built by `flask build-similarities` and kept current for new enrollments
+    by recommendations.record_enrollments.
+    """
+    __tablename__ = 'course_similarities'
+
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id', ondelete='CASCADE'), primary_key=True)
+    similar_course_id = db.Column(db.Integer, db.ForeignKey('courses.id', ondelete='CASCADE'), primary_key=True)
+    co_count = db.Column(db.Integer, nullable=False)  # users enrolled in both courses
+    score = db.Column(db.Float, nullable=False)  # Jaccard index of the two enrollment sets
+
+    def __repr__(self):
+        return f'<CourseSimilarity {self.course_id} -> {self.similar_course_id}: {self.score:.3f}>'
+
+class CourseDailyEnrollments(db.Model):
+    """Enrollments per course per enrollment day; a rollup kept by stats.refresh_stats()."""
+    __tablename__ = 'course_daily_enrollments'
+    # Covers the "popular over the last N days" scan without touching the table.
+    __table_args__ = (
+        db.Index('ix_course_daily_enrollments_day', 'day', 'course_id', 'enrollments'),
+    )
+
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    enrollments = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f'<CourseDailyEnrollments {self.course_id} on {self.day}: {self.enrollments}>'
+
+class DifficultyRatingStats(db.Model):
+    """Review totals per course difficulty; a rollup kept by stats.refresh_stats()."""
+    __tablename__ = 'difficulty_rating_stats'
+
+    difficulty = db.Column(db.String(50), primary_key=True)
+    rating_count = db.Column(db.Integer, nullable=False)
+    rating_sum = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f'<DifficultyRatingStats {self.difficulty}: {self.rating_count} ratings>'
+
+class StatsWatermark(db.Model):
+    """The highest source row id each rollup has folded in."""
+    __tablename__ = 'stats_watermarks'
+
+    name = db.Column(db.String(50), primary_key=True)
+    last_id = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f'<StatsWatermark {self.name}: {self.last_id}>'
+
+class LeaderboardEntry(db.Model):
+    """One ranked course of a materialized leaderboard, denormalized so a board is one range read."""
+    __tablename__ = 'leaderboard_entries'
+
+    board = db.Column(db.String(50), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id', ondelete='CASCADE'), nullable=False)
+    title = db.Column(db.String(255), nullable=False)
+    difficulty = db.Column(db.String(50), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    count = db.Column(db.Integer, nullable=False)  # enrollments or ratings behind the score
+
+    def __repr__(self):
+        return f'<LeaderboardEntry {self.board} #{self.rank}: Course {self.course_id}>'
+
+class OutboxJob(db.Model):
+    """Follow-up work committed with the write that caused it; claimed, run and deleted by jobs.py."""
+    __tablename__ = 'outbox_jobs'
+    # The dispatcher's scan for due jobs.
+    __table_args__ = (
+        db.Index('ix_outbox_jobs_status_run_after', 'status', 'run_after'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='pending', server_default='pending')  # or 'dead'
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_until = db.Column(db.DateTime)  # lease of the worker running the current attempt
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<OutboxJob {self.id}: {self.kind} ({self.status}, {self.attempts} attempts)>'
+
+class Tombstone(db.Model):
+    """A deleted course, review or enrollment, kept so GET /sync can tell clients to drop it."""
+    __tablename__ = 'tombstones'
+    __table_args__ = (
+        db.Index('ix_tombstones_deleted_at_id', 'deleted_at', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(20), nullable=False)  # table name of the deleted row
+    entity_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Tombstone {self.id}: {self.entity} {self.entity_id}>'
+
+# Tombstones are written by AFTER DELETE triggers, because most deletes of these
+# tables are ON DELETE CASCADEs the ORM never sees. SQLite's timestamp is padded to
+# the microseconds SQLAlchemy stores, so it compares and parses like updated_at.
+# The migration creates the same triggers; these cover db.create_all().
+TOMBSTONE_TABLES = ('courses', 'reviews', 'enrollments')
+TOMBSTONE_TRIGGERS = {
+    'sqlite': [
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_tombstone AFTER DELETE ON {table} BEGIN
+            INSERT INTO tombstones(entity, entity_id, deleted_at)
+            VALUES ('{table}', old.id, strftime('%Y-%m-%d %H:%M:%f', 'now') || '000');
+        END"""
+        for table in TOMBSTONE_TABLES
+    ],
+    'postgresql': [
+        """CREATE OR REPLACE FUNCTION record_tombstone() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO tombstones(entity, entity_id, deleted_at)
+            VALUES (TG_TABLE_NAME, OLD.id, clock_timestamp() AT TIME ZONE 'UTC');
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql""",
+        *(f"CREATE OR REPLACE TRIGGER {table}_tombstone AFTER DELETE ON {table} "
+          f"FOR EACH ROW EXECUTE FUNCTION record_tombstone()" for table in TOMBSTONE_TABLES),
+    ],
+}
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_tombstone_triggers(target, connection, **kw):
+    for statement in TOMBSTONE_TRIGGERS.get(connection.dialect.name, ()):
+        connection.exec_driver_sql(statement)
+
+# Keep Course rating aggregates in the same transaction as the review write.
+# These fire for session adds/deletes, including ORM cascades of reviews the session has loaded.
+@event.listens_for(Review, 'after_insert')
+def _review_inserted(mapper, connection, target):
+    Course.apply_rating_delta(connection, target.course_id, {target.rating: 1})
+
+
+@event.listens_for(Review, 'after_delete')
+def _review_deleted(mapper, connection, target):
+    Course.apply_rating_delta(connection, target.course_id, {target.rating: 1}, sign=-1)
+
+
+@event.listens_for(Review, 'after_update')
+def _review_updated(mapper, connection, target):
+    state = inspect(target)
+    rating_history = state.attrs.rating.history
+    course_history = state.attrs.course_id.history
+    if not (rating_history.has_changes() or course_history.has_changes()):
+        return
+    old_rating = rating_history.deleted[0] if rating_history.deleted else target.rating
+    old_course_id = course_history.deleted[0] if course_history.deleted else target.course_id
+    Course.apply_rating_delta(connection, old_course_id, {old_rating: 1}, sign=-1)
+    Course.apply_rating_delta(connection, target.course_id, {target.rating: 1})
+
+
+# Reviews deleted by ON DELETE CASCADE skip the listeners above. Reviews the session
+# had loaded are deleted first, by the ORM, so this only sees the rest.
+@event.listens_for(User, 'before_delete')
+def _user_deleting(mapper, connection, target):
+    Course.subtract_user_ratings(connection, target.id)
@@ -0,0 +1,69 @@
+"""Warm-up for preforking servers: the work every worker would otherwise
+repeat on its first requests, done once before fork().
+
+    gunicorn --preload -w 4 -b :5555 wsgi:app
+
+wsgi.py builds the app and calls warm(). With --preload that happens in
+the master, and the workers inherit the result copy-on-write: the imported
+modules, configured mappers, the compiled URL map and, per engine, the
+compiled SQL of the catalog reads. Without --preload each worker warms
+itself as it boots, still ahead of its first request.
+
+The statements run once against every engine (primary and replicas) and
+read at most a row each. The pools are disposed afterwards, so no database
+connection crosses the fork. A database that does not exist yet (before
+`flask db upgrade`) only skips the statements.
+"""
+import gc
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, configure_mappers
+
+from models import db
+from queries import (
+    DEFAULT_PAGE_SIZE, course_detail_statement, course_page_statement, enrollments_statement,
+    user_detail_statement, users_statement,
+)
+
+
+def warm_statements():
+    """The read statements behind the catalog routes, as the routes build them by default."""
+    return [
+        course_page_statement(0, DEFAULT_PAGE_SIZE),
+        course_detail_statement(1),
+        users_statement(),
+        user_detail_statement(1),
+        enrollments_statement(),
+    ]
+
+
+def compile_statements(engine, statements):
+    """Runs each statement for its first row, which fills the engine's compiled cache
+    (eager-loading queries included); returns how many entries that added."""
+    cache = engine._compiled_cache
+    before = len(cache) if cache is not None else 0
+    with Session(engine) as session:
+        for statement in statements:
+            result = session.execute(statement, execution_options={'yield_per': 1})
+            result.first()
+            result.close()
+    return (len(cache) if cache is not None else 0) - before
+
+
+def warm(app):
+    """Prepares app for forking; returns {bind key: compiled statements added}."""
+    configure_mappers()
+    app.url_map.update()
+    compiled = {}
+    with app.app_context():
+        for key, engine in db.engines.items():
+            try:
+                compiled[key] = compile_statements(engine, warm_statements())
+            except SQLAlchemyError as e:
+                app.logger.warning("Skipped warming statements on %s: %s", engine.url, e)
+            finally:
+                engine.dispose()
+    # Objects alive now are never freed; without this the collector would
+    # write to (and so copy) every inherited page on its first full pass.
+    gc.freeze()
+    return compiled
@@ -0,0 +1,155 @@
+"""Request parsing and SELECT statements shared by the WSGI and ASGI read paths.
+
+The statements carry every eager-loading option the compiled serializers
+need, so the results can be serialized without lazy loads. That keeps the
+query count fixed, and the async session cannot lazy-load anyway.
+"""
+import re
+from datetime import datetime
+from urllib.parse import urlencode
+
+from sqlalchemy import select
+from sqlalchemy.orm import load_only
+
+from cache import make_etag
+from models import User, Course, Enrollment
+from serializers import course_serializer, enrollment_serializer, user_serializer
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+COURSE_RELATIONSHIPS = ('enrollments', 'reviews', 'instructor')
+COURSE_FIELDS = Course.serializable_keys
+COURSE_RATING_FIELDS = ('rating_count', 'rating_average', 'rating_histogram')
+
+
+def parse_page_args(args):
+    """Reads ?after_id=&limit= and returns (after_id, limit), raising ValueError on bad input."""
+    try:
+        after_id = int(args.get('after_id', 0))
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("after_id and limit must be integers.")
+    if after_id < 0:
+        raise ValueError("after_id must not be negative.")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}.")
+    return after_id, limit
+
+
+def parse_course_fields(args):
+    """Reads ?fields=a,b,c; returns None when every field was requested."""
+    raw = args.get('fields')
+    if not raw:
+        return None
+    fields = tuple(dict.fromkeys(f.strip() for f in raw.split(',') if f.strip()))
+    unknown = [f for f in fields if f not in COURSE_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Valid fields are {list(COURSE_FIELDS)}.")
+    return fields
+
+
+IF_MATCH_ANY = '*'
+COURSE_ETAG = re.compile(r'(?:W/)?"?v?(\d+)(?:-[0-9a-f]+)?"?')
+
+
+def course_etag(version, body=None):
+    """The ETag of a course: its version, then a hash of the body when there is one.
+
+    The version is what If-Match compares, so an ETag from GET or PATCH can
+    be sent back as is. The hash changes with the reviews and enrollments in
+    the body, which do not bump the version, so If-None-Match stays exact.
+    """
+    return f'v{version}-{make_etag(body)}' if body is not None else f'v{version}'
+
+
+def parse_if_match(header):
+    """Reads the course version from If-Match (an ETag of the course, "3" or 3).
+
+    Returns None when absent, and IF_MATCH_ANY for "*", which only requires
+    the course to exist.
+    """
+    if header is None:
+        return None
+    tag = header.strip()
+    if tag == IF_MATCH_ANY:
+        return IF_MATCH_ANY
+    match = COURSE_ETAG.fullmatch(tag)
+    if not match:
+        raise ValueError("If-Match must be a single ETag or version of the course, such as \"v3\".")
+    return int(match.group(1))
+
+
+def parse_date_range(args):
+    """Reads ?since=&until= (ISO dates or datetimes) into a half-open range."""
+    bounds = []
+    for name in ('since', 'until'):
+        value = args.get(name)
+        if value:
+            try:
+                value = datetime.fromisoformat(value)
+            except ValueError:
+                raise ValueError(f"{name} must be an ISO date or datetime.")
+        bounds.append(value)
+    return tuple(bounds)
+
+
+def next_page_link(base_url, args, **updates):
+    """Builds a Link header value pointing at the next page."""
+    query = dict(args)
+    query.update(updates)
+    return f'<{base_url}?{urlencode(query)}>; rel="next"'
+
+
+def course_loader_options(fields=None):
+    """Eager-loading options covering everything the course serializer touches for the given fields.
+
+    Collections are fetched with one SELECT ... IN per relationship and the
+    instructor is joined, so a page of courses costs a fixed number of queries.
+    """
+    wanted = set(fields or COURSE_FIELDS)
+    if wanted.intersection(COURSE_RATING_FIELDS):
+        wanted.update(Course.RATING_COLUMNS)
+    columns = [getattr(Course, f) for f in wanted if f in Course.__table__.columns]
+    serializer = course_serializer.project(fields) if fields else course_serializer
+    return [load_only(Course.id, *columns)] + serializer.loader_options()
+
+
+def enrollment_filters(since=None, until=None):
+    filters = []
+    if since is not None:
+        filters.append(Enrollment.enrollment_date >= since)
+    if until is not None:
+        filters.append(Enrollment.enrollment_date < until)
+    return filters
+
+
+def course_page_statement(after_id, limit, fields=None):
+    return (
+        select(Course)
+        .options(*course_loader_options(fields))
+        .where(Course.id > after_id)
+        .order_by(Course.id)
+        .limit(limit)
+    )
+
+
+def course_detail_statement(course_id):
+    return select(Course).options(*course_loader_options()).where(Course.id == course_id)
+
+
+def users_statement():
+    return select(User).options(*user_serializer.loader_options()).order_by(User.id)
+
+
+def user_detail_statement(user_id):
+    return select(User).options(*user_serializer.loader_options()).where(User.id == user_id)
+
+
+def enrollments_statement(since=None, until=None):
+    return (
+        select(Enrollment)
+        .options(*enrollment_serializer.loader_options())
+        .where(*enrollment_filters(since, until))
+        .order_by(Enrollment.id)
+    )
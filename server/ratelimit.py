@@ -0,0 +1,190 @@
+"""Per-client rate limits and admission control for write requests.
+
+Both checks run as before_request hooks, ahead of any database work, and
+shed a request with a small JSON error:
+
+- Rate limits (RATE_LIMIT_ENABLED): token buckets per route and client. A
+  client is the logged-in user (session user_id) or else the remote
+  address. RATE_LIMITS maps 'METHOD /rule' (the Flask URL rule, e.g.
+  'POST /enrollments') to (rate per second, burst). RATE_LIMIT_DEFAULT,
+  if set, covers every other route. An empty bucket answers 429 with
+  Retry-After.
+- Admission control (ADMISSION_MAX_WRITES > 0): caps the write requests
+  in flight per process. The excess answers 503 with Retry-After, so a
+  burst of writes queueing on the SQLite writer cannot take every worker
+  thread from the catalog reads.
+
+Buckets live in process memory (a bounded LRU, so each worker limits on
+its own) or, with RATE_LIMIT_BACKEND = 'redis', in Redis, shared by every
+worker. Admission counts are always per process.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, g, jsonify, make_response, request, session
+
+from database import WRITE_METHODS
+
+KEY_PREFIX = 'coursify:ratelimit:'
+DEFAULT_RATE_LIMITS = {
+    'POST /enrollments': (5, 20),
+    'POST /reviews': (1, 10),
+    'POST /login': (1, 5),
+}
+
+
+class MemoryBuckets:
+    """Thread-safe token buckets, least recently used evicted first (an evicted bucket starts full)."""
+
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        """Takes one token; returns 0 if there was one, else the seconds until there will be."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class RedisBuckets:
+    """Token buckets in Redis hashes, updated atomically by a script on the server's clock."""
+
+    SCRIPT = """
+    local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(state[1]) or burst
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(now - updated, 0) * rate)
+    local wait = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        wait = (1 - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+    return tostring(wait)
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._take = client.register_script(self.SCRIPT)
+
+    @classmethod
+    def from_url(cls, url):
+        import redis
+        return cls(redis.Redis.from_url(url))
+
+    def take(self, key, rate, burst):
+        return float(self._take(keys=[key], args=[rate, burst]))
+
+
+class WriteAdmission:
+    """Counts the write requests in flight in this process, up to a limit."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self.count >= self.limit:
+                return False
+            self.count += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.count -= 1
+
+
+def client_identity():
+    user_id = session.get('user_id')
+    return f'user:{user_id}' if user_id is not None else f'ip:{request.remote_addr}'
+
+
+def route_limit(config, route):
+    """The (rate, burst) that limits a 'METHOD /rule' route, or None when it has no limit."""
+    if not config['RATE_LIMIT_ENABLED']:
+        return None
+    return config['RATE_LIMITS'].get(route) or config['RATE_LIMIT_DEFAULT']
+
+
+def _shed(status, message, retry_after):
+    response = make_response(jsonify({"errors": [message]}), status)
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+class RateLimiter:
+    """Flask extension; configure with RATE_LIMIT_* and ADMISSION_* settings and call init_app()."""
+
+    def init_app(self, app):
+        app.config.setdefault('RATE_LIMIT_ENABLED', False)
+        app.config.setdefault('RATE_LIMITS', DEFAULT_RATE_LIMITS)
+        app.config.setdefault('RATE_LIMIT_DEFAULT', None)
+        app.config.setdefault('RATE_LIMIT_BACKEND', 'memory')
+        app.config.setdefault('RATE_LIMIT_MAX_KEYS', 100_000)
+        app.config.setdefault('RATE_LIMIT_REDIS_URL', 'redis://localhost:6379/0')
+        app.config.setdefault('ADMISSION_MAX_WRITES', 0)
+
+        if app.config['RATE_LIMIT_ENABLED']:
+            backend = app.config['RATE_LIMIT_BACKEND']
+            if backend == 'memory':
+                backend = MemoryBuckets(app.config['RATE_LIMIT_MAX_KEYS'])
+            elif backend == 'redis':
+                backend = RedisBuckets.from_url(app.config['RATE_LIMIT_REDIS_URL'])
+            elif isinstance(backend, str):
+                raise ValueError(f"Unknown RATE_LIMIT_BACKEND {backend!r}.")
+            app.extensions['rate_limiter'] = backend
+            app.before_request(self._limit)
+
+        if app.config['ADMISSION_MAX_WRITES'] > 0:
+            app.extensions['admission'] = WriteAdmission(app.config['ADMISSION_MAX_WRITES'])
+            app.before_request(self._admit)
+            app.teardown_request(self._release)
+
+    def _limit(self):
+        if request.url_rule is None:
+            return None
+        route = f'{request.method} {request.url_rule.rule}'
+        limit = route_limit(current_app.config, route)
+        if limit is None:
+            return None
+        rate, burst = limit
+        wait = current_app.extensions['rate_limiter'].take(f'{KEY_PREFIX}{route}|{client_identity()}', rate, burst)
+        if wait:
+            return _shed(429, f"Too many requests; retry in {wait:.1f} seconds.", wait)
+        return None
+
+    def _admit(self):
+        if request.method not in WRITE_METHODS:
+            return None
+        if not current_app.extensions['admission'].acquire():
+            return _shed(503, "Too many writes in progress; retry shortly.", 1)
+        g.admitted_write = True
+        return None
+
+    def _release(self, exc=None):
+        if g.pop('admitted_write', False):
+            current_app.extensions['admission'].release()
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,255 @@
+"""Course recommendations from enrollment co-occurrence.
+
+`flask build-similarities` turns the enrollments table into a sparse
+user x course matrix, derives co-enrollment counts and the Jaccard index for
+every pair of courses sharing a student, and stores each course's
+SIMILARITIES_PER_COURSE best neighbours in course_similarities. New
+enrollments recount and rescore the pairs of the courses they touch, from
+the job queue (jobs.py) once their transaction has committed.
+
+Serving is a single query: the user's enrollments joined to their
+precomputed neighbours, each weighted by the rating the user gave the
+course it came from.
+"""
+from collections import Counter, defaultdict
+
+from sqlalchemy import delete, event, func, insert, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, aliased, object_session
+
+from jobs import defer, discard, handler
+from models import Course, CourseSimilarity, Enrollment, Review
+
+SIMILARITIES_PER_COURSE = 50
+DEFAULT_RECOMMENDATIONS = 10
+MAX_RECOMMENDATIONS = 50
+# Enrolled courses the user has not reviewed count as a middling rating.
+DEFAULT_RATING = 3
+MAX_RATING = 5
+WRITE_CHUNK_SIZE = 5000
+RECORD_ENROLLMENTS = 'record_enrollments'
+UPSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def build_similarities(connection, per_course=SIMILARITIES_PER_COURSE):
+    """Recomputes the whole course_similarities table; returns the number of rows written.
+
+    Memory grows with the number of co-enrolled course pairs, not with the
+    number of users.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    table = CourseSimilarity.__table__
+    connection.execute(table.delete())
+    # The rebuild counts every enrollment it can see, including those still queued.
+    discard(connection, RECORD_ENROLLMENTS)
+    enrollments = Enrollment.__table__
+    pairs = np.array(
+        connection.execute(select(enrollments.c.user_id, enrollments.c.course_id)).all(),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    if not len(pairs):
+        return 0
+
+    users, user_index = np.unique(pairs[:, 0], return_inverse=True)
+    courses, course_index = np.unique(pairs[:, 1], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.int32), (user_index, course_index)),
+        shape=(len(users), len(courses)),
+    )
+    sizes = np.asarray(matrix.sum(axis=0)).ravel()
+    co = (matrix.T @ matrix).tocoo()
+    off_diagonal = co.row != co.col
+    row, col, co_count = co.row[off_diagonal], co.col[off_diagonal], co.data[off_diagonal]
+    score = co_count / (sizes[row] + sizes[col] - co_count)
+
+    # Sort by course, best score first (ties to the lower course id), and rank
+    # each entry by its offset from the start of its course's run to keep the
+    # top neighbours. record_enrollments() trims in the same order.
+    order = np.lexsort((col, -score, row))
+    row, col, co_count, score = row[order], col[order], co_count[order], score[order]
+    keep = np.arange(len(row)) - np.searchsorted(row, row) < per_course
+
+    rows = [
+        {'course_id': a, 'similar_course_id': b, 'co_count': n, 'score': s}
+        for a, b, n, s in zip(
+            courses[row[keep]].tolist(), courses[col[keep]].tolist(),
+            co_count[keep].tolist(), score[keep].tolist(),
+        )
+    ]
+    for start in range(0, len(rows), WRITE_CHUNK_SIZE):
+        connection.execute(insert(table), rows[start:start + WRITE_CHUNK_SIZE])
+    return len(rows)
+
+
+def _in_chunks(connection, statement, column, values):
+    values = list(values)
+    for start in range(0, len(values), WRITE_CHUNK_SIZE):
+        yield from connection.execute(statement.where(column.in_(values[start:start + WRITE_CHUNK_SIZE])))
+
+
+def record_enrollments(connection, enrollment_ids, per_course=SIMILARITIES_PER_COURSE):
+    """Folds new enrollments, by id, into the stored similarities.
+
+    The touched pairs are the new course with each other course of the
+    same user. The new courses grew, so the stored pairs with one of them
+    change too. The co_count of all these pairs is recounted from the
+    enrollments table, which keeps it exact when enrollments are folded in
+    late, twice or after a delete, and every one of them is rescored. Each
+    course involved is then trimmed back to its per_course best neighbours.
+    A pair the cap left out stays out until it is touched or the next full
+    build, even if the new sizes would rank it higher. Databases without an
+    upsert here rely on the full build alone.
+    """
+    upsert = UPSERTS.get(connection.dialect.name)
+    if upsert is None or not enrollment_ids:
+        return
+
+    enrollments = Enrollment.__table__
+    columns = select(enrollments.c.user_id, enrollments.c.course_id)
+    new = list(_in_chunks(connection, columns, enrollments.c.id, set(enrollment_ids)))
+    if not new:
+        return
+    courses_by_user = defaultdict(set)
+    for user_id, course_id in _in_chunks(connection, columns, enrollments.c.user_id, {u for u, _ in new}):
+        courses_by_user[user_id].add(course_id)
+    grown = {course_id for _, course_id in new}
+    touched = {
+        pair
+        for user_id, course_id in new for other in courses_by_user[user_id] if other != course_id
+        for pair in ((course_id, other), (other, course_id))
+    }
+
+    table = CourseSimilarity.__table__
+    stored = select(table.c.course_id, table.c.similar_course_id)
+    pairs = set(touched)
+    for column in (table.c.course_id, table.c.similar_course_id):
+        pairs.update(tuple(pair) for pair in _in_chunks(connection, stored, column, grown))
+    if not pairs:
+        return
+    counted = {}
+    for a, b, n in _co_counts(connection, grown, {course_id for pair in pairs for course_id in pair}):
+        counted[a, b] = counted[b, a] = n
+    gone = [pair for pair in pairs if pair not in counted]  # their shared students have left
+    co_counts = {pair: counted[pair] for pair in pairs if pair in counted}
+
+    for start in range(0, len(gone), WRITE_CHUNK_SIZE):
+        connection.execute(delete(table).where(
+            tuple_(table.c.course_id, table.c.similar_course_id).in_(gone[start:start + WRITE_CHUNK_SIZE])
+        ))
+    if co_counts:
+        sizes = dict(_in_chunks(
+            connection,
+            select(enrollments.c.course_id, func.count()).group_by(enrollments.c.course_id),
+            enrollments.c.course_id, {course_id for pair in co_counts for course_id in pair},
+        ))
+        statement = upsert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.course_id, table.c.similar_course_id],
+            set_={'co_count': statement.excluded.co_count, 'score': statement.excluded.score},
+        )
+        connection.execute(statement, [
+            {'course_id': a, 'similar_course_id': b, 'co_count': n, 'score': n / (sizes[a] + sizes[b] - n)}
+            for (a, b), n in co_counts.items()
+        ])
+        _trim(connection, {a for a, _ in co_counts}, per_course)
+
+
+def _co_counts(connection, courses, others):
+    """(a, b, users enrolled in both) for each a in `courses` and b in `others` sharing a user."""
+    first, second = Enrollment.__table__.alias(), Enrollment.__table__.alias()
+    statement = (
+        select(first.c.course_id, second.c.course_id, func.count())
+        .join(second, second.c.user_id == first.c.user_id)
+        .where(second.c.course_id.in_(list(others)), second.c.course_id != first.c.course_id)
+        .group_by(first.c.course_id, second.c.course_id)
+    )
+    return _in_chunks(connection, statement, first.c.course_id, courses)
+
+
+def _trim(connection, course_ids, per_course):
+    """Deletes every neighbour of the courses past their per_course best, in build_similarities() order."""
+    table = CourseSimilarity.__table__
+    rank = func.row_number().over(
+        partition_by=table.c.course_id, order_by=(table.c.score.desc(), table.c.similar_course_id),
+    ).label('rank')
+    course_ids = list(course_ids)
+    for start in range(0, len(course_ids), WRITE_CHUNK_SIZE):
+        ranked = (
+            select(table.c.course_id, table.c.similar_course_id, rank)
+            .where(table.c.course_id.in_(course_ids[start:start + WRITE_CHUNK_SIZE]))
+            .subquery()
+        )
+        connection.execute(delete(table).where(
+            tuple_(table.c.course_id, table.c.similar_course_id).in_(
+                select(ranked.c.course_id, ranked.c.similar_course_id).where(ranked.c.rank > per_course)
+            )
+        ))
+
+
+def _merge_enrollment_ids(payloads):
+    return {'enrollment_ids': [id for payload in payloads for id in payload['enrollment_ids']]}
+
+
+@handler(RECORD_ENROLLMENTS, merge=_merge_enrollment_ids)
+def _record_enrollments_job(connection, payload):
+    record_enrollments(connection, payload['enrollment_ids'])
+
+
+def defer_record_enrollments(connection, enrollment_ids, session=None):
+    """Folds the enrollments in from the job queue once the caller commits (see jobs.defer())."""
+    if enrollment_ids:
+        defer(connection, RECORD_ENROLLMENTS, {'enrollment_ids': list(enrollment_ids)}, session)
+
+
+@event.listens_for(Enrollment, 'after_insert')
+def _enrollment_inserted(mapper, connection, target):
+    # A flush inserts its rows in batches before this fires for any of them,
+    # so the enrollments are deferred once per flush rather than row by row.
+    pending = object_session(target).info.setdefault('new_enrollments', {})
+    pending.setdefault(connection, []).append(target.id)
+
+
+@event.listens_for(Session, 'after_flush')
+def _flushed(session, flush_context):
+    for connection, enrollment_ids in session.info.pop('new_enrollments', {}).items():
+        defer_record_enrollments(connection, enrollment_ids, session)
+
+
+def recommendation_statement(user_id, limit):
+    enrolled = aliased(Enrollment)
+    own_rating = (
+        select(func.avg(Review.rating))
+        .where(Review.user_id == Enrollment.user_id, Review.course_id == Enrollment.course_id)
+        .correlate(Enrollment)
+        .scalar_subquery()
+    )
+    weight = func.coalesce(own_rating, DEFAULT_RATING) / float(MAX_RATING)
+    ranked = (
+        select(CourseSimilarity.similar_course_id.label('course_id'),
+               func.sum(CourseSimilarity.score * weight).label('score'))
+        .join(Enrollment, Enrollment.course_id == CourseSimilarity.course_id)
+        .where(
+            Enrollment.user_id == user_id,
+            CourseSimilarity.similar_course_id.not_in(
+                select(enrolled.course_id).where(enrolled.user_id == user_id)
+            ),
+        )
+        .group_by(CourseSimilarity.similar_course_id)
+        .subquery()
+    )
+    return (
+        select(*Course.summary_columns(), ranked.c.score)
+        .join(ranked, ranked.c.course_id == Course.id)
+        .order_by(ranked.c.score.desc(), Course.id)
+        .limit(limit)
+    )
+
+
+def recommend_courses(session, user_id, limit=DEFAULT_RECOMMENDATIONS):
+    """Returns up to `limit` courses the user is not enrolled in, best first."""
+    return [
+        {**Course.summary(row), 'score': round(row.score, 4)}
+        for row in session.execute(recommendation_statement(user_id, limit))
+    ]
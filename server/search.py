@@ -0,0 +1,114 @@
+"""Course search.
+
+On SQLite the search uses the FTS5 tables created by migration c41a7e95d2f3.
+Matches are ranked with bm25, with title hits weighted above description
+hits and review hits below both, and a highlighted snippet is returned. On
+other databases, or when the FTS tables are missing, it falls back to
+AND-ed LIKE filters ordered by title match.
+"""
+import re
+
+from sqlalchemy import case, inspect, or_, select, text
+
+from models import db, Course
+
+SNIPPET_TOKENS = 12
+MIN_PREFIX_LENGTH = 3
+REVIEW_RANK_WEIGHT = 0.5
+
+_fts_available = {}
+
+
+def query_terms(q):
+    """Splits user input into word tokens; punctuation and FTS operators are ignored."""
+    return re.findall(r'\w+', q or '')
+
+
+def fts_available():
+    engine = db.engine
+    if engine not in _fts_available:
+        _fts_available[engine] = (
+            engine.dialect.name == 'sqlite' and inspect(engine).has_table('courses_fts')
+        )
+    return _fts_available[engine]
+
+
+def _fts_match(terms):
+    # Quote every term and prefix-match the last one so partial words still
+    # hit; one- and two-letter prefixes would expand to most of the index.
+    quoted = [f'"{term}"' for term in terms]
+    if len(terms[-1]) >= MIN_PREFIX_LENGTH:
+        quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def _result(row, snippet=None, rank=None):
+    return {**Course.summary(row), 'rank': rank, 'snippet': snippet}
+
+
+FTS_COURSES = """
+    SELECT rowid AS course_id,
+           bm25(courses_fts, 10.0, 1.0) AS rank,
+           snippet(courses_fts, -1, '<mark>', '</mark>', '…', :tokens) AS snippet
+    FROM courses_fts WHERE courses_fts MATCH :match
+"""
+FTS_REVIEWS = """
+    SELECT reviews.course_id AS course_id,
+           bm25(reviews_fts) * :review_weight AS rank,
+           snippet(reviews_fts, 0, '<mark>', '</mark>', '…', :tokens) AS snippet
+    FROM reviews_fts JOIN reviews ON reviews.id = reviews_fts.rowid
+    WHERE reviews_fts MATCH :match
+"""
+
+
+def _search_fts(terms, limit, offset, include_reviews):
+    if include_reviews:
+        # LIMIT -1 keeps SQLite from flattening the union into the aggregate,
+        # where bm25() is not allowed. SQLite returns the snippet of the row
+        # holding MIN(rank) for each course.
+        ranked = text(f"""
+            SELECT course_id, MIN(rank) AS rank, snippet
+            FROM ({FTS_COURSES} UNION ALL {FTS_REVIEWS} LIMIT -1)
+            GROUP BY course_id ORDER BY rank LIMIT :limit OFFSET :offset
+        """)
+    else:
+        ranked = text(FTS_COURSES + ' ORDER BY rank LIMIT :limit OFFSET :offset')
+    matches = db.session.execute(ranked, {
+        'match': _fts_match(terms), 'tokens': SNIPPET_TOKENS, 'review_weight': REVIEW_RANK_WEIGHT,
+        'limit': limit, 'offset': offset,
+    }).all()
+    if not matches:
+        return []
+    courses = {
+        row.id: row
+        for row in db.session.execute(
+            select(*Course.summary_columns()).where(Course.id.in_([m.course_id for m in matches]))
+        )
+    }
+    return [
+        _result(courses[m.course_id], m.snippet, round(m.rank, 4))
+        for m in matches if m.course_id in courses
+    ]
+
+
+def _search_like(terms, limit, offset):
+    filters = []
+    for term in terms:
+        pattern = f'%{term}%'
+        filters.append(or_(Course.title.ilike(pattern), Course.description.ilike(pattern)))
+    title_hit = case((Course.title.ilike(f'%{terms[0]}%'), 0), else_=1)
+    rows = db.session.execute(
+        select(*Course.summary_columns()).where(*filters)
+        .order_by(title_hit, Course.id).limit(limit).offset(offset)
+    )
+    return [_result(row) for row in rows]
+
+
+def search_courses(q, limit, offset=0, include_reviews=False):
+    """Returns one page of matching courses, best match first."""
+    terms = query_terms(q)
+    if not terms:
+        raise ValueError("q must contain at least one word.")
+    if fts_available():
+        return _search_fts(terms, limit, offset, include_reviews)
+    return _search_like(terms, limit, offset)
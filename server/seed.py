@@ -1,19 +1,31 @@
 
 # server/seed.py
+import random
+from itertools import accumulate
 from random import choice as rc
-# We still need to import `app` here, as the provided seed structure expects it for `app.app_context()` if run directly.
-# The factory pattern in app.py makes this import safe now.
-from app import create_app # Import the factory function to get the app
-from models import db, User, Course, Enrollment, Review
+from models import (
+    db, User, Course, CourseDailyEnrollments, CourseSimilarity, DifficultyRatingStats, Enrollment,
+    LeaderboardEntry, OutboxJob, Review, StatsWatermark,
+)
+from recommendations import build_similarities
+from stats import refresh_stats
 from datetime import datetime, timedelta
 from werkzeug.security import generate_password_hash # For hashing passwords
 
+# Tables derived from the others; cleared with them and rebuilt by their own commands.
+# Queued jobs go too: they name rows by id, and the new rows reuse the ids.
+DERIVED_MODELS = (
+    CourseSimilarity, CourseDailyEnrollments, DifficultyRatingStats, StatsWatermark, LeaderboardEntry, OutboxJob,
+)
+
 # This function contains the actual data seeding logic
 def run_seed_data(current_app): # Accept the app instance to work with its context
     with current_app.app_context(): # Ensure all db operations are within the app's context
         print("Clearing existing data...")
         # Order of deletion matters due to foreign key constraints:
         # Delete dependent records (reviews, enrollments) before their parents (courses, users)
+        for model in DERIVED_MODELS:
+            db.session.execute(model.__table__.delete())
         Review.query.delete()
         Enrollment.query.delete()
         Course.query.delete()
@@ -67,8 +79,135 @@ def run_seed_data(current_app): # Accept the app instance to work with its conte
 
         print("Done seeding!")
 
+# Vocabulary for the synthetic catalog built by run_scaled_seed
+TOPICS = [
+    "Python", "JavaScript", "React", "Flask", "SQL", "Data Science", "Machine Learning", "DevOps",
+    "Docker", "Kubernetes", "Go", "Rust", "Security", "Cloud Computing", "Testing", "UX Design",
+    "Statistics", "Algorithms", "Networking", "Linux",
+]
+TITLE_FORMATS = [
+    "Introduction to", "Practical", "Advanced", "Mastering", "Hands-on", "Foundations of",
+    "Modern", "Applied", "Professional", "The Complete Guide to",
+]
+DIFFICULTIES = ["Beginner", "Intermediate", "Advanced"]
+DESCRIPTION_WORDS = (
+    "learn build deploy project hands-on fundamentals concepts practice real-world exercises "
+    "applications patterns performance debugging architecture design data api testing tools "
+    "workflow production scalable modern techniques examples students career skills quizzes "
+    "labs cases advanced beginner intermediate framework library systems web mobile cloud "
+    "security automation analysis models pipelines services databases queries optimization"
+).split()
+REVIEW_PHRASES = [
+    "Clear explanations and well paced lessons.", "The exercises were the best part.",
+    "Too much theory and not enough practice.", "Helped me land my first job in the field.",
+    "Some videos are outdated but the content holds up.", "Great instructor, very responsive.",
+    "Hard to follow in the later modules.", "Exactly what I needed to get started.",
+    "The projects felt close to real work.", "Would have liked more advanced material.",
+]
+SCALED_CHUNK_SIZE = 20_000
+
+
+def zipf_cum_weights(n, exponent=1.07):
+    """Cumulative weights for random.choices giving rank r a weight of 1 / r**exponent."""
+    return list(accumulate(1 / rank ** exponent for rank in range(1, n + 1)))
+
+
+def _flush(table, rows):
+    if rows:
+        db.session.execute(table.insert(), rows)
+        rows.clear()
+
+
+def run_scaled_seed(current_app, scale, seed=42):
+    """Replaces the data with `scale` students and a proportional synthetic catalog.
+
+    Course popularity and description words follow Zipf distributions, each
+    student takes about ten courses and roughly a third of enrollments get a
+    review. Rows go in through chunked executemany INSERTs, and every user
+    shares one password hash ("password"), so a few million rows load in
+    minutes rather than hours.
+    """
+    rng = random.Random(seed)
+    instructors = max(1, scale // 100)
+    course_count = max(5, scale // 50)
+    now = datetime.utcnow()
+
+    with current_app.app_context():
+        print("Clearing existing data...")
+        for model in (*DERIVED_MODELS, Review, Enrollment, Course, User):
+            db.session.execute(model.__table__.delete())
+        db.session.commit()
+
+        print(f"Seeding {instructors} instructors and {scale} students...")
+        password_hash = generate_password_hash("password")
+        users = []
+        for i in range(1, instructors + scale + 1):
+            role = "instructor" if i <= instructors else "student"
+            users.append({"username": f"user{i}", "email": f"user{i}@example.com",
+                          "password_hash": password_hash, "role": role})
+            if len(users) >= SCALED_CHUNK_SIZE:
+                _flush(User.__table__, users)
+        _flush(User.__table__, users)
+
+        print(f"Seeding {course_count} courses...")
+        word_weights = zipf_cum_weights(len(DESCRIPTION_WORDS))
+        courses = []
+        for i in range(1, course_count + 1):
+            topic = rng.choice(TOPICS)
+            words = rng.choices(DESCRIPTION_WORDS, cum_weights=word_weights, k=rng.randint(12, 40))
+            courses.append({
+                "title": f"{rng.choice(TITLE_FORMATS)} {topic} {i}",
+                "description": f"{topic}: " + " ".join(words) + ".",
+                "difficulty": rng.choice(DIFFICULTIES),
+                "duration_hours": rng.randint(2, 80),
+                "instructor_id": rng.randint(1, instructors),
+            })
+        _flush(Course.__table__, courses)
+
+        print("Seeding enrollments and reviews...")
+        # Popularity rank is shuffled so it does not follow course id order.
+        by_popularity = list(range(1, course_count + 1))
+        rng.shuffle(by_popularity)
+        popularity_weights = zipf_cum_weights(course_count)
+        quality = {course_id: rng.gauss(3.8, 0.6) for course_id in by_popularity}
+        enrollments, reviews = [], []
+        enrollment_total = review_total = 0
+        for user_id in range(instructors + 1, instructors + scale + 1):
+            wanted = min(course_count, 1 + int(rng.expovariate(1 / 9)))
+            for course_id in set(rng.choices(by_popularity, cum_weights=popularity_weights, k=wanted)):
+                enrollments.append({
+                    "user_id": user_id, "course_id": course_id,
+                    "enrollment_date": now - timedelta(days=min(730, rng.expovariate(1 / 120))),
+                })
+                if rng.random() < 0.3:
+                    rating = min(5, max(1, round(rng.gauss(quality[course_id], 1.0))))
+                    reviews.append({"user_id": user_id, "course_id": course_id, "rating": rating,
+                                    "text_content": rng.choice(REVIEW_PHRASES)})
+            if len(enrollments) >= SCALED_CHUNK_SIZE:
+                enrollment_total += len(enrollments)
+                review_total += len(reviews)
+                _flush(Enrollment.__table__, enrollments)
+                _flush(Review.__table__, reviews)
+        enrollment_total += len(enrollments)
+        review_total += len(reviews)
+        _flush(Enrollment.__table__, enrollments)
+        _flush(Review.__table__, reviews)
+        print(f"Seeded {enrollment_total} enrollments and {review_total} reviews.")
+
+        # Core inserts skip the mapper events, so derive the aggregates in bulk.
+        print("Rebuilding rating aggregates, course similarities and statistics...")
+        connection = db.session.connection()
+        Course.rebuild_rating_aggregates(connection)
+        build_similarities(connection)
+        refresh_stats(connection, full=True)
+        db.session.commit()
+
+        print("Done seeding!")
+
 # This block is executed if seed.py is run directly (e.g., `python seed.py`)
 if __name__ == '__main__':
     # When run directly, we need to explicitly create the app instance and run seed_data within its context.
+    # Imported here so that `flask seed`, which imports this module, does not build a second app.
+    from app import create_app
     app_instance_for_seed = create_app() # Call the factory function
     run_seed_data(app_instance_for_seed) # Pass the created app instance
\ No newline at end of file
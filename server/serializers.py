@@ -0,0 +1,187 @@
+"""Compiled serializers for the hot read endpoints.
+
+SerializerMixin.to_dict() re-parses every model's serialize_rules and walks
+the relationship graph on each call. The rules only depend on the model class
+and the path taken to reach it, so we resolve them once here, using the same
+sqlalchemy_serializer Schema tree, into a flat plan of (key, getter) pairs per
+model and path. The plans produce the same dicts as to_dict() with the default
+options the models use.
+"""
+from functools import lru_cache
+from types import SimpleNamespace
+
+from sqlalchemy import Date, DateTime, inspect
+from sqlalchemy.orm import configure_mappers, joinedload, selectinload
+from sqlalchemy_serializer.lib.schema import Schema
+
+from instrumentation import serialization_timer
+from models import User, Course, Enrollment, Review
+
+MAX_DEPTH = 8
+
+
+def _identity(value):
+    return value
+
+
+def _declared_keys(model):
+    # sqlalchemy-serializer 1.6 declares serializable_keys as a class tuple; 1.4,
+    # the last release for Python 3.8, as an instance property. Only a model's
+    # own tuple (Course's) narrows the keys.
+    keys = model.serializable_keys
+    return keys if isinstance(keys, (tuple, list, set, frozenset)) else ()
+
+
+def _column_converter(model, column):
+    python_type = column.type
+    if isinstance(python_type, DateTime):
+        fmt = model.datetime_format
+        return lambda value: None if value is None else value.strftime(fmt)
+    if isinstance(python_type, Date):
+        fmt = model.date_format
+        return lambda value: None if value is None else value.strftime(fmt)
+    return _identity
+
+
+class CompiledSerializer:
+    """Serializes instances of one model along one path of the relationship graph."""
+
+    def __init__(self, model, columns, properties, relationships):
+        self.model = model
+        self.columns = columns              # [(key, converter)]
+        self.properties = properties        # [key]
+        self.relationships = relationships  # [(key, uselist, CompiledSerializer)]
+        self.keys = tuple(sorted(
+            [k for k, _ in columns] + list(properties) + [k for k, _, _ in relationships]
+        ))
+        self._row_view = None
+
+    def __call__(self, obj, only=None):
+        serialize = self.project(tuple(only)) if only else self
+        with serialization_timer():
+            return serialize._serialize(obj)
+
+    def many(self, objs, only=None):
+        serialize = self.project(tuple(only)) if only else self
+        with serialization_timer():
+            return [serialize._serialize(obj) for obj in objs]
+
+    def _serialize(self, obj):
+        if obj is None:
+            return None
+        data = {key: convert(getattr(obj, key)) for key, convert in self.columns}
+        for key in self.properties:
+            data[key] = getattr(obj, key)
+        for key, uselist, child in self.relationships:
+            value = getattr(obj, key)
+            data[key] = [child._serialize(item) for item in value] if uselist else child._serialize(value)
+        return data
+
+    @lru_cache(maxsize=64)
+    def project(self, only):
+        """Returns a serializer restricted to the given top-level keys."""
+        wanted = set(only)
+        return CompiledSerializer(
+            self.model,
+            [(k, c) for k, c in self.columns if k in wanted],
+            [k for k in self.properties if k in wanted],
+            [(k, u, s) for k, u, s in self.relationships if k in wanted],
+        )
+
+    def loader_options(self):
+        """Eager-loading options for exactly the relationships this serializer walks.
+
+        Collections use selectinload and many-to-ones use joinedload, so
+        serializing a whole page costs one query per collection level.
+        """
+        options = []
+        for key, uselist, child in self.relationships:
+            attribute = getattr(self.model, key)
+            loader = selectinload(attribute) if uselist else joinedload(attribute)
+            child_options = child.loader_options()
+            options.append(loader.options(*child_options) if child_options else loader)
+        return options
+
+    # Column-only queries -------------------------------------------------
+
+    def row_columns(self):
+        """Columns to select so that from_row() can rebuild this dict from a Row.
+
+        Every table column of the model is selected (properties may need
+        columns that are not serialized themselves), followed by the columns
+        of each many-to-one child in order. Collections cannot come from a
+        single row and are rejected.
+        """
+        columns = [getattr(self.model, c.key) for c in self.model.__mapper__.column_attrs]
+        for key, uselist, child in self.relationships:
+            if uselist:
+                raise ValueError(f"{self.model.__name__}.{key} is a collection and cannot be read from a row.")
+            columns.extend(child.row_columns())
+        return columns
+
+    def from_row(self, row):
+        return self._from_values(iter(row))
+
+    def _from_values(self, values):
+        attrs = {c.key: next(values) for c in self.model.__mapper__.column_attrs}
+        children = [(key, child._from_values(values)) for key, _, child in self.relationships]
+        if all(value is None for value in attrs.values()):
+            return None  # outer join found no row
+        data = {key: convert(attrs[key]) for key, convert in self.columns}
+        if self.properties:
+            view = self._view(attrs)
+            for key in self.properties:
+                data[key] = getattr(view, key)
+        data.update(children)
+        return data
+
+    def _view(self, attrs):
+        # Properties are evaluated against a plain object carrying the row's
+        # column values, falling back to the model class for constants.
+        if self._row_view is None:
+            model = self.model
+            namespace = {
+                name: member for name, member in vars(model).items() if isinstance(member, property)
+            }
+            namespace['__getattr__'] = lambda view, name: getattr(model, name)
+            self._row_view = type(f'{model.__name__}RowView', (SimpleNamespace,), namespace)
+        return self._row_view(**attrs)
+
+
+def compile_serializer(model, only=(), rules=(), schema=None, depth=0):
+    """Resolves model.serialize_rules (plus only/rules, as in to_dict) into a CompiledSerializer."""
+    if depth > MAX_DEPTH:
+        raise RecursionError(f"Serialization rules for {model.__name__} recurse deeper than {MAX_DEPTH} levels.")
+    if schema is None:
+        configure_mappers()
+        schema = Schema()
+        schema.update(only=only, extend=rules)
+    schema.update(only=model.serialize_only, extend=model.serialize_rules)
+
+    mapper = inspect(model)
+    keys = schema.keys
+    if schema.is_greedy:
+        keys.update(_declared_keys(model) or [attr.key for attr in mapper.attrs])
+
+    columns, properties, relationships = [], [], []
+    for key in sorted(keys):
+        if not schema.is_included(key):
+            continue
+        if key in mapper.relationships:
+            relationship = mapper.relationships[key]
+            child = compile_serializer(
+                relationship.mapper.class_, schema=schema.fork(key), depth=depth + 1
+            )
+            relationships.append((key, relationship.uselist, child))
+        elif key in mapper.column_attrs:
+            column = mapper.column_attrs[key].columns[0]
+            columns.append((key, _column_converter(model, column)))
+        else:
+            properties.append(key)
+    return CompiledSerializer(model, columns, properties, relationships)
+
+
+user_serializer = compile_serializer(User)
+course_serializer = compile_serializer(Course)
+enrollment_serializer = compile_serializer(Enrollment)
+review_serializer = compile_serializer(Review)
@@ -0,0 +1,283 @@
+"""Materialized course statistics and leaderboards.
+
+Two rollups are folded forward from a high-water mark on their source
+table's id, so a refresh only reads rows added since the last one:
+
+- course_daily_enrollments: enrollments per course per enrollment day
+- difficulty_rating_stats: review count and rating sum per course difficulty
+
+Each refresh then recomputes the leaderboards from the rollups into
+leaderboard_entries, at most LEADERBOARD_SIZE rows per board. The endpoints
+read one board with a primary-key range scan.
+
+- popular: enrollments over the last POPULAR_DAYS days, up to today (UTC)
+- top-rated:<difficulty>: a Bayesian average. Each course's ratings are
+  pulled towards its difficulty's mean by RATING_PRIOR_WEIGHT pseudo-ratings,
+  so a single 5-star review does not top the board.
+
+The marks only see new rows. A full refresh (`flask refresh-stats --full`)
+corrects for deleted enrollments and reviews, edited ratings and courses
+that change difficulty. Every refresh moves each mark with a
+compare-and-set before touching the rollups (a mark's first refresh
+creates it instead). That makes concurrent refreshes, such as the
+schedulers of several workers, take turns, and a refresh that lost a race,
+including the race to create a mark, raises RefreshConflict. On
+PostgreSQL, ids can commit out of order. A row committed after a later id was folded in is
+skipped until the next full refresh.
+
+With STATS_REFRESH_INTERVAL set, each app process also refreshes in a
+background thread, started by its first request.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, func, insert, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+
+from database import begin_write
+from models import (
+    db, Course, CourseDailyEnrollments, DifficultyRatingStats, Enrollment, LeaderboardEntry, Review,
+    StatsWatermark,
+)
+
+LEADERBOARD_SIZE = 50
+DEFAULT_LEADERBOARD_LIMIT = 10
+POPULAR_DAYS = 7
+RATING_PRIOR_WEIGHT = 5
+KEY_CHUNK_SIZE = 500
+POPULAR_BOARD = 'popular'
+BOARD_COLUMNS = (
+    LeaderboardEntry.rank, LeaderboardEntry.course_id, LeaderboardEntry.title,
+    LeaderboardEntry.difficulty, LeaderboardEntry.score, LeaderboardEntry.count,
+)
+
+
+class RefreshConflict(Exception):
+    """Another refresh moved a high-water mark while this one was running."""
+
+
+def top_rated_board(difficulty):
+    return f'top-rated:{difficulty}'
+
+
+def _advance(connection, name, id_column):
+    """Moves the named mark to the newest id; returns the (after, upto] id range to fold."""
+    marks = StatsWatermark.__table__
+    after = connection.execute(select(marks.c.last_id).where(marks.c.name == name)).scalar()
+    upto = connection.execute(select(func.max(id_column))).scalar() or 0
+    if after is None:
+        try:
+            connection.execute(insert(marks).values(name=name, last_id=upto))
+        except IntegrityError:
+            raise RefreshConflict(f"The {name} mark was created during the refresh.") from None
+        return 0, upto
+    # Runs even when nothing is new, so that concurrent refreshes queue on the row.
+    moved = connection.execute(
+        update(marks).where(marks.c.name == name, marks.c.last_id == after).values(last_id=upto)
+    ).rowcount
+    if not moved:
+        raise RefreshConflict(f"The {name} mark moved during the refresh.")
+    return after, upto
+
+
+def _increment(connection, table, key_names, deltas):
+    """Adds `deltas` ({key tuple: {column: delta}}) to the rollup rows, creating the missing ones."""
+    if not deltas:
+        return
+    key_columns = [table.c[name] for name in key_names]
+    keys = list(deltas)
+    existing = set()
+    for start in range(0, len(keys), KEY_CHUNK_SIZE):
+        existing.update(tuple(row) for row in connection.execute(
+            select(*key_columns).where(tuple_(*key_columns).in_(keys[start:start + KEY_CHUNK_SIZE]))
+        ))
+    value_names = list(next(iter(deltas.values())))
+    updates = [
+        {**{f'k_{name}': value for name, value in zip(key_names, key)},
+         **{f'd_{name}': value for name, value in deltas[key].items()}}
+        for key in keys if key in existing
+    ]
+    if updates:
+        connection.execute(
+            update(table)
+            .where(*(table.c[name] == bindparam(f'k_{name}') for name in key_names))
+            .values({name: table.c[name] + bindparam(f'd_{name}') for name in value_names}),
+            updates,
+        )
+    inserts = [{**dict(zip(key_names, key)), **deltas[key]} for key in keys if key not in existing]
+    if inserts:
+        connection.execute(insert(table), inserts)
+
+
+def _fold_enrollments(connection, after, upto):
+    enrollments = Enrollment.__table__
+    day = func.date(enrollments.c.enrollment_date, type_=db.Date)
+    rows = connection.execute(
+        select(enrollments.c.course_id, day, func.count())
+        .where(enrollments.c.id > after, enrollments.c.id <= upto)
+        .group_by(enrollments.c.course_id, day)
+    )
+    _increment(connection, CourseDailyEnrollments.__table__, ('course_id', 'day'), {
+        (course_id, day): {'enrollments': count} for course_id, day, count in rows
+    })
+
+
+def _fold_reviews(connection, after, upto):
+    reviews, courses = Review.__table__, Course.__table__
+    rows = connection.execute(
+        select(courses.c.difficulty, func.count(), func.sum(reviews.c.rating))
+        .select_from(reviews.join(courses, courses.c.id == reviews.c.course_id))
+        .where(reviews.c.id > after, reviews.c.id <= upto)
+        .group_by(courses.c.difficulty)
+    )
+    _increment(connection, DifficultyRatingStats.__table__, ('difficulty',), {
+        (difficulty,): {'rating_count': count, 'rating_sum': total} for difficulty, count, total in rows
+    })
+
+
+def _popular_entries(connection, today):
+    daily, courses = CourseDailyEnrollments.__table__, Course.__table__
+    total = func.sum(daily.c.enrollments).label('total')
+    ranked = (
+        select(daily.c.course_id, total)
+        .where(daily.c.day > today - timedelta(days=POPULAR_DAYS), daily.c.day <= today)
+        .group_by(daily.c.course_id)
+        .order_by(total.desc(), daily.c.course_id)
+        .limit(LEADERBOARD_SIZE)
+        .subquery()
+    )
+    rows = connection.execute(
+        select(ranked.c.course_id, courses.c.title, courses.c.difficulty, ranked.c.total)
+        .join(courses, courses.c.id == ranked.c.course_id)
+        .order_by(ranked.c.total.desc(), ranked.c.course_id)
+    )
+    return [
+        {'course_id': course_id, 'title': title, 'difficulty': difficulty, 'score': total, 'count': total}
+        for course_id, title, difficulty, total in rows
+    ]
+
+
+def _top_rated_entries(connection, difficulty, rating_count, rating_sum):
+    courses = Course.__table__
+    prior = RATING_PRIOR_WEIGHT * rating_sum / rating_count
+    score = ((prior + courses.c.rating_sum) / (RATING_PRIOR_WEIGHT + courses.c.rating_count)).label('score')
+    rows = connection.execute(
+        select(courses.c.id, courses.c.title, score, courses.c.rating_count)
+        .where(courses.c.difficulty == difficulty, courses.c.rating_count > 0)
+        .order_by(score.desc(), courses.c.id)
+        .limit(LEADERBOARD_SIZE)
+    )
+    return [
+        {'course_id': course_id, 'title': title, 'difficulty': difficulty, 'score': score, 'count': count}
+        for course_id, title, score, count in rows
+    ]
+
+
+def _rebuild_leaderboards(connection, today):
+    boards = {POPULAR_BOARD: _popular_entries(connection, today)}
+    difficulty_stats = connection.execute(select(
+        DifficultyRatingStats.difficulty, DifficultyRatingStats.rating_count, DifficultyRatingStats.rating_sum,
+    )).all()
+    for difficulty, rating_count, rating_sum in difficulty_stats:
+        if rating_count > 0:
+            boards[top_rated_board(difficulty)] = _top_rated_entries(connection, difficulty, rating_count, rating_sum)
+
+    entries = LeaderboardEntry.__table__
+    connection.execute(entries.delete())
+    rows = [
+        {'board': board, 'rank': rank, **entry}
+        for board, board_entries in boards.items()
+        for rank, entry in enumerate(board_entries, 1)
+    ]
+    if rows:
+        connection.execute(insert(entries), rows)
+
+
+def refresh_stats(connection, full=False, today=None):
+    """Folds new enrollments and reviews into the rollups and rebuilds the leaderboards.
+
+    Best run as the first work of its own transaction, which on SQLite then
+    takes the write lock up front. Returns the number of new source rows per
+    rollup. With full=True the rollups are rebuilt from
+    scratch.
+    """
+    begin_write(connection)
+    if full:
+        for model in (CourseDailyEnrollments, DifficultyRatingStats):
+            connection.execute(model.__table__.delete())
+        connection.execute(update(StatsWatermark.__table__).values(last_id=0))
+
+    folded = {}
+    for name, source, fold in (
+        ('enrollments', Enrollment, _fold_enrollments),
+        ('reviews', Review, _fold_reviews),
+    ):
+        after, upto = _advance(connection, name, source.__table__.c.id)
+        fold(connection, after, upto)
+        folded[name] = upto - after
+    _rebuild_leaderboards(connection, today or datetime.utcnow().date())
+    return folded
+
+
+def leaderboard(session, board, limit=DEFAULT_LEADERBOARD_LIMIT):
+    rows = session.execute(
+        select(*BOARD_COLUMNS).where(LeaderboardEntry.board == board).order_by(LeaderboardEntry.rank).limit(limit)
+    )
+    return [row._asdict() for row in rows]
+
+
+def popular_courses(session, limit=DEFAULT_LEADERBOARD_LIMIT):
+    return [
+        {'rank': row['rank'], 'course_id': row['course_id'], 'title': row['title'],
+         'difficulty': row['difficulty'], 'enrollments': row['count']}
+        for row in leaderboard(session, POPULAR_BOARD, limit)
+    ]
+
+
+def top_rated_courses(session, difficulty, limit=DEFAULT_LEADERBOARD_LIMIT):
+    return [
+        {'rank': row['rank'], 'course_id': row['course_id'], 'title': row['title'],
+         'difficulty': row['difficulty'], 'score': round(row['score'], 3), 'rating_count': row['count']}
+        for row in leaderboard(session, top_rated_board(difficulty), limit)
+    ]
+
+
+class StatsRefresher:
+    """Flask extension; set STATS_REFRESH_INTERVAL (seconds) to refresh in the background."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = set()  # (app, pid) pairs with a running thread
+
+    def init_app(self, app):
+        app.config.setdefault('STATS_REFRESH_INTERVAL', 0)
+        if app.config['STATS_REFRESH_INTERVAL'] > 0:
+            app.before_request(lambda: self._ensure_started(app))
+
+    def _ensure_started(self, app):
+        # A thread does not survive fork(), so each server worker starts its own.
+        key = (id(app), os.getpid())
+        if key in self._started:
+            return
+        with self._lock:
+            if key not in self._started:
+                self._started.add(key)
+                threading.Thread(target=self._run, args=(app,), name='stats-refresh', daemon=True).start()
+
+    def _run(self, app):
+        interval = app.config['STATS_REFRESH_INTERVAL']
+        while True:
+            started = time.monotonic()
+            try:
+                with app.app_context(), db.engine.begin() as connection:
+                    refresh_stats(connection)
+            except RefreshConflict:
+                pass  # another worker refreshed in the meantime
+            except Exception:
+                app.logger.exception("Statistics refresh failed.")
+            time.sleep(max(interval - (time.monotonic() - started), 0))
+
+
+stats_refresher = StatsRefresher()
@@ -0,0 +1,155 @@
+"""Incremental sync: the course, review and enrollment changes since a client's token.
+
+    GET /sync[?since=<token>][&include=courses,reviews,enrollments][&fields=id,title,...]
+
+Every synced table has an updated_at column, set on insert and on every
+update, and indexed together with the id. Each stream is read as a keyset
+range scan past its cursor, the (updated_at, id) of the last change the
+client has. Deletes leave a row in tombstones (see models.py), which is
+scanned the same way. The token is an opaque, URL-safe encoding of these
+cursors.
+
+The timestamps are taken when a row is written, before its transaction
+commits. So a slow transaction can commit rows stamped earlier than rows a
+client has already been sent. For that reason a cursor never moves past
+now - SYNC_SETTLE_SECONDS, which must exceed the longest write transaction,
+including its wait for the SQLite write lock. Newer changes are still
+sent, and sent again by the next call; past the first SYNC_PAGE_SIZE of
+them they wait until they settle. Clients upsert by id, so a repeated row
+does no harm. It does cost bandwidth: every call re-sends whatever changed
+in the last SYNC_SETTLE_SECONDS, about that many seconds' worth of writes.
+Bulk rewrites stamp every row they touch, so they keep unchanged rows as
+they are (see Course.rebuild_rating_aggregates). A client applies a
+response's deletions before its rows.
+
+A stream sends at most SYNC_PAGE_SIZE changes. `more` asks the client to
+call again with the new token at once. Without a token every row is sent
+and no deletions, since a new client has nothing to delete. Tombstones
+older than SYNC_TOMBSTONE_DAYS are pruned by `flask prune-tombstones`. A
+token that old gets SyncTokenExpired (410), and the client starts over.
+"""
+import base64
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select, tuple_
+
+from models import Course, Enrollment, Review, Tombstone
+from queries import COURSE_FIELDS, COURSE_RELATIONSHIPS, parse_course_fields
+from serializers import course_serializer, enrollment_serializer, review_serializer
+
+SYNC_COURSE_FIELDS = tuple(f for f in COURSE_FIELDS if f not in COURSE_RELATIONSHIPS)
+STREAMS = {
+    'courses': (Course, None),
+    'reviews': (Review, review_serializer.project(('id', 'text_content', 'rating', 'user_id', 'course_id'))),
+    'enrollments': (Enrollment, enrollment_serializer.project(('id', 'user_id', 'course_id', 'enrollment_date'))),
+}
+DELETED = 'deleted'
+START = (datetime.min, 0)
+
+
+class SyncTokenError(ValueError):
+    """The since token cannot be read, or was issued for other streams."""
+
+
+class SyncTokenExpired(SyncTokenError):
+    """The token is older than the tombstones kept; the client must sync from scratch."""
+
+
+def parse_sync_args(args):
+    """Reads ?include= and ?fields=; returns (streams, course fields), raising ValueError on bad input."""
+    raw = args.get('include')
+    include = tuple(dict.fromkeys(s.strip() for s in raw.split(',') if s.strip())) if raw else tuple(STREAMS)
+    unknown = [s for s in include if s not in STREAMS]
+    if unknown or not include:
+        raise ValueError(f"include must list some of {list(STREAMS)}.")
+    fields = parse_course_fields(args) or SYNC_COURSE_FIELDS
+    nested = [f for f in fields if f in COURSE_RELATIONSHIPS]
+    if nested:
+        raise ValueError(f"Sync sends flat courses; {', '.join(nested)} cannot be synced as course fields.")
+    return include, fields
+
+
+def encode_token(cursors):
+    data = {name: [stamp.isoformat(), id] for name, (stamp, id) in cursors.items()}
+    return base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_token(token, include):
+    """Returns the cursors in `token`, which must have been issued for the same streams."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        cursors = {name: (datetime.fromisoformat(stamp), int(id)) for name, (stamp, id) in data.items()}
+    except (ValueError, TypeError, AttributeError):
+        raise SyncTokenError("since is not a valid sync token.")
+    if set(cursors) != {*include, DELETED}:
+        raise SyncTokenError(f"since was issued for include={','.join(n for n in cursors if n != DELETED)}.")
+    return cursors
+
+
+def _scan(session, columns, stamp, id, cursor, horizon, limit, *criteria):
+    """One page of rows past `cursor` in (stamp, id) order; returns (rows, new cursor, more)."""
+    rows = session.execute(
+        select(*columns)
+        .where(tuple_(stamp, id) > cursor, *criteria)
+        .order_by(stamp, id)
+        .limit(limit + 1)
+    ).all()
+    page = rows[:limit]
+    if len(rows) > limit and page[-1][-1] <= horizon:
+        return page, (page[-1][-1], page[-1][-2]), True
+    # Everything settled has been read; newer rows are sent, but read again next time.
+    return page, max(cursor, (horizon, 0)), False
+
+
+def sync_changes(session, token, include, fields, page_size, settle_seconds, tombstone_days):
+    """Returns the GET /sync body: one list per stream, the deleted ids, the next token and `more`."""
+    now = datetime.utcnow()
+    horizon = now - timedelta(seconds=settle_seconds)
+    if token:
+        cursors = decode_token(token, include)
+        if cursors[DELETED][0] < now - timedelta(days=tombstone_days):
+            raise SyncTokenExpired("The sync token has expired; sync again without since.")
+    else:
+        cursors = {name: START for name in include}
+        cursors[DELETED] = (horizon, 0)
+
+    body, more = {}, False
+    for name in include:
+        model, serializer = STREAMS[name]
+        serializer = serializer or course_serializer.project(fields)
+        # The cursor columns go last, after the ones from_row() reads.
+        columns = [*serializer.row_columns(), model.id, model.updated_at]
+        rows, cursors[name], stream_more = _scan(
+            session, columns, model.updated_at, model.id, cursors[name], horizon, page_size
+        )
+        body[name] = [serializer.from_row(row) for row in rows]
+        more = more or stream_more
+
+    tombstones, cursors[DELETED], deleted_more = _scan(
+        session, [Tombstone.entity, Tombstone.entity_id, Tombstone.id, Tombstone.deleted_at],
+        Tombstone.deleted_at, Tombstone.id, cursors[DELETED], horizon, page_size, Tombstone.entity.in_(include),
+    )
+    body[DELETED] = _deleted_ids(session, tombstones, include)
+    body['next'] = encode_token(cursors)
+    body['more'] = more or deleted_more
+    return body
+
+
+def _deleted_ids(session, tombstones, include):
+    deleted = {name: [] for name in include}
+    for entity, entity_id, _, _ in tombstones:
+        deleted[entity].append(entity_id)
+    for name, ids in deleted.items():
+        if ids:
+            # SQLite reuses the highest ids; a row that exists again is sent as a change instead.
+            model = STREAMS[name][0]
+            existing = set(session.scalars(select(model.id).where(model.id.in_(ids))))
+            deleted[name] = list(dict.fromkeys(id for id in ids if id not in existing))
+    return deleted
+
+
+def prune_tombstones(connection, tombstone_days):
+    """Deletes tombstones older than the tokens GET /sync still accepts; returns how many."""
+    cutoff = datetime.utcnow() - timedelta(days=tombstone_days)
+    return connection.execute(delete(Tombstone.__table__).where(Tombstone.deleted_at < cutoff)).rowcount
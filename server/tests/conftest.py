@@ -0,0 +1,20 @@
+import pytest
+
+from benchmarks.common import make_app, populate
+
+
+@pytest.fixture
+def app():
+    """App on a fresh in-memory database with a small synthetic catalog.
+
+    The response cache is off, so every request reaches the database.
+    """
+    app = make_app(config={'RESPONSE_CACHE_ENABLED': False})
+    with app.app_context():
+        populate(courses=50, students=100, enrollments_per_course=10, reviews_per_course=3)
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
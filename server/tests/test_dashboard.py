@@ -0,0 +1,25 @@
+"""GET /users/<id>/dashboard stays within its latency and query budgets at 10k enrollments."""
+from benchmarks.common import make_app
+from benchmarks.dashboard import BUDGET_MS, QUERY_BUDGET, enrolled_student, timed
+from benchmarks.load_test import percentile
+from instrumentation import query_budget
+
+ENROLLMENTS = 10_000
+
+
+def test_dashboard_budget():
+    app = make_app()
+    with app.app_context():
+        student, reviewed = enrolled_student(ENROLLMENTS)
+    client = app.test_client()
+    url = f'/users/{student}/dashboard'
+
+    with query_budget(QUERY_BUDGET, app):
+        response = client.get(url)
+    assert response.status_code == 200
+    summary = response.get_json()['summary']
+    assert summary['enrollments'] == ENROLLMENTS
+    assert summary['reviewed'] == len(reviewed)
+
+    p95 = percentile(timed(20, lambda: client.get(url).get_data()), 0.95) * 1000
+    assert p95 <= BUDGET_MS, f"dashboard p95 {p95:.1f}ms is over the {BUDGET_MS:g}ms budget"
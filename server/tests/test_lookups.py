@@ -0,0 +1,122 @@
+"""The lookup cache never lets a write through for a user or course that is gone, or a demoted instructor."""
+import time
+
+import pytest
+from sqlalchemy import select, text, update
+
+from lookups import LookupCache
+from models import db, Course, Enrollment, User
+
+INSTRUCTOR_ID = 1
+STUDENT_ID = 105
+
+
+def enroll(client, course_id, user_id=STUDENT_ID):
+    return client.post('/enrollments', json={
+        'user_id': user_id, 'course_id': course_id, 'enrollment_date': '2024-01-15 10:00:00',
+    })
+
+
+def create_course(client, instructor_id=INSTRUCTOR_ID, title='Lookup cache course'):
+    return client.post('/courses', json={
+        'title': title, 'description': 'A course created by the lookup cache tests.',
+        'difficulty': 'Beginner', 'duration_hours': 3, 'instructor_id': instructor_id,
+    })
+
+
+@pytest.fixture
+def courses(app):
+    """Two courses the student is not enrolled in, owned by an instructor other than INSTRUCTOR_ID."""
+    with app.app_context():
+        enrolled = select(Enrollment.course_id).where(Enrollment.user_id == STUDENT_ID)
+        return db.session.scalars(
+            select(Course.id).where(Course.id.not_in(enrolled), Course.instructor_id != INSTRUCTOR_ID).limit(2)
+        ).all()
+
+
+def test_enroll_after_course_delete(client, courses):
+    first, second = courses
+    assert enroll(client, first).status_code == 201  # caches both ids
+    assert client.delete(f'/courses/{second}').status_code == 204
+    response = enroll(client, second)
+    assert response.status_code == 404
+    assert response.get_json() == {"errors": ["Course not found"]}
+
+
+def test_enroll_after_course_deleted_elsewhere(app, client, courses):
+    """A delete by another worker leaves a cached id behind; the foreign key still turns it into a 404."""
+    first, second = courses
+    assert enroll(client, first).status_code == 201
+    assert client.get(f'/courses/{second}').status_code == 200
+    assert enroll(client, second, user_id=STUDENT_ID - 1).status_code in (201, 409)  # caches the course
+    with app.app_context():
+        db.session.execute(text('DELETE FROM courses WHERE id = :id'), {'id': second})
+        db.session.commit()
+    response = enroll(client, second)
+    assert response.status_code == 404
+    assert response.get_json() == {"errors": ["Course not found"]}
+
+
+def test_enroll_after_user_delete(app, client, courses):
+    first, second = courses
+    assert enroll(client, first).status_code == 201
+    with app.app_context():
+        db.session.delete(db.session.get(User, STUDENT_ID))
+        db.session.commit()
+    response = enroll(client, second)
+    assert response.status_code == 404
+    assert response.get_json() == {"errors": ["User not found"]}
+
+
+def test_enroll_after_instructor_delete_cascades(app, client):
+    """Deleting a user cascades to their courses, so every cached course id is forgotten."""
+    with app.app_context():
+        course_id = db.session.scalar(select(Course.id).where(Course.instructor_id == INSTRUCTOR_ID).limit(1))
+    assert enroll(client, course_id).status_code in (201, 409)
+    with app.app_context():
+        db.session.delete(db.session.get(User, INSTRUCTOR_ID))
+        db.session.commit()
+    response = enroll(client, course_id, user_id=STUDENT_ID - 1)
+    assert response.status_code == 404
+    assert response.get_json() == {"errors": ["Course not found"]}
+
+
+def test_instructor_demoted(app, client):
+    assert create_course(client).status_code == 201  # caches the role
+    with app.app_context():
+        db.session.get(User, INSTRUCTOR_ID).role = 'student'
+        db.session.commit()
+    response = create_course(client, title='Created after the demotion')
+    assert response.status_code == 400
+    assert response.get_json() == {"errors": ["User is not an instructor"]}
+
+
+def test_instructor_demoted_by_bulk_update(app, client, courses):
+    assert create_course(client).status_code == 201
+    with app.app_context():
+        db.session.execute(update(User).where(User.id == INSTRUCTOR_ID).values(role='student'))
+        db.session.commit()
+    response = client.patch(f'/courses/{courses[0]}', json={'instructor_id': INSTRUCTOR_ID},
+                            headers={'If-Match': '*'})
+    assert response.status_code == 400
+    assert response.get_json() == {"errors": ["User is not an instructor"]}
+
+
+def test_demotion_elsewhere_seen_after_ttl(app, client):
+    """Another worker's demotion is not invalidated here; the entry lasts LOOKUP_CACHE_TTL at most."""
+    app.extensions['lookup_cache'].ttl = 0.05
+    assert create_course(client).status_code == 201
+    with app.app_context():
+        db.session.execute(text("UPDATE users SET role = 'student' WHERE id = :id"), {'id': INSTRUCTOR_ID})
+        db.session.commit()
+    time.sleep(0.1)
+    assert create_course(client, title='Created after the demotion').status_code == 400
+
+
+def test_read_racing_an_invalidation_is_not_stored():
+    cache = LookupCache()
+    hit, _, generation = cache.get('course', 7)
+    assert not hit
+    cache.invalidate('course', 7)  # the row is deleted while the read is in flight
+    cache.put('course', 7, 7, generation)
+    assert cache.get('course', 7)[0] is False
@@ -0,0 +1,69 @@
+"""The hot read routes run a fixed number of SQL statements, whatever the amount of data."""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, select
+
+from instrumentation import query_budget
+from models import db, Course, Enrollment, Review, User
+
+INSTRUCTOR_ID = 1
+BUDGETS = [
+    ('/users', 6),
+    (f'/users/{INSTRUCTOR_ID}', 6),
+    ('/courses', 3),
+    ('/courses?fields=id,title', 1),
+    ('/courses/1', 3),
+    ('/courses/search?q=course', 3),
+    ('/enrollments', 1),
+    ('/reviews', 1),
+]
+
+
+def last_student(app):
+    with app.app_context():
+        return db.session.scalar(select(func.max(User.id)))
+
+
+@pytest.mark.parametrize('path, budget', BUDGETS)
+def test_route_within_budget(app, client, path, budget):
+    with query_budget(budget, app):
+        response = client.get(path)
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('path, budget', [('/users/{}', 4), ('/users/{}/dashboard', 2)])
+def test_student_route_within_budget(app, client, path, budget):
+    path = path.format(last_student(app))
+    with query_budget(budget, app):
+        response = client.get(path)
+    assert response.status_code == 200
+
+
+def test_statement_count_independent_of_rows(app, client):
+    student = last_student(app)
+    paths = ['/users', f'/users/{student}', f'/users/{student}/dashboard', '/courses', '/courses/1']
+
+    def counts():
+        result = []
+        for path in paths:
+            with query_budget(100, app) as statements:
+                assert client.get(path).status_code == 200
+            result.append(len(statements))
+        return result
+
+    before = counts()
+    with app.app_context():
+        enrolled = set(db.session.scalars(select(Enrollment.course_id).where(Enrollment.user_id == student)))
+        courses = [id for id in db.session.scalars(select(Course.id)) if id not in enrolled]
+        db.session.execute(Enrollment.__table__.insert(), [
+            {'user_id': student, 'course_id': course_id, 'enrollment_date': datetime.utcnow()}
+            for course_id in courses
+        ])
+        db.session.execute(Review.__table__.insert(), [
+            {'user_id': student, 'course_id': course_id, 'rating': 4, 'text_content': 'Another review.'}
+            for course_id in courses
+        ])
+        Course.rebuild_rating_aggregates(db.session.connection())
+        db.session.commit()
+    assert counts() == before
@@ -0,0 +1,101 @@
+"""record_enrollments() keeps course_similarities where a fresh build_similarities() would put it."""
+import random
+from collections import defaultdict
+from datetime import datetime
+from itertools import permutations
+
+import pytest
+from sqlalchemy import func, select
+
+from models import db, Course, CourseSimilarity, Enrollment, User
+from recommendations import build_similarities, record_enrollments
+
+
+def stored(connection):
+    table = CourseSimilarity.__table__
+    return {
+        (a, b): (n, score)
+        for a, b, n, score in connection.execute(
+            select(table.c.course_id, table.c.similar_course_id, table.c.co_count, table.c.score)
+        )
+    }
+
+
+def truth(connection):
+    """(co_count, Jaccard index) of every co-enrolled pair, counted directly from the enrollments."""
+    courses_by_user = defaultdict(set)
+    for user_id, course_id in connection.execute(select(Enrollment.user_id, Enrollment.course_id)):
+        courses_by_user[user_id].add(course_id)
+    sizes, co_counts = defaultdict(int), defaultdict(int)
+    for courses in courses_by_user.values():
+        for course_id in courses:
+            sizes[course_id] += 1
+        for pair in permutations(courses, 2):
+            co_counts[pair] += 1
+    return {(a, b): (n, n / (sizes[a] + sizes[b] - n)) for (a, b), n in co_counts.items()}
+
+
+def enroll(connection, rng, students=20):
+    """Enrolls random students in up to four more courses each through Core; returns the new enrollment ids."""
+    enrolled = set(connection.execute(select(Enrollment.user_id, Enrollment.course_id)).all())
+    user_ids = connection.scalars(select(User.id).where(User.role == 'student')).all()
+    course_ids = connection.scalars(select(Course.id)).all()
+    rows = {
+        (user_id, course_id)
+        for user_id in rng.sample(user_ids, students) for course_id in rng.sample(course_ids, rng.randint(1, 4))
+    } - enrolled
+    first_id = connection.scalar(select(func.max(Enrollment.id))) + 1
+    connection.execute(Enrollment.__table__.insert(), [
+        {'user_id': user_id, 'course_id': course_id, 'enrollment_date': datetime.utcnow()}
+        for user_id, course_id in sorted(rows)
+    ])
+    return list(range(first_id, first_id + len(rows)))
+
+
+def assert_exact(rows, expected):
+    for pair, (n, score) in rows.items():
+        assert n == expected[pair][0], pair
+        assert score == pytest.approx(expected[pair][1]), pair
+
+
+@pytest.mark.parametrize('per_course', [1, 3])
+def test_capped_pairs_stay_exact(app, per_course):
+    with app.app_context():
+        connection = db.session.connection()
+        build_similarities(connection, per_course=per_course)
+        record_enrollments(connection, enroll(connection, random.Random(per_course)), per_course=per_course)
+        rows = stored(connection)
+        assert_exact(rows, truth(connection))
+        per_course_counts = defaultdict(int)
+        for a, _ in rows:
+            per_course_counts[a] += 1
+        assert max(per_course_counts.values()) <= per_course
+
+
+def test_matches_fresh_build(app):
+    with app.app_context():
+        connection = db.session.connection()
+        build_similarities(connection, per_course=1000)
+        rng = random.Random(3)
+        for _ in range(3):
+            record_enrollments(connection, enroll(connection, rng), per_course=1000)
+        incremental = stored(connection)
+        build_similarities(connection, per_course=1000)
+        fresh = stored(connection)
+    assert incremental.keys() == fresh.keys()
+    assert_exact(incremental, fresh)
+
+
+def test_late_and_repeated_folds_stay_exact(app):
+    """Enrollments deleted before their job runs are skipped, and a batch folded twice is not counted twice."""
+    with app.app_context():
+        connection = db.session.connection()
+        build_similarities(connection, per_course=1000)
+        ids = enroll(connection, random.Random(9))
+        connection.execute(Enrollment.__table__.delete().where(Enrollment.id.in_(ids[::2])))
+        record_enrollments(connection, ids, per_course=1000)
+        record_enrollments(connection, ids[1::2], per_course=1000)
+        rows = stored(connection)
+        expected = truth(connection)
+    assert rows.keys() == expected.keys()
+    assert_exact(rows, expected)
@@ -0,0 +1,50 @@
+"""The compiled serializers match to_dict(), and neither exposes the sync bookkeeping columns."""
+import json
+
+import pytest
+
+from models import db, User, Course, Enrollment, Review
+from serializers import course_serializer, enrollment_serializer, review_serializer, user_serializer
+
+
+def keys(data):
+    if isinstance(data, dict):
+        return set(data) | {key for value in data.values() for key in keys(value)}
+    if isinstance(data, list):
+        return {key for value in data for key in keys(value)}
+    return set()
+
+
+@pytest.mark.parametrize('model, serializer', [
+    (User, user_serializer), (Course, course_serializer),
+    (Enrollment, enrollment_serializer), (Review, review_serializer),
+])
+def test_compiled_matches_to_dict(app, model, serializer):
+    with app.app_context():
+        rows = db.session.query(model).options(*serializer.loader_options()).limit(20).all()
+        compiled = serializer.many(rows)
+        assert compiled == [row.to_dict() for row in rows]
+    assert 'updated_at' not in keys(compiled)
+
+
+@pytest.mark.parametrize('path', [
+    '/users', '/users/7', '/courses', '/courses/1', '/enrollments', '/reviews',
+    '/enrollments?format=ndjson', '/reviews?format=ndjson',
+])
+def test_responses_leave_out_updated_at(client, path):
+    response = client.get(path)
+    assert response.status_code == 200
+    lines = response.get_data(as_text=True).splitlines() if 'format' in path else [response.get_data(as_text=True)]
+    assert 'updated_at' not in keys([json.loads(line) for line in lines])
+
+
+def test_created_rows_leave_out_updated_at(client):
+    enrollment = client.post('/enrollments', json={
+        'user_id': 105, 'course_id': 50, 'enrollment_date': '2024-01-15T10:00:00',
+    })
+    review = client.post('/reviews', json={
+        'user_id': 105, 'course_id': 50, 'rating': 4, 'text_content': 'Clear, well paced lectures.',
+    })
+    assert (enrollment.status_code, review.status_code) == (201, 201)
+    assert 'updated_at' not in enrollment.get_json()
+    assert 'updated_at' not in review.get_json()
@@ -0,0 +1,32 @@
+"""Concurrent statistics refreshes take turns; the loser raises RefreshConflict, never a database error."""
+import pytest
+from sqlalchemy import event, insert
+from sqlalchemy.sql import Insert
+
+from models import db, StatsWatermark
+from stats import RefreshConflict, refresh_stats
+
+
+def test_first_refresh_racing_another(app):
+    """Both refreshes find no mark; the other one creates it just before this one's insert."""
+    marks = StatsWatermark.__table__
+    raced = []
+
+    def created_elsewhere(connection, statement, *args):
+        if isinstance(statement, Insert) and statement.table is marks and not raced:
+            raced.append(True)
+            connection.execute(insert(marks).values(name='enrollments', last_id=0))
+
+    with app.app_context(), db.engine.connect() as connection:
+        event.listen(connection, 'before_execute', created_elsewhere)
+        with pytest.raises(RefreshConflict):
+            refresh_stats(connection)
+
+
+def test_refresh_folds_only_new_rows(app):
+    with app.app_context():
+        with db.engine.begin() as connection:
+            first = refresh_stats(connection)
+        with db.engine.begin() as connection:
+            assert refresh_stats(connection) == {'enrollments': 0, 'reviews': 0}
+    assert first['enrollments'] > 0
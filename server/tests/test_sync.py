@@ -0,0 +1,27 @@
+"""GET /sync only re-sends what changed: maintenance rewrites must leave current rows alone."""
+from sqlalchemy import select, update
+
+from models import db, Course
+
+
+def sync_courses(client, token=None):
+    query = {'include': 'courses', 'fields': 'id,title'}
+    if token:
+        query['since'] = token
+    return client.get('/sync', query_string=query).get_json()
+
+
+def test_rebuild_ratings_touches_only_stale_courses(app, client):
+    app.config['SYNC_SETTLE_SECONDS'] = 0
+    token = sync_courses(client)['next']
+    with app.app_context():
+        stamps = dict(db.session.execute(select(Course.id, Course.updated_at)).all())
+        assert Course.rebuild_rating_aggregates(db.session.connection()) == 0
+        db.session.execute(update(Course.__table__).where(Course.id == 7).values(rating_sum=0))
+        assert Course.rebuild_rating_aggregates(db.session.connection()) == 1
+        db.session.commit()
+        after = dict(db.session.execute(select(Course.id, Course.updated_at)).all())
+        course = db.session.get(Course, 7)
+        assert course.rating_sum == sum(review.rating for review in course.reviews)
+    assert [id for id in stamps if stamps[id] != after[id]] == [7]
+    assert [course['id'] for course in sync_courses(client, token)['courses']] == [7]
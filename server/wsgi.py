@@ -0,0 +1,13 @@
+"""WSGI entry point for preforking servers.
+
+    gunicorn --preload -w 4 -b :5555 wsgi:app
+
+Builds the app once and warms it (see preload.py), so with --preload the
+workers fork from a master that has already done their start-up work.
+`flask` commands and `python app.py` build their own app and skip this.
+"""
+from app import create_app
+from preload import warm
+
+app = create_app()
+warm(app)